@@ -0,0 +1,116 @@
+"""
+Cache backend and compression benchmark, cache footprint and warm-run read times for each setting:
+
+    PYTHONPATH=legaldata python benchmarks/bench_cache.py [cache_path] [--repeat N]
+
+Pages are copied from the page cache in cache_path (synthetic detail pages if it has none) into a fresh cache per
+setting. A warm run looks up each page's sidecar and extracted values, a reparse run (e.g. after EXTRACT_VERSION
+is bumped) also reads each page body. On network storage, time spent on reads grows with the bytes read, so
+footprint and file count are the better guide there than local timings.
+"""
+
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import http.client
+from pathlib import Path
+from legaldata.cache import COMPRESSION_SUFFIXES, DirectoryCache, PageCache, compression_by_kind, zstandard
+from legaldata.sqlite_cache import SqliteCache
+
+BACKENDS = {"directory": DirectoryCache, "sqlite": SqliteCache}
+
+
+def key_func(url):
+    return "legal-" + url.replace("/", "_").replace(":", "")
+
+
+def synthetic_pages(count=200):
+    words = "act commonwealth section schedule amendment regulation minister department notice".split()
+    rng = random.Random(0)
+    for i in range(count):
+        rows = "".join(
+            f'<tr><td class="col{j % 4}"><a href="/Details/C{i:04d}{j:03d}">{" ".join(rng.choices(words, k=12))}</a>'
+            f"</td><td>{rng.randint(1900, 2020)}</td></tr>"
+            for j in range(300)
+        )
+        body = f'<html><head><meta name="x" content="{i}"></head><body><table>{rows}</table></body></html>'
+        yield f"https://www.legislation.gov.au/Details/C{i:04d}/Download", body.encode("utf-8")
+
+
+def cached_pages(cache_path):
+    for sidecar in sorted(Path(cache_path).glob("*.html.json")):
+        with open(sidecar) as f:
+            url = json.load(f)["url"]
+        page = PageCache(cache_path, lambda u: sidecar.name[: -len(".html.json")]).get(url)
+        if page is not None:
+            yield url, page.read_bytes()
+
+
+def footprint(path):
+    files = [f for f in Path(path).rglob("*") if f.is_file()]
+    return len(files), sum(f.stat().st_size for f in files), sum(f.stat().st_blocks * 512 for f in files)
+
+
+def timed_ms(func, repeat, count):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / (repeat * count)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("cache_path", nargs="?", default=".legaldata-cache/")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    pages = list(cached_pages(args.cache_path))
+    if len(pages) == 0:
+        pages = list(synthetic_pages())
+    print(f"{len(pages)} pages, {sum(len(body) for _, body in pages) / 1024**2:.1f} MB")
+    headers = http.client.HTTPMessage()
+    headers["Content-Type"] = "text/html; charset=utf-8"
+    fields = {"title": "Act", "meta_tags": {"k": "v" * 200}, "page_details": ["detail " * 50] * 10}
+
+    compressions = [None] + [c for c in COMPRESSION_SUFFIXES if c != "zstd" or zstandard is not None]
+    for backend_name, compression in [(b, c) for b in BACKENDS for c in compressions]:
+        cache_path = tempfile.mkdtemp(prefix="bench-cache-")
+        cache = BACKENDS[backend_name](cache_path, key_func, key_func, compression_by_kind(compression))
+        try:
+            page_cache = cache.pages
+            extract_cache = cache.extracts
+            start = time.perf_counter()
+            for url, body in pages:
+                page = page_cache.put(url, body, headers)
+                extract_cache.put(f"act-{page.sha256}", fields)
+            write_ms = (time.perf_counter() - start) * 1000 / len(pages)
+            files, size, allocated = footprint(cache_path)
+
+            def warm_run():
+                for url, _ in pages:
+                    page = page_cache.get(url)
+                    extract_cache.get(f"act-{page.sha256}")
+
+            def reparse_run():
+                for url, _ in pages:
+                    page_cache.get(url).read_bytes()
+
+            warm_ms = timed_ms(warm_run, args.repeat, len(pages))
+            reparse_ms = timed_ms(reparse_run, args.repeat, len(pages))
+            print(
+                f"  {backend_name:<9} {str(compression):<6} {files:5d} files {size / 1024**2:8.2f} MB "
+                f"({allocated / 1024**2:8.2f} MB on disk)  "
+                f"write {write_ms:6.3f} ms/page  warm {warm_ms:6.3f} ms/page  reparse read {reparse_ms:6.3f} ms/page"
+            )
+        finally:
+            cache.close()
+            shutil.rmtree(cache_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
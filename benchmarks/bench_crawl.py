@@ -0,0 +1,155 @@
+"""
+Offline crawl benchmark, both crawlers against a local stand-in for legislation.gov.au and austlii.edu.au:
+
+    PYTHONPATH=legaldata python benchmarks/bench_crawl.py [--acts N] [--latency MS] [--error-rate P] [--concurrency N]
+
+The stand-in server is the one the tests use (see tests/support.py), generating pages and files shaped like the real
+sites' from each url. Responses are delayed by --latency and --error-rate of them fail with --error-status, which
+the crawlers retry. 503s (the default) also make the crawlers' rate control space requests at least half a second
+apart for a while, 500s are only retried.
+
+Each crawler is run with a cold cache, then a warm one (no requests) and a revalidating one (conditional requests
+answered 304), each run in a fresh process so its peak RSS is its own. The cold run is recorded to a cassette, and
+a last run replays it into an empty cache (see legaldata.cassette), which shows the crawl's own costs without the
+server's. The server runs in this process and shares
+the machine's cores with the crawl, so compare results from the same machine.
+"""
+
+import os
+import sys
+import json
+import shutil
+import asyncio
+import logging
+import resource
+import tempfile
+import argparse
+import threading
+import http.server
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+from support import (  # noqa: E402
+    AUSTLII,
+    AUSTLII_DOWNLOAD,
+    AUSTLII_INDEX,
+    LEGISLATION,
+    LEGISLATION_INDEX,
+    SyntheticSite,
+    make_handler,
+)
+
+SCENARIOS = ("cold", "warm", "revalidate", "replay")
+
+
+def crawl(crawler_name, scenario, port, save_path, cache_path, concurrency, cache_backend, cassette):
+    # Runs in a fresh process, ru_maxrss is the peak RSS of this scenario alone
+    logging.basicConfig(level=logging.ERROR)
+    from legaldata.austlii.crawler import ActCrawler as AustliiCrawler
+    from legaldata.legislation.crawler import ActCrawler as LegislationCrawler
+
+    crawler_class, index_url = {
+        "legislation": (LegislationCrawler, LEGISLATION_INDEX),
+        "austlii": (AustliiCrawler, AUSTLII_INDEX),
+    }[crawler_name]
+    local = f"http://127.0.0.1:{port}"
+    connect_to = {LEGISLATION: local, AUSTLII: local, AUSTLII_DOWNLOAD: local}
+    use_cache = {"cold": True, "warm": True, "revalidate": "revalidate", "replay": True}[scenario]
+    crawler = crawler_class(
+        connect_to=connect_to,
+        backoff_base=0.01,
+        cache_backend=cache_backend,
+        record=cassette if scenario == "cold" else None,
+        replay=cassette if scenario == "replay" else None,
+    )
+    try:
+        if concurrency > 0:
+            asyncio.run(
+                crawler.get_acts_from_index_async(
+                    index_url,
+                    save_path,
+                    cache_path=cache_path,
+                    use_cache=use_cache,
+                    max_per_host=concurrency,
+                    requests_per_sec=None,
+                )
+            )
+        else:
+            crawler.get_acts_from_index(index_url, save_path, cache_path=cache_path, use_cache=use_cache, delay_sec=0)
+    finally:
+        crawler.close()
+    report = crawler.last_report
+    return dict(
+        report["counters"],
+        seconds=report["seconds"],
+        acts_per_sec=report["acts_per_sec"],
+        bytes_per_sec=report["bytes_per_sec"],
+        peak_rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--acts", type=int, default=1000, help="acts per crawler")
+    arg_parser.add_argument("--file-kb", type=int, default=64, help="size of each act file in KB")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="server response delay in milliseconds")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses that are errors")
+    arg_parser.add_argument("--error-status", type=int, default=503, choices=[500, 502, 503, 504])
+    arg_parser.add_argument("--concurrency", type=int, default=0, help="async crawl max_per_host (0: sync crawl)")
+    arg_parser.add_argument("--cache-backend", default="directory", choices=["directory", "sqlite"])
+    arg_parser.add_argument("--crawler", action="append", choices=["legislation", "austlii"])
+    arg_parser.add_argument("--output", default=None, help="write results to this json file")
+    args = arg_parser.parse_args()
+    assert 0 <= args.error_rate < 1
+
+    site = SyntheticSite(args.acts, args.file_kb)
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), make_handler(site, args.latency / 1000, args.error_rate, args.error_status)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mode = f"async, max_per_host {args.concurrency}" if args.concurrency > 0 else "sync"
+    print(
+        f"{args.acts} acts per crawler, {args.file_kb} KB files, latency {args.latency} ms, "
+        f"error rate {args.error_rate} ({args.error_status}), {mode}, {args.cache_backend} cache"
+    )
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for crawler_name in args.crawler or ["legislation", "austlii"]:
+        work_path = tempfile.mkdtemp(prefix="bench-crawl-")
+        try:
+            for scenario in SCENARIOS:
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    result = pool.submit(
+                        crawl,
+                        crawler_name,
+                        scenario,
+                        server.server_port,
+                        os.path.join(work_path, "save"),
+                        os.path.join(work_path, "replay-cache" if scenario == "replay" else "cache"),
+                        args.concurrency,
+                        args.cache_backend,
+                        os.path.join(work_path, "cassette.zip"),
+                    ).result()
+                results.append(dict(result, crawler=crawler_name, scenario=scenario))
+                print(
+                    f"  {crawler_name:<11} {scenario:<10} {result['acts']:6d} acts {result['seconds']:8.2f} sec "
+                    f"{result['acts_per_sec']:9.1f} acts/sec {result['bytes_per_sec'] / 1024**2:8.2f} MB/sec  "
+                    f"{result['requests']:6d} requests ({result['retries']} retries)  "
+                    f"peak RSS {result['peak_rss'] / 1024**2:7.1f} MB"
+                )
+        finally:
+            shutil.rmtree(work_path)
+    server.shutdown()
+    server.server_close()
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Link extraction micro-benchmark, regex over str(soup) vs compiled patterns over the raw page bytes:
+
+    PYTHONPATH=legaldata python benchmarks/bench_links.py [page.html ...] [--repeat N]
+
+Without pages a synthetic legislation.gov.au index page is used. Pages should be saved index pages, e.g. the
+legal-*.html files in a crawl cache.
+"""
+import re
+import sys
+import time
+import argparse
+from bs4 import BeautifulSoup
+from legaldata.legislation.crawler import DOWNLOAD_PAGE_PATTERN, ActCrawler
+
+
+def synthetic_index_page(acts=2000) -> bytes:
+    rows = "".join(
+        f'<tr><td><a href="../Details/C2020A{i:05d}/Download">Test Act {i}</a></td><td>Act No. {i}</td></tr>'
+        for i in range(acts)
+    )
+    return f"<html><body><table>{rows}</table></body></html>".encode("utf-8")
+
+
+def str_soup_links(soup) -> list:
+    act_codes = re.findall(DOWNLOAD_PAGE_PATTERN.pattern.decode("ascii"), str(soup))
+    return sorted(set(f"https://www.legislation.gov.au/Details/{code}/Download" for code in act_codes))
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("pages", nargs="*")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    bodies = [(filename, open(filename, "rb").read()) for filename in args.pages]
+    if len(bodies) == 0:
+        bodies = [("synthetic index page", synthetic_index_page())]
+
+    for name, body in bodies:
+        soup = BeautifulSoup(body, "html.parser")
+        parse_ms, _ = timed(lambda: BeautifulSoup(body, "html.parser"), args.repeat)
+        str_ms, expected = timed(lambda: str_soup_links(soup), args.repeat)
+        bytes_ms, links = timed(lambda: ActCrawler._get_act_download_page_urls(body), args.repeat)
+        print(f"{name}: {len(body) / 1024:.0f} KB, {len(links)} links, {'ok' if links == expected else 'MISMATCH'}")
+        print(f"  parse + str(soup) + regex {parse_ms + str_ms:9.2f} ms")
+        print(f"  str(soup) + regex         {str_ms:9.2f} ms")
+        print(f"  raw bytes                 {bytes_ms:9.2f} ms ({(parse_ms + str_ms) / bytes_ms:.0f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Detail page parse benchmark, run against act detail pages saved in a crawl cache:
+
+    PYTHONPATH=legaldata python benchmarks/bench_parse.py [cache_path] [--repeat N] [--synthetic N]
+
+Times a full parse, the partial (SoupStrainer) parse used by _get_act and the same with lxml if installed, and checks
+every mode extracts the same act fields as the full html.parser parse. Crawlers without cached detail pages in
+cache_path (e.g. in a fresh checkout) are timed on synthetic pages shaped like the sites' instead, generated by the
+stand-in server of the tests and the crawl benchmark (see tests/support.py).
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+from pathlib import Path
+from bs4.builder import builder_registry
+from legaldata.cache import CachedPage
+from legaldata.austlii.crawler import ActCrawler as AustliiCrawler
+from legaldata.legislation.crawler import ActCrawler as LegislationCrawler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+from support import SyntheticSite  # noqa: E402
+
+CRAWLERS = [(LegislationCrawler, "/Details/", "/Download"), (AustliiCrawler, "/cgi-bin/viewdoc/", "/")]
+
+
+def detail_pages(crawler, cache_path, url_contains, url_endswith):
+    page_cache = crawler._get_page_cache(cache_path)
+    # Pages may be compressed, their sidecars are always <key>.html.json
+    for sidecar in sorted(Path(cache_path).glob(f"{crawler.page_cache_prefix}*.html.json")):
+        page = page_cache.get(page_cache_url(sidecar))
+        if page is not None and url_contains in page.url and page.url.endswith(url_endswith):
+            yield page
+
+
+def page_cache_url(sidecar) -> str:
+    # Sidecars record the page url, the cache key can't be turned back into one
+    with open(sidecar) as f:
+        return json.load(f)["url"]
+
+
+def synthetic_pages(crawler_class, pages_path, count):
+    site = SyntheticSite(count)
+    detail = site.legislation_detail if crawler_class is LegislationCrawler else site.austlii_detail
+    pages = []
+    for i in range(count):
+        _, _, body = detail(i)
+        filename = os.path.join(pages_path, f"{crawler_class.__module__}-{i}.html")
+        with open(filename, "wb") as f:
+            f.write(body)
+        pages.append(CachedPage(f"http://synthetic/{i}", "", "utf-8", [], filename))
+    return pages
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("cache_path", nargs="?", default=".legaldata-cache/")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--synthetic", type=int, default=200, help="synthetic pages without cached ones")
+    args = arg_parser.parse_args()
+
+    modes = [("html.parser", False), ("html.parser", True)]
+    if builder_registry.lookup("lxml") is not None:
+        modes += [("lxml", False), ("lxml", True)]
+
+    pages_path = tempfile.TemporaryDirectory(prefix="bench-parse-")
+    for crawler_class, url_contains, url_endswith in CRAWLERS:
+        crawlers = {mode: crawler_class(parser=mode[0], partial_parse=mode[1]) for mode in modes}
+        pages = []
+        if os.path.isdir(args.cache_path):
+            pages = list(detail_pages(crawlers[modes[0]], args.cache_path, url_contains, url_endswith))
+        source = "cached"
+        if len(pages) == 0:
+            pages = synthetic_pages(crawler_class, pages_path.name, args.synthetic)
+            source = f"synthetic (no cached ones in {args.cache_path})"
+
+        expected = [crawler_class._get_act_fields(crawlers[modes[0]]._parse_page(page)) for page in pages]
+        print(f"{crawler_class.__module__}: {len(pages)} {source} detail pages")
+        baseline = None
+        for mode, crawler in crawlers.items():
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                soups = [crawler._parse_page(page, crawler._is_act_tag) for page in pages]
+                fields = [crawler_class._get_act_fields(soup) for soup in soups]
+            ms_per_page = (time.perf_counter() - start) * 1000 / (args.repeat * len(pages))
+            baseline = baseline or ms_per_page
+            match = "ok" if fields == expected else "MISMATCH"
+            print(
+                f"  {mode[0]:<12} {'partial' if mode[1] else 'full':<8} {ms_per_page:8.2f} ms/page "
+                f"({baseline / ms_per_page:4.1f}x) fields {match}"
+            )
+    pages_path.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,8 +5,11 @@ import datetime
 def run_legislation_crawler():
     logging.info("Example 1: Crawl www.legislation.gov.au")
     from legaldata.legislation.crawler import ActCrawler
+    from legaldata.frontier import UrlFrontier
 
     crawler = ActCrawler()
+    # Acts listed on several index pages are only crawled once
+    crawler.frontier = UrlFrontier()
 
     # Full run
     # delay_sec = 3
@@ -34,14 +37,17 @@ def run_legislation_crawler():
         for act in crawler.get_acts_from_index(index_url, save_path, act_limit=act_limit, delay_sec=delay_sec):
             logging.debug(f"act: {act}\n")
 
-    logging.info(f"Finished. Took {datetime.datetime.now() - start}")
+    logging.info(f"Finished. Took {datetime.datetime.now() - start}, counters: {crawler.metrics.counters}")
 
 
 def run_austlii_crawler():
     logging.info("Example 2: Crawl austlii.edu.au")
     from legaldata.austlii.crawler import ActCrawler
+    from legaldata.frontier import UrlFrontier
 
     crawler = ActCrawler()
+    # Acts listed on several index pages are only crawled once
+    crawler.frontier = UrlFrontier()
 
     # Full run
     # delay_sec = 3
@@ -69,7 +75,7 @@ def run_austlii_crawler():
         for act in crawler.get_acts_from_index(index_url, save_path, act_limit=act_limit, delay_sec=delay_sec):
             logging.debug(f"act: {act}\n")
 
-    logging.info(f"Finished. Took {datetime.datetime.now() - start}")
+    logging.info(f"Finished. Took {datetime.datetime.now() - start}, counters: {crawler.metrics.counters}")
 
 
 if __name__ == "__main__":
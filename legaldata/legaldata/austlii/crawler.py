@@ -1,17 +1,16 @@
 import os
 import re
-import time
-import json
-import dataclasses
 import logging
-import urllib
-import urllib.request
+import urllib.error
 from datetime import datetime
-from pathlib import Path
-from typing import List, Tuple
-from bs4 import BeautifulSoup
+from typing import Dict, List, Optional
 from legaldata import base
+from legaldata.cache import INDEX
+from legaldata.frontier import unique_urls
 from legaldata.austlii.act import Act
+from legaldata.links import find_links
+
+DOWNLOAD_PAGE_PATTERN = re.compile(rb"cgi-bin/viewdoc/au/legis/cth/consol_act/[^/]+/")
 
 
 class ActCrawler(base.Crawler):
@@ -24,46 +23,21 @@ class ActCrawler(base.Crawler):
     http://www.austlii.edu.au/about.html
     """
 
-    def __init__(self, user_agent="Mozilla/5.0 pypi.org/project/legaldata/"):
-        super(ActCrawler, self).__init__()
-        self.user_agent = user_agent
-        opener = urllib.request.build_opener()
-        opener.addheaders = [("User-Agent", self.user_agent)]
-        urllib.request.install_opener(opener)
-
-    def _scrape_page(self, url, cache_path, use_cache) -> Tuple[BeautifulSoup, bool]:
-        cache_filename = f"{cache_path}austlii-{self.valid_filename(url)}.html"
-        cache_filename_exists = Path(cache_filename).is_file()
-        loaded_from_cache = False
-
-        logging.debug(f"use_cache = {use_cache}")
-        logging.debug(f"cache_filename = {cache_filename}")
-
-        if not use_cache or not cache_filename_exists:
-            logging.info(f"Scraping: {url}")
-
-            # TODO: define new user-agent for legaldata
-            req = urllib.request.Request(url, data=None, headers={"User-Agent": self.user_agent})
-            response = urllib.request.urlopen(req)
-            soup = BeautifulSoup(response, "html.parser")
-            if cache_filename is not None:
-                logging.debug(f"Saving to cache: {cache_filename}")
-                self.save(soup, cache_filename)
-        else:
-            logging.info(f"Loading from cache: {cache_filename}")
-            soup = self.load(cache_filename)
-            loaded_from_cache = True
-
-        return soup, loaded_from_cache
+    act_class = Act
+
+    def __init__(self, user_agent="Mozilla/5.0 pypi.org/project/legaldata/", **kwargs):
+        super(ActCrawler, self).__init__(user_agent, **kwargs)
+        self.page_cache_prefix = "austlii-"
 
     @staticmethod
-    def _get_act_download_page_urls(soup) -> List[str]:
-        regex = r"cgi-bin/viewdoc/au/legis/cth/consol_act/[^/]+/"
-        links = re.findall(regex, str(soup))
-        download_pages = [f"http://www.austlii.edu.au/{link}" for link in links]
-        download_pages = list(set(download_pages))
+    def _get_act_download_page_urls(body, encoding=None) -> List[str]:
+        download_pages = find_links(body, DOWNLOAD_PAGE_PATTERN, "http://www.austlii.edu.au/{}", encoding)
         return sorted(download_pages)
 
+    @staticmethod
+    def _get_act_code(act) -> str:
+        return act.file_code if len(act.file_code) > 0 else act.page_url
+
     @staticmethod
     def clean_details_text(s) -> List[str]:
         s = re.sub("[\n]{2,}", "$NL$", s)
@@ -81,102 +55,126 @@ class ActCrawler(base.Crawler):
         use_cache=True,
         act_limit=None,
         delay_sec=5,
+        incremental=False,
+        resume=False,
     ) -> List[Act]:
-        assert index_url is not None
-        assert save_path is not None
-        assert save_file_prefix is not None
-
-        if cache_path is None:
-            cache_path = self.default_cache_path
-
-        os.makedirs(cache_path, exist_ok=True)
-        os.makedirs(save_path, exist_ok=True)
+        return list(
+            self.iter_acts_from_index(
+                index_url, save_path, save_file_prefix, cache_path, use_cache, act_limit, delay_sec, incremental, resume
+            )
+        )
 
-        logging.info(f"Crawling index_url: {index_url}")
+    def _get_download_page_urls(self, index_url, cache_path, use_cache) -> List[str]:
         logging.warning("TODO: Handle multiple pages in index page!")
         # TODO: WARN: Handle multiple pages in index page!
         #       Currently we hope all acts are on the first page, which appears to be the case but isn't tested.
         try:
-            (seed_soup, loaded_from_cache) = self._scrape_page(index_url, cache_path, use_cache)
+            (page, loaded_from_cache) = self._fetch_page(index_url, cache_path, use_cache, INDEX)
         except urllib.error.HTTPError as err:
             logging.error(
                 f"Index page {index_url} retured HTTPError: {err} "
                 f"(note that indexes K, X, Y, Z don't exist as of Oct 2020)"
             )
             return []
-        download_page_urls = self._get_act_download_page_urls(seed_soup)
-        logging.info(f"Number of download page URLs: {len(download_page_urls)}")
-
-        # Get act information
-        acts = []
-        for i, download_page_url in enumerate(download_page_urls):
-            if act_limit is not None and i >= act_limit:
-                break
-
-            logging.debug(f"Crawling download page: {download_page_url}")
-            act = self._get_act(download_page_url, cache_path, use_cache)
-            acts.append(act)
-
-        # Download act files (pdf, docx, etc)
-        for act in acts:
-            act.saved_filenames = []
-            for i, download_link in enumerate(act.download_links):
-                # Save file (docx, rtf, txt, etc)
-                save_filename, header_ext, loaded_from_cache, success = self._scrape_file(
+        return self._extract(
+            cache_path, "index", page.sha256, lambda: self._get_act_download_page_urls(page.read_bytes(), page.encoding)
+        )
+
+    def _save_act_file(self, act, download_link, save_path, save_file_prefix, cache_path, use_cache) -> Optional[str]:
+        # Look up file headers first, the cached body is only read if it's a redirect page
+        entry, _ = self._fetch_file(download_link, cache_path, use_cache)
+        if entry is None:
+            return None
+
+        # For Austlii, when .txt file requested we actually get .html page with dl links in it,
+        # so we parse the html page for the real .txt file link.
+        _, header_ext = self._get_header_info(entry.http_headers())
+        download_split = os.path.splitext(download_link)
+        download_ext = "" if len(download_split) < 2 else download_split[1]
+        if len(download_ext) > 0 and header_ext is not None and header_ext.lower() != download_ext.lower():
+            # Download txt file from link in html page, the redirect html page itself isn't saved
+            redirected_download_link = self._extract(
+                cache_path,
+                f"redirect-{os.path.basename(download_link)}",
+                entry.sha256,
+                lambda: self._get_act_redirected_download_page_url(
+                    entry.read_bytes(), download_link, entry.http_headers().get_content_charset()
+                ),
+            )
+            save_filename, _, _, success = self._scrape_file(
+                act, redirected_download_link, save_path, save_file_prefix, cache_path, use_cache
+            )
+            return save_filename if success else None
+
+        # Save file (docx, rtf, txt, etc)
+        save_filename, _ = self._save_cached_file(act, entry, download_link, save_path, save_file_prefix)
+        return save_filename
+
+    def _save_act_files(self, act, save_path, save_file_prefix, cache_path, use_cache) -> None:
+        act.saved_filenames = []
+        for i, download_link in enumerate(act.download_links):
+            save_filename = self._journaled_file(act, download_link, save_path)
+            if save_filename is None:
+                save_filename = self._save_act_file(
                     act, download_link, save_path, save_file_prefix, cache_path, use_cache
                 )
-                if not success:
+                if save_filename is None:
                     continue
+                self._journal_file(act, download_link, save_filename)
+                self.metrics.inc("files")
 
-                # For Austlii, when .txt file requested we actually get .html page with dl links in it,
-                # so we parse the html page for the real .txt file link.
-                download_split = os.path.splitext(download_link)
-                download_ext = "" if len(download_split) < 2 else download_split[1]
-                if len(download_ext) > 0 and header_ext is not None and header_ext.lower() != download_ext.lower():
-                    # Download txt file from link in html page
-                    (seed_soup, loaded_from_cache) = self._scrape_page(download_link, cache_path, use_cache)
-                    redirected_download_link = self._get_act_redirected_download_page_url(seed_soup, download_link)
-                    os.remove(save_filename)  # Remove redirect html page
-                    save_filename, header_ext, loaded_from_cache, success = self._scrape_file(
-                        act, redirected_download_link, save_path, save_file_prefix, cache_path, use_cache
-                    )
-
-                act.saved_filenames.append(os.path.basename(save_filename))
-                # Save metadata
-                if i == (len(act.download_links) - 1):
-                    metadata_filename = os.path.splitext(save_filename)[0] + ".meta.json"
-                    with open(metadata_filename, "w") as f:
-                        metadata = json.dumps(dataclasses.asdict(act), indent=4)  # , sort_keys=True)
-                        f.write(metadata)
-                # Throttle
-                if not loaded_from_cache:
-                    time.sleep(delay_sec)
-
-        return acts
+            act.saved_filenames.append(os.path.basename(save_filename))
+            # Save metadata
+            if i == (len(act.download_links) - 1):
+                self._save_metadata(save_filename, act)
 
     @staticmethod
-    def _get_act_redirected_download_page_url(soup, download_link) -> str:
+    def _get_act_redirected_download_page_url(body, download_link, encoding=None) -> str:
         # url: http://www8.austlii.edu.au/cgi-bin/download.cgi/cgi-bin/download.cgi/download/au/legis/cth/consol_act/anhcslia1998780.txt
         # download_link: http://www.austlii.edu.au/au/legis/cth/consol_act/amsaa1990405.txt
         # download_ext : .txt
         # header_ext   : .html
 
         download_filename = os.path.basename(download_link)
-        regex = rf"http.+{download_filename}"
-        links = re.findall(regex, str(soup))
+        pattern = re.compile(rb"http[^\s\"'<>]*/" + re.escape(download_filename.encode("utf-8")))
+        links = find_links(body, pattern, encoding=encoding)
         assert len(links) > 0
         return links[0]
 
     def _get_act(self, download_page_url, cache_path, use_cache) -> Act:
-        (soup, loaded_from_cache) = self._scrape_page(download_page_url, cache_path, use_cache)
+        (page, loaded_from_cache) = self._fetch_page(download_page_url, cache_path, use_cache)
+        fields = self._extract(
+            cache_path, "act", page.sha256, lambda: self._get_act_fields(self._parse_page(page, self._is_act_tag))
+        )
 
+        crawl_date = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+        saved_filenames = []
+        return Act(
+            fields["title"],
+            fields["file_code"],
+            fields["desc"],
+            fields["meta_tags"],
+            download_page_url,
+            fields["download_links"],
+            loaded_from_cache,
+            crawl_date,
+            saved_filenames,
+        )
+
+    @staticmethod
+    def _is_act_tag(name, attrs) -> bool:
+        # Detail page tags used by _get_act_fields: <title>, meta tags and the download links div
+        return name in ("title", "meta") or (name == "div" and "side-download" in str(attrs.get("class", "")).split())
+
+    @staticmethod
+    def _get_act_fields(soup) -> Dict:
         # E.g. http://www.austlii.edu.au/au/legis/cth/consol_act/antsbna1999470.txt
         base_url = "http://www.austlii.edu.au"
         # base_url = "http://www8.austlii.edu.au"
 
         dl_div = soup.find("div", {"class": "side-download"})
         download_links = [base_url + x["href"] for x in dl_div.find_all("a")]
-        download_links = list(set(download_links))
+        download_links = unique_urls(download_links)
 
         # Get code
         file_code = "" if len(download_links) == 0 else os.path.splitext(os.path.basename(sorted(download_links)[0]))[0]
@@ -195,19 +193,13 @@ class ActCrawler(base.Crawler):
         meta_tags = dict([(x[0].strip().lower(), x[1].strip()) for x in meta_tags_tuples if x[0] is not None])
         desc = meta_tags.get("description", "")
 
-        crawl_date = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-        saved_filenames = []
-        return Act(
-            title,
-            file_code,
-            desc,
-            meta_tags,
-            download_page_url,
-            download_links,
-            loaded_from_cache,
-            crawl_date,
-            saved_filenames,
-        )
+        return {
+            "title": title,
+            "file_code": file_code,
+            "desc": desc,
+            "meta_tags": meta_tags,
+            "download_links": download_links,
+        }
 
     @staticmethod
     def get_index_pages() -> List[str]:
@@ -1,19 +1,294 @@
 import os
+import json
+import uuid
+import errno
+import hashlib
+import dataclasses
 import time
+import asyncio
 import logging
 import mimetypes
 import string
 import shutil
-import pickle
-from typing import Tuple
-import urllib
+import urllib.error
+from typing import Callable, Iterator, List, Optional, Tuple
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from legaldata.cache import (
+    DETAIL,
+    FILE,
+    CacheBackend,
+    CacheEntry,
+    CachedPage,
+    CachePolicy,
+    CacheStats,
+    DirectoryCache,
+    FileCache,
+    add_linked_save_path,
+    compression_by_kind,
+    conditional_headers,
+    write_atomic,
+)
+from legaldata.cassette import RecordingTransport, ReplayTransport
+from legaldata.catalog import ActCatalog, catalog_filename, load_catalog
+from legaldata.frontier import UrlFrontier, unique_urls
+from legaldata.journal import CrawlJournal, IndexJournal, journal_filename
+from legaldata.metrics import CrawlMetrics, report_filename, write_report
+from legaldata.manifest import MANIFEST_FILENAME, ActManifest, ManifestChanges, ManifestEntry
+from legaldata.sqlite_cache import SqliteCache
+from legaldata.throttle import AdaptiveThrottle, backoff_delay, is_retryable, retry_after_seconds
+from legaldata.transport import Transport
+
+# use_cache mode which sends conditional requests (If-None-Match/If-Modified-Since) and reuses the cached body on 304
+REVALIDATE = "revalidate"
+# Bump when page extraction logic changes so results cached by page hash are recomputed
+EXTRACT_VERSION = 3
+DEFAULT_PARSER = "html.parser"
+MATERIALIZE_MODES = ("copy", "hardlink", "reflink", "symlink")
+CACHE_BACKENDS = {"directory": DirectoryCache, "sqlite": SqliteCache}
+# Errors that mean a link/clone isn't possible here (e.g. across filesystems) and a plain copy should be used
+MATERIALIZE_FALLBACK_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL)
+
+try:
+    from bs4.filter import ElementFilter  # beautifulsoup4 >= 4.13
+except ImportError:
+    ElementFilter = None
+
+
+def parse_only_filter(tag_func: Callable[[str, dict], bool]):
+    """
+    BeautifulSoup parse_only argument that only builds top level tags where tag_func(name, attrs) is true, along with
+    everything inside them. Other tags and text are skipped while parsing rather than built and thrown away.
+    """
+    if ElementFilter is None:
+        # Older SoupStrainers call a name function with (name, attrs)
+        return SoupStrainer(lambda name, attrs=None: tag_func(name, dict(attrs or {})))
+
+    class TagFilter(ElementFilter):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return tag_func(name, dict(attrs or {}))
+
+        def allow_string_creation(self, string):
+            return False
+
+    return TagFilter()
 
 
 class Crawler:
-    def __init__(self):
+    # Act dataclass of the crawler, used to rebuild journaled acts when resuming
+    act_class = None
+
+    def __init__(
+        self,
+        user_agent="Mozilla/5.0 pypi.org/project/legaldata/",
+        pool_size=4,
+        timeout=60,
+        materialize="copy",
+        parser=DEFAULT_PARSER,
+        partial_parse=True,
+        retry_attempts=5,
+        backoff_base=1.0,
+        backoff_cap=60.0,
+        max_speedup=2.0,
+        cache_policy: Optional[CachePolicy] = None,
+        compression=None,
+        cache_backend="directory",
+        catalog=False,
+        meta_json=True,
+        metrics_textfile=None,
+        connect_to=None,
+        record=None,
+        replay=None,
+        max_file_bytes=None,
+    ):
+        assert materialize in MATERIALIZE_MODES, f"materialize must be one of {MATERIALIZE_MODES}"
+        assert (
+            callable(cache_backend) or cache_backend in CACHE_BACKENDS
+        ), f"cache_backend must be one of {list(CACHE_BACKENDS)} or a CacheBackend class"
+        assert record is None or replay is None, "Can't record and replay a cassette at once"
+        if builder_registry.lookup(parser) is None:
+            logging.warning(f"HTML parser {parser} not installed, falling back to {DEFAULT_PARSER}")
+            parser = DEFAULT_PARSER
         self.default_cache_path = ".legaldata-cache/"
+        self.page_cache_prefix = "legal-"
+        self.user_agent = user_agent
+        # Requests go to the sites, or with record=filename also to a cassette that replay=filename answers
+        # requests from later, without network access or request spacing (see legaldata.cassette)
+        if replay is not None:
+            self.transport = ReplayTransport(replay, user_agent)
+        elif record is not None:
+            self.transport = RecordingTransport(
+                record, user_agent, pool_size=pool_size, timeout=timeout, connect_to=connect_to
+            )
+        else:
+            self.transport = Transport(user_agent, pool_size=pool_size, timeout=timeout, connect_to=connect_to)
+        self.materialize = materialize
+        # Downloads larger than this are abandoned, see Transport.download
+        self.max_file_bytes = max_file_bytes
+        self.parser = parser
+        self.partial_parse = partial_parse
+        self.retry_attempts = retry_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_speedup = max_speedup
+        self.cache_policy = cache_policy or CachePolicy()
+        # Compression of cached pages and extracted values, see compression_by_kind
+        self.compression = compression_by_kind(compression)
+        # Storage of cache_path, see CACHE_BACKENDS
+        self.cache_backend = CACHE_BACKENDS.get(cache_backend, cache_backend)
+        # Act metadata is written next to each act's files and/or, with catalog, appended to
+        # save_path/legaldata-catalog.jsonl
+        self.catalog = catalog
+        self.meta_json = meta_json
+        # Counters and latency histograms over the crawler's life, each run's share is reported in
+        # save_path/legaldata-run-reports/ and the totals in metrics_textfile (Prometheus format) if given
+        self.metrics = CrawlMetrics()
+        self.metrics_textfile = metrics_textfile
+        self.last_report = None
+        self.throttle = None
+        # Set to a UrlFrontier to crawl acts listed on several index pages only once per run
+        self.frontier: Optional[UrlFrontier] = None
+        self.last_changes = None
+        self.journal: Optional[IndexJournal] = None
+        self._caches = {}
+        self._cache_stats = {}
+        # cache_path -> (its size after the crawler last pruned it, bytes downloaded by then)
+        self._pruned = {}
+        self._linked_save_paths = set()
+        self._catalogs = {}
+
+    def close(self) -> None:
+        self._save_cache_stats()
+        self.transport.close()
+        for cache in self._caches.values():
+            cache.close()
+        self._caches = {}
+        for catalog in self._catalogs.values():
+            catalog.close()
+        self._catalogs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_cache(self, cache_path) -> CacheBackend:
+        if cache_path not in self._caches:
+            self._caches[cache_path] = self.cache_backend(
+                cache_path,
+                lambda url: f"{self.page_cache_prefix}{self.valid_filename(url)}",
+                lambda url: f"legal-{self.valid_filename(url)}",
+                self.compression,
+            )
+        return self._caches[cache_path]
+
+    def _get_file_cache(self, cache_path):
+        return self._get_cache(cache_path).files
+
+    def _get_page_cache(self, cache_path):
+        return self._get_cache(cache_path).pages
+
+    def _get_extract_cache(self, cache_path):
+        return self._get_cache(cache_path).extracts
+
+    @staticmethod
+    def _open_journal(save_path, index_url, resume) -> Optional[IndexJournal]:
+        # Only resumable crawls are journaled, picking up the journal an interrupted one left
+        if not resume:
+            return None
+        return CrawlJournal(journal_filename(save_path, index_url)).open_index(index_url)
+
+    def _close_journal(self, finished) -> None:
+        # A finished crawl's journal is removed, so the next resumable crawl of the index url starts afresh
+        journal, self.journal = self.journal, None
+        if journal is None:
+            return
+        if finished:
+            journal.journal.remove()
+        else:
+            journal.journal.close()
+
+    def _add_to_catalog(self, save_path, act) -> None:
+        if not self.catalog:
+            return
+        if save_path not in self._catalogs:
+            self._catalogs[save_path] = ActCatalog(catalog_filename(save_path))
+        self._catalogs[save_path].add(act)
+
+    def _flush_catalog(self, save_path) -> None:
+        if save_path in self._catalogs:
+            self._catalogs[save_path].flush()
+
+    def load_catalog(self, save_path) -> List:
+        """
+        Every act in save_path's catalog (the latest crawl of each), see ActCatalog.
+        """
+        return load_catalog(catalog_filename(save_path), self.act_class)
+
+    def _journaled_file(self, act, download_link, save_path) -> Optional[str]:
+        # Absolute path of download_link's saved file if a resumed crawl already saved it
+        filename = None if self.journal is None else self.journal.saved_file(act.page_url, download_link)
+        if filename is None or not Path(save_path, filename).is_file():
+            return None
+        logging.debug(f"Already saved, skipping: {filename}")
+        return os.path.abspath(os.path.join(save_path, filename))
+
+    def _journal_file(self, act, download_link, save_filename) -> None:
+        if self.journal is not None:
+            self.journal.record_file(act.page_url, download_link, os.path.basename(save_filename))
+
+    def _throttled(self, url):
+        return nullcontext() if self.throttle is None else self.throttle.request(url)
+
+    def _new_throttle(self, max_per_host, requests_per_sec) -> Optional[AdaptiveThrottle]:
+        if self.transport.offline:
+            return None
+        return AdaptiveThrottle(max_per_host, requests_per_sec, self.max_speedup, max_interval=self.backoff_cap)
+
+    def _with_retries(self, url, func, retry_attempts=None):
+        # Run func (one request to url) under the throttle, reporting each outcome to it and retrying throttling,
+        # server and network errors with jittered exponential backoff (or the server's Retry-After if longer).
+        # Backoff sleeps are outside the throttle, so other requests carry on meanwhile.
+        if retry_attempts is None:
+            retry_attempts = self.retry_attempts
+        attempt = 0
+        while True:
+            attempt += 1
+            queued = start = time.monotonic()
+            try:
+                with self._throttled(url):
+                    # The throttle is told how long the host took to answer, not counting the wait for a slot
+                    start = time.monotonic()
+                    self.metrics.observe("sleep", start - queued)
+                    self.metrics.inc("requests")
+                    with self.metrics.timer("fetch"):
+                        status, result = func()
+            except Exception as ex:
+                self.metrics.inc("request_errors")
+                headers = getattr(ex, "headers", None)
+                retry_after = retry_after_seconds(headers) if isinstance(ex, urllib.error.HTTPError) else None
+                if self.throttle is not None:
+                    self.throttle.feedback(url, time.monotonic() - start, getattr(ex, "code", None), retry_after)
+                if attempt >= retry_attempts or not is_retryable(ex):
+                    raise
+                retry_sleep = max(retry_after or 0.0, backoff_delay(attempt, self.backoff_base, self.backoff_cap))
+                if self.transport.offline:
+                    retry_sleep = 0.0
+                logging.warning(
+                    f"Attempt #{attempt} request error. url: {url}, exception: {ex} "
+                    f"(sleeping for {retry_sleep:.1f} sec)"
+                )
+                self.metrics.inc("retries")
+                with self.metrics.timer("sleep"):
+                    time.sleep(retry_sleep)
+                continue
+            if self.throttle is not None:
+                self.throttle.feedback(url, time.monotonic() - start, status)
+            return result
 
     @staticmethod
     def valid_filename(name) -> str:
@@ -36,11 +311,100 @@ class Crawler:
         soup = BeautifulSoup(html, "html.parser")
         return soup
 
+    def _record_cache(self, cache_path, url, hit) -> None:
+        self.metrics.inc("cache_hits" if hit else "cache_misses")
+        if cache_path not in self._cache_stats:
+            self._cache_stats[cache_path] = CacheStats(cache_path)
+        self._cache_stats[cache_path].record(url, hit)
+
+    def _save_cache_stats(self) -> None:
+        for stats in self._cache_stats.values():
+            stats.save()
+
+    def _apply_cache_policy(self, cache_path) -> None:
+        # Run after each index crawl, so the cache stays within its size budget as a long crawl goes on. Pruning
+        # scans the whole cache, so after the first time it's only done once the bytes downloaded since (more than
+        # the cache grew by) could have taken it over budget.
+        self._save_cache_stats()
+        max_bytes = self.cache_policy.max_bytes
+        if max_bytes is None:
+            return
+        downloaded = self.metrics.counters["bytes"]
+        if cache_path in self._pruned:
+            size, pruned_downloaded = self._pruned[cache_path]
+            if size + downloaded - pruned_downloaded <= max_bytes:
+                return
+        summary = self._get_cache(cache_path).prune(self.cache_policy)
+        self._pruned[cache_path] = (summary.bytes, downloaded)
+
+    def _link_save_path(self, cache_path, save_path) -> None:
+        # Symlinked files depend on the cache's blobs, which prune then keeps
+        if self.materialize == "symlink" and (cache_path, save_path) not in self._linked_save_paths:
+            add_linked_save_path(cache_path, save_path)
+            self._linked_save_paths.add((cache_path, save_path))
+
     @staticmethod
     def save(obj, filename) -> None:
         with open(filename, "w") as f:
             f.write(str(obj))
 
+    def _fetch_page(self, url, cache_path, use_cache, kind=DETAIL) -> Tuple[CachedPage, bool]:
+        # Returns the cached page (raw response bytes plus sha256/encoding metadata), fetching it on a cache miss or
+        # when revalidation finds it changed. The page isn't parsed here. Pages older than kind's TTL are revalidated.
+        page_cache = self._get_page_cache(cache_path)
+        page = page_cache.get(url) if use_cache else None
+        revalidate = use_cache == REVALIDATE or (page is not None and self.cache_policy.is_expired(kind, page.fetched))
+
+        logging.debug(f"use_cache = {use_cache}")
+        logging.debug(f"cache_filename = {page_cache.filename(url)}")
+
+        if page is not None and not revalidate:
+            logging.info(f"Loading from cache: {page.filename}")
+            self._record_cache(cache_path, url, True)
+            return page, True
+
+        request_headers = {} if page is None else conditional_headers(page.validators)
+
+        logging.info(f"Scraping: {url}")
+
+        def request():
+            response = self.transport.request(url, request_headers)
+            return response.status, (response, response.read())
+
+        response, body = self._with_retries(url, request)
+
+        if response.status == 304:
+            logging.info(f"Not modified, loading from cache: {page.filename}")
+            page_cache.refresh(page)
+            self._record_cache(cache_path, url, True)
+            return page, True
+
+        logging.debug(f"Saving to cache: {page_cache.filename(url)}")
+        self.metrics.inc("bytes", len(body))
+        if use_cache:
+            self._record_cache(cache_path, url, False)
+        return page_cache.put(url, body, response.headers, kind), False
+
+    def _parse_page(self, page, tag_func=None) -> BeautifulSoup:
+        # With tag_func only the top level tags it selects are built, see parse_only_filter
+        parse_only = parse_only_filter(tag_func) if tag_func is not None and self.partial_parse else None
+        return BeautifulSoup(page.read_bytes(), self.parser, from_encoding=page.encoding, parse_only=parse_only)
+
+    def _scrape_page(self, url, cache_path, use_cache) -> Tuple[BeautifulSoup, bool]:
+        page, loaded_from_cache = self._fetch_page(url, cache_path, use_cache)
+        return self._parse_page(page), loaded_from_cache
+
+    def _extract(self, cache_path, kind, sha256, extract_func):
+        # Values extracted from a page are cached by page content hash, so unchanged pages are never parsed twice
+        key = f"{self.page_cache_prefix}{kind}-v{EXTRACT_VERSION}-{sha256}"
+        extract_cache = self._get_extract_cache(cache_path)
+        value = extract_cache.get(key)
+        if value is None:
+            with self.metrics.timer("parse"):
+                value = extract_func()
+            extract_cache.put(key, value)
+        return value
+
     @staticmethod
     def _get_header_info(headers) -> Tuple[str, str]:
         content_val = headers.get("Content-Disposition")
@@ -60,9 +424,104 @@ class Crawler:
             ext = ext.lower()
         return filename, ext
 
+    @staticmethod
+    def _is_saved_copy(save_filepath, size, mtime_ns, get_sha256) -> bool:
+        # Copies keep the mtime of what they were made from (see shutil.copy2), so a copy with the same size and mtime
+        # is taken to be unchanged without reading it, as rsync does. Otherwise it's compared by hash and, if the
+        # same, given that mtime so it's only checked by size and mtime next time.
+        stat = os.stat(save_filepath)
+        if stat.st_size != size:
+            return False
+        if mtime_ns is not None and stat.st_mtime_ns == mtime_ns:
+            return True
+        if FileCache.hash_file(save_filepath) != get_sha256():
+            return False
+        if mtime_ns is not None and not os.path.islink(save_filepath):
+            os.utime(save_filepath, ns=(stat.st_atime_ns, mtime_ns))
+        return True
+
+    @staticmethod
+    def _is_materialized(cache_filename, save_filepath, materialize, sha256) -> bool:
+        if not os.path.lexists(save_filepath):
+            return False
+        if os.path.islink(save_filepath) != (materialize == "symlink") or not os.path.exists(save_filepath):
+            return False
+        if os.path.samefile(cache_filename, save_filepath):
+            return True
+        stat = os.stat(cache_filename)
+        get_sha256 = (lambda: sha256) if sha256 is not None else (lambda: FileCache.hash_file(cache_filename))
+        return Crawler._is_saved_copy(save_filepath, stat.st_size, stat.st_mtime_ns, get_sha256)
+
+    @staticmethod
+    def _reflink(src, dst) -> None:
+        try:
+            import fcntl
+        except ImportError:
+            raise OSError(errno.EOPNOTSUPP, "reflink not supported on this platform")
+        ficlone = 0x40049409  # Linux FICLONE ioctl, supported by btrfs, xfs and others
+        with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+            try:
+                fcntl.ioctl(f_dst.fileno(), ficlone, f_src.fileno())
+            except OSError:
+                f_dst.close()
+                os.remove(dst)
+                raise
+        shutil.copystat(src, dst)
+
+    @staticmethod
+    def _materialize(cache_filename, save_filepath, materialize="copy", sha256=None) -> None:
+        if Crawler._is_materialized(cache_filename, save_filepath, materialize, sha256):
+            logging.debug(f"File already materialized: {save_filepath}")
+            return
+
+        # Made under a temp name then renamed into place, so concurrent crawls saving the same file never see a
+        # partial file
+        tmp_filepath = f"{save_filepath}.{uuid.uuid4().hex}.tmp"
+        try:
+            try:
+                if materialize == "hardlink":
+                    os.link(cache_filename, tmp_filepath)
+                elif materialize == "symlink":
+                    os.symlink(os.path.abspath(cache_filename), tmp_filepath)
+                elif materialize == "reflink":
+                    Crawler._reflink(cache_filename, tmp_filepath)
+                else:
+                    shutil.copy2(cache_filename, tmp_filepath)
+            except OSError as ex:
+                if materialize == "copy" or ex.errno not in MATERIALIZE_FALLBACK_ERRNOS:
+                    raise
+                logging.debug(f"Can't {materialize} {cache_filename} to {save_filepath} ({ex}), copying instead")
+                shutil.copy2(cache_filename, tmp_filepath)
+            os.replace(tmp_filepath, save_filepath)
+        finally:
+            if os.path.lexists(tmp_filepath):
+                os.remove(tmp_filepath)
+
+    @staticmethod
+    def _write_body(entry: CacheEntry, save_filepath) -> None:
+        # File bodies held in a cache database (see SqliteCache) can only be copied. Copies get the time the body was
+        # fetched as their mtime, in place of a blob file's, so unchanged ones aren't read again.
+        mtime_ns = None if entry.fetched is None else int(entry.fetched * 1e9)
+        if os.path.isfile(save_filepath) and not os.path.islink(save_filepath):
+            if Crawler._is_saved_copy(save_filepath, entry.size, mtime_ns, lambda: entry.sha256):
+                logging.debug(f"File already materialized: {save_filepath}")
+                return
+        write_atomic(save_filepath, entry.read_bytes())
+        if mtime_ns is not None:
+            os.utime(save_filepath, ns=(mtime_ns, mtime_ns))
+
     @staticmethod
     def _savefile(
-        save_path, cache_filename, act_title, save_file_prefix, header_filename, header_ext, download_filename
+        save_path,
+        cache_filename,
+        act_title,
+        save_file_prefix,
+        header_filename,
+        header_ext,
+        download_filename,
+        materialize="copy",
+        sha256=None,
+        body_entry: Optional[CacheEntry] = None,
     ) -> str:
         title_filename = "" if act_title is None else Crawler.valid_filename(act_title)
         header_filename = Crawler.valid_filename(header_filename)
@@ -78,99 +537,441 @@ class Crawler:
         save_filepath = os.path.join(save_path, filename.lower())
         logging.info(f"Save file to {save_filepath}")
 
-        assert Path(cache_filename).is_file()
         save_filepath_abs = os.path.abspath(save_filepath)
-        shutil.copy2(cache_filename, save_filepath_abs)
+        if body_entry is not None:
+            Crawler._write_body(body_entry, save_filepath_abs)
+        else:
+            assert Path(cache_filename).is_file()
+            Crawler._materialize(cache_filename, save_filepath_abs, materialize, sha256)
         assert Path(save_filepath_abs).is_file()
 
         return save_filepath_abs
 
+    def _fetch_file(
+        self, download_link, cache_path, use_cache, retry_attempts=None
+    ) -> Tuple[Optional[CacheEntry], bool]:
+        # Returns the cache entry metadata (headers, blob filename) for download_link, downloading it on a cache miss
+        # or when revalidation finds it changed. The body is never read here, so a warm cache hit costs one small
+        # sidecar read.
+        file_cache = self._get_file_cache(cache_path)
+        entry = file_cache.get(download_link) if use_cache else None
+        expired = entry is not None and self.cache_policy.is_expired(FILE, entry.fetched)
+        revalidate = use_cache == REVALIDATE or expired
+
+        logging.debug(f"use_cache = {use_cache}")
+
+        if entry is not None and not revalidate:
+            logging.debug(f"Skipping download file: {entry.filename}")
+            self._record_cache(cache_path, download_link, True)
+            return entry, True
+
+        logging.debug(f"Scraping file from url: {download_link}")
+        download_filename_tmp = file_cache.temp_filename()
+        request_headers = {} if entry is None else conditional_headers(entry.headers)
+
+        def download():
+            # Stream file from url to disk, hashing it on the way, and get http headers
+            # download can throw many exceptions including urllib.error.ContentTooShortError and ContentTooLargeError
+            sha256 = hashlib.sha256()
+            status, headers = self.transport.download(
+                download_link, download_filename_tmp, request_headers, self.max_file_bytes, sha256
+            )
+            return status, (status, headers, sha256.hexdigest())
+
+        try:
+            status, headers, sha256 = self._with_retries(download_link, download, retry_attempts)
+        except Exception as ex:
+            logging.error(f"Failed to download url {download_link} ({ex}), skipping url.")
+            # TODO: write to and error file/log
+            if Path(download_filename_tmp).is_file():
+                os.remove(download_filename_tmp)
+            return None, False
+
+        if status == 304:
+            # Revalidated, the cached body is current. Still counts as a request for throttling.
+            logging.debug(f"Not modified: {download_link}")
+            file_cache.refresh(download_link, entry)
+            self._record_cache(cache_path, download_link, True)
+            return entry, False
+        if use_cache:
+            self._record_cache(cache_path, download_link, False)
+        self.metrics.inc("bytes", os.path.getsize(download_filename_tmp))
+
+        _, header_ext = self._get_header_info(headers)
+        download_split = os.path.splitext(download_link)
+        download_ext = "" if len(download_split) < 2 else download_split[1]
+        if len(download_ext) > 0 and header_ext is not None and download_ext.lower() != header_ext.lower():
+            # NOTE: for Astlii .txt files when .txt file requested we actually get .html page with dl links
+            logging.info(
+                f"Download vs header extension mismatch ({download_ext} vs {header_ext}) for download_link {download_link}"
+            )
+
+        # Store file contents once under its content hash, with headers in the url index
+        entry = file_cache.put(download_link, download_filename_tmp, headers, sha256)
+        return entry, False
+
     def _scrape_file(
-        self, act, download_link, save_path, save_file_prefix, cache_path, use_cache, retry_attempts=5
+        self, act, download_link, save_path, save_file_prefix, cache_path, use_cache, retry_attempts=None
     ) -> Tuple[str, str, bool, bool]:
         assert download_link is not None
         assert save_path is not None
         assert save_file_prefix is not None
 
-        cache_filename = f"{cache_path}legal-{self.valid_filename(download_link)}.urlretrieve"
-        cache_filename_exists = Path(cache_filename).is_file()
-        pkl_cache_filename = f"{cache_path}legal-{self.valid_filename(download_link)}.pkl"
-        pkl_cache_filename_exists = Path(pkl_cache_filename).is_file()
+        entry, loaded_from_cache = self._fetch_file(download_link, cache_path, use_cache, retry_attempts)
+        if entry is None:
+            return "", "", False, False
+
+        save_filepath_abs, header_ext = self._save_cached_file(act, entry, download_link, save_path, save_file_prefix)
+        return save_filepath_abs, header_ext, loaded_from_cache, True
+
+    def _save_cached_file(self, act, entry, download_link, save_path, save_file_prefix) -> Tuple[str, str]:
+        header_filename, header_ext = self._get_header_info(entry.http_headers())
+        logging.debug(f"header_filename = {header_filename}")
+        logging.debug(f"header_ext = {header_ext}")
+
+        # Copy or link file to target save_path
         download_filename = os.path.basename(download_link)
+        with self.metrics.timer("save"):
+            save_filepath_abs = Crawler._savefile(
+                save_path,
+                entry.filename,
+                act.title,
+                save_file_prefix,
+                header_filename,
+                header_ext,
+                download_filename,
+                self.materialize,
+                entry.sha256,
+                # Entries without a filename have their body in the cache database
+                entry if entry.filename == "" else None,
+            )
+        return save_filepath_abs, header_ext
 
-        logging.debug(f"use_cache = {use_cache}")
+    def _save_metadata(self, save_filename, act) -> None:
+        if not self.meta_json:
+            return
+        metadata_filename = os.path.splitext(save_filename)[0] + ".meta.json"
+        with self.metrics.timer("save"):
+            write_atomic(metadata_filename, json.dumps(dataclasses.asdict(act), indent=4).encode("utf-8"))
 
-        if not use_cache or not pkl_cache_filename_exists or not cache_filename_exists:
-            logging.debug(f"Scraping file from url: {download_link}")
-            loaded_from_cache = False
-
-            attempts = 0
-            headers = {}
-            urlretrieve_success = False
-            while attempts < retry_attempts:
-                try:
-                    # Save file from url to disk and get filename and http headers
-                    # urlretrieve can throw many exceptions including urllib.error.ContentTooShortError
-                    _, headers = urllib.request.urlretrieve(download_link, cache_filename)
-                    urlretrieve_success = True
-                except Exception as ex:
-                    attempts += 1
-                    retry_sleep = attempts * 10
-                    logging.warning(
-                        f"Attempt #{attempts} urlretrieve error. url: {download_link}"
-                        f", exception: {ex} (sleeping for {retry_sleep} sec)"
-                    )
-                    time.sleep(retry_sleep)
-                    continue
-                else:
-                    break
+    @staticmethod
+    def _open_manifest(save_path, incremental) -> Optional[ActManifest]:
+        return ActManifest(os.path.join(save_path, MANIFEST_FILENAME)) if incremental else None
 
-            if not urlretrieve_success:
-                logging.error(f"Failed to urlretrieve url {download_link} after {attempts} attempts, skipping url.")
-                # TODO: write to and error file/log
-                return "", "", False, False
-
-            header_filename, header_ext = self._get_header_info(headers)
-            logging.debug(f"header_filename = {header_filename}")
-            logging.debug(f"header_ext = {header_ext}")
-
-            download_split = os.path.splitext(download_link)
-            download_ext = "" if len(download_split) < 2 else download_split[1]
-            if len(download_ext) > 0 and header_ext is not None and download_ext.lower() != header_ext.lower():
-                # NOTE: for Astlii .txt files when .txt file requested we actually get .html page with dl links
-                logging.info(
-                    f"Download vs header extension mismatch ({download_ext} vs {header_ext}) for download_link {download_link}"
-                )
+    def _save_act(self, act, index_url, save_path, save_file_prefix, cache_path, use_cache, manifest, changes) -> None:
+        # Save act files and metadata, skipping acts whose detail page and download links are unchanged since the
+        # last incremental crawl when a manifest is given.
+        if manifest is None:
+            self._save_act_files(act, save_path, save_file_prefix, cache_path, use_cache)
+            return
 
-            # Pickle binary file contents and headers for cache retrieval
-            with open(cache_filename, mode="rb") as f_in:
-                file_bytes = f_in.read()
-                with open(pkl_cache_filename, "wb") as f_out:
-                    pickle.dump((file_bytes, cache_filename, headers), f_out, protocol=pickle.HIGHEST_PROTOCOL)
+        code = self._get_act_code(act)
+        if manifest.is_unchanged(code, act.page_url, act.download_links, save_path):
+            logging.debug(f"Act unchanged since last crawl, skipping: {code}")
+            act.saved_filenames = list(manifest.get(code).saved_filenames)
+            changes.unchanged.append(code)
+            return
 
-            # Copy file to target save_path
-            save_filepath_abs = Crawler._savefile(
-                save_path, cache_filename, act.title, save_file_prefix, header_filename, header_ext, download_filename
+        (changes.added if manifest.get(code) is None else changes.changed).append(code)
+        self._save_act_files(act, save_path, save_file_prefix, cache_path, use_cache)
+        self._update_manifest(act, code, index_url, cache_path, manifest)
+
+    def _update_manifest(self, act, code, index_url, cache_path, manifest) -> None:
+        file_cache = self._get_file_cache(cache_path)
+        file_hashes = {}
+        for download_link in act.download_links:
+            entry = file_cache.get(download_link)
+            if entry is not None:
+                file_hashes[download_link] = entry.sha256
+        manifest.update(
+            ManifestEntry(
+                code,
+                index_url,
+                act.page_url,
+                sorted(act.download_links),
+                file_hashes,
+                act.saved_filenames,
+                act.crawl_date,
             )
+        )
 
+    def _close_manifest(self, manifest, changes, index_url, seen_codes, complete) -> None:
+        # Acts can only be reported as removed when the whole index was crawled, i.e. no act_limit
+        if complete:
+            changes.removed = manifest.remove_missing(index_url, seen_codes)
+        manifest.save()
+        self.last_changes = changes
+        logging.info(f"Incremental crawl of {index_url}: {changes}")
+        for name in ("added", "changed", "removed"):
+            for code in getattr(changes, name):
+                logging.info(f"Act {name}: {code}")
+
+    def _write_run_report(self, save_path, index_url, started, start_metrics: CrawlMetrics, completed) -> None:
+        # The run's share of the crawler's metrics, plus the crawler totals so far
+        finished = time.time()
+        run_metrics = self.metrics.snapshot().minus(start_metrics)
+        seconds = finished - started
+        filename = report_filename(save_path, index_url)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.last_report = write_report(
+            filename,
+            run_metrics,
+            index_url=index_url,
+            started=started,
+            finished=finished,
+            seconds=seconds,
+            completed=completed,
+            acts_per_sec=run_metrics.counters["acts"] / seconds if seconds > 0 else 0.0,
+            bytes_per_sec=run_metrics.counters["bytes"] / seconds if seconds > 0 else 0.0,
+            total=self.metrics.snapshot().to_dict(),
+        )
+        if self.metrics_textfile is not None:
+            self.metrics.write_prometheus(self.metrics_textfile, {"crawler": type(self).__module__})
+        counters = run_metrics.counters
+        phases = ", ".join(f"{phase} {h.sum:.1f} sec" for phase, h in run_metrics.histograms.items())
+        logging.info(
+            f"Crawled {index_url} in {seconds:.1f} sec: {counters['acts']} acts, {counters['files']} files, "
+            f"{counters['requests']} requests ({counters['retries']} retries), {counters['bytes']} bytes, "
+            f"cache hits {counters['cache_hits']} / misses {counters['cache_misses']}, {phases}"
+        )
+
+    def _crawl_act(
+        self,
+        download_page_url,
+        index_url,
+        save_path,
+        save_file_prefix,
+        cache_path,
+        use_cache,
+        manifest,
+        changes,
+    ):
+        # Get act information then download act files (pdf, docx, etc) and metadata, skipping steps the journal
+        # shows were completed by an earlier, interrupted crawl
+        done = None if self.journal is None else self.journal.done_act(download_page_url)
+        if done is not None:
+            logging.debug(f"Act already crawled, skipping: {download_page_url}")
+            act = self.act_class(**done)
+            if manifest is not None:
+                # The interrupted crawl may not have got to save its manifest
+                code = self._get_act_code(act)
+                if manifest.get(code) is None:
+                    changes.added.append(code)
+                    self._update_manifest(act, code, index_url, cache_path, manifest)
+                else:
+                    changes.unchanged.append(code)
+            # Acts crawled just before a crash may not have been flushed to the catalog
+            self._add_to_catalog(save_path, act)
+            self.metrics.inc("acts")
+            return act
+
+        logging.debug(f"Crawling download page: {download_page_url}")
+        fields = None if self.journal is None else self.journal.act(download_page_url)
+        if fields is not None:
+            act = self.act_class(**fields)
         else:
-            logging.debug(f"Skipping download file: {cache_filename}")
-            loaded_from_cache = True
+            act = self._get_act(download_page_url, cache_path, use_cache)
+            if self.journal is not None:
+                self.journal.record_act(dataclasses.asdict(act))
+        self._save_act(act, index_url, save_path, save_file_prefix, cache_path, use_cache, manifest, changes)
+        if self.journal is not None:
+            self.journal.record_done(act.page_url, act.saved_filenames)
+        self._add_to_catalog(save_path, act)
+        self.metrics.inc("acts")
+        return act
+
+    def _crawl_frontier_act(self, download_page_url, *args):
+        # _crawl_act unless the act was already crawled in this run (e.g. from an earlier index page), then None
+        if self.frontier is None:
+            return self._crawl_act(download_page_url, *args)
+        if not self.frontier.claim(download_page_url):
+            logging.debug(f"Act already crawled in this run, skipping: {download_page_url}")
+            return None
+        try:
+            act = self._crawl_act(download_page_url, *args)
+        except BaseException:
+            self.frontier.release(download_page_url)
+            raise
+        self.frontier.done(download_page_url)
+        return act
 
-            # Load process pkl_cache_filename
-            with open(pkl_cache_filename, "rb") as f:
-                (file_bytes, cache_filename, headers) = pickle.load(f)
-                header_filename, header_ext = self._get_header_info(headers)
+    def iter_acts_from_index(
+        self,
+        index_url,
+        save_path,
+        save_file_prefix="",
+        cache_path=None,
+        use_cache=True,
+        act_limit=None,
+        delay_sec=5,
+        incremental=False,
+        resume=False,
+    ) -> Iterator:
+        """
+        Generator version of get_acts_from_index. Each act's detail page is scraped, its files downloaded and its
+        metadata written before it is yielded, so acts can be processed as soon as they are saved.
+        With resume=True, completed steps are recorded in a journal in save_path/legaldata-journal/ and a crawl of
+        index_url that was interrupted carries on from its first incomplete step, acts already saved are yielded from
+        the journal without any requests or file writes. The journal is removed once the crawl is finished.
+        Requests that aren't served from the cache start at least delay_sec apart to begin with, see AdaptiveThrottle
+        (unless a throttle has been set on the crawler, as sharded crawls do).
+        Acts already crawled in the run of the crawler's frontier, if set, are skipped and not yielded.
+        """
+        assert index_url is not None
+        assert save_path is not None
+        assert save_file_prefix is not None
+
+        if cache_path is None:
+            cache_path = self.default_cache_path
+
+        os.makedirs(cache_path, exist_ok=True)
+        os.makedirs(save_path, exist_ok=True)
+        self._link_save_path(cache_path, save_path)
+        manifest = self._open_manifest(save_path, incremental)
+        changes = ManifestChanges()
+        seen_codes = set()
+        finished = complete = False
+        self.journal = self._open_journal(save_path, index_url, resume)
+        started, start_metrics = time.time(), self.metrics.snapshot()
+        throttle = self.throttle
+        if throttle is None:
+            self.throttle = self._new_throttle(1, 1.0 / delay_sec if delay_sec else None)
+
+        try:
+            logging.info(f"Crawling index_url: {index_url}")
+            download_page_urls = None if self.journal is None else self.journal.download_page_urls()
+            if download_page_urls is None:
+                download_page_urls = unique_urls(self._get_download_page_urls(index_url, cache_path, use_cache))
+                if self.journal is not None:
+                    self.journal.record_download_page_urls(download_page_urls)
+            logging.info(f"Number of download page URLs: {len(download_page_urls)}")
+
+            skipped = 0
+            for i, download_page_url in enumerate(download_page_urls):
+                if act_limit is not None and i >= act_limit:
+                    break
 
-                # Copy file to target save_path
-                save_filepath_abs = Crawler._savefile(
+                act = self._crawl_frontier_act(
+                    download_page_url,
+                    index_url,
                     save_path,
-                    cache_filename,
-                    act.title,
                     save_file_prefix,
-                    header_filename,
-                    header_ext,
-                    download_filename,
+                    cache_path,
+                    use_cache,
+                    manifest,
+                    changes,
                 )
+                if act is None:
+                    skipped += 1
+                    continue
+                seen_codes.add(self._get_act_code(act))
+                yield act
+            # Skipped acts' codes aren't known, so no act can be reported as removed
+            finished = act_limit is None
+            complete = finished and skipped == 0
+        finally:
+            self._close_journal(finished)
+            self.throttle = throttle
+            self._flush_catalog(save_path)
+            # Also runs if the caller stops iterating early, so progress so far is kept in the manifest
+            if manifest is not None:
+                self._close_manifest(manifest, changes, index_url, seen_codes, complete)
+            self._apply_cache_policy(cache_path)
+            self._write_run_report(save_path, index_url, started, start_metrics, complete)
 
-        return save_filepath_abs, header_ext, loaded_from_cache, True
+    async def get_acts_from_index_async(
+        self,
+        index_url,
+        save_path,
+        save_file_prefix="",
+        cache_path=None,
+        use_cache=True,
+        act_limit=None,
+        max_per_host=4,
+        requests_per_sec=1.0,
+        incremental=False,
+        resume=False,
+    ) -> List:
+        """
+        Async version of get_acts_from_index. Detail pages and act files are fetched concurrently, with at most
+        max_per_host requests in flight per host and request starts spaced to requests_per_sec per host (unless a
+        throttle has been set on the crawler, as sharded crawls do).
+        Returns the same Act objects, in the same order, and writes the same files as get_acts_from_index.
+        With incremental=True, acts unchanged since the last incremental crawl are skipped (see last_changes).
+        Acts already crawled in the run of the crawler's frontier, if set, are skipped and not returned.
+        resume works as in iter_acts_from_index.
+        """
+        assert index_url is not None
+        assert save_path is not None
+        assert save_file_prefix is not None
+
+        if cache_path is None:
+            cache_path = self.default_cache_path
+
+        os.makedirs(cache_path, exist_ok=True)
+        os.makedirs(save_path, exist_ok=True)
+        self._link_save_path(cache_path, save_path)
+
+        manifest = self._open_manifest(save_path, incremental)
+        changes = ManifestChanges()
+
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=max_per_host * 2)
+        throttle = self.throttle
+        if throttle is None:
+            self.throttle = self._new_throttle(max_per_host, requests_per_sec)
+
+        self.journal = self._open_journal(save_path, index_url, resume)
+        started, start_metrics = time.time(), self.metrics.snapshot()
+        finished = completed = False
+        seen_codes = set()
+
+        async def crawl_act(download_page_url):
+            act = await loop.run_in_executor(
+                executor,
+                self._crawl_frontier_act,
+                download_page_url,
+                index_url,
+                save_path,
+                save_file_prefix,
+                cache_path,
+                use_cache,
+                manifest,
+                changes,
+            )
+            if act is not None:
+                seen_codes.add(self._get_act_code(act))
+            return act
+
+        try:
+            logging.info(f"Crawling index_url (async): {index_url}")
+            download_page_urls = None if self.journal is None else self.journal.download_page_urls()
+            if download_page_urls is None:
+                download_page_urls = await loop.run_in_executor(
+                    executor, self._get_download_page_urls, index_url, cache_path, use_cache
+                )
+                download_page_urls = unique_urls(download_page_urls)
+                if self.journal is not None:
+                    self.journal.record_download_page_urls(download_page_urls)
+            logging.info(f"Number of download page URLs: {len(download_page_urls)}")
+            if act_limit is not None:
+                download_page_urls = download_page_urls[:act_limit]
+
+            acts = await asyncio.gather(*[crawl_act(url) for url in download_page_urls])
+            # Acts skipped by the frontier are None
+            finished = act_limit is None
+            completed = finished and None not in acts
+            acts = [act for act in acts if act is not None]
+        finally:
+            self.throttle = throttle
+            # Acts already being crawled when one fails or the task is cancelled still finish
+            executor.shutdown(wait=True)
+            self._close_journal(finished)
+            self._flush_catalog(save_path)
+            # Also runs if an act fails, so the acts saved so far are kept in the manifest
+            if manifest is not None:
+                self._close_manifest(manifest, changes, index_url, seen_codes, completed)
+            self._apply_cache_policy(cache_path)
+            self._write_run_report(save_path, index_url, started, start_metrics, completed)
+
+        return list(acts)
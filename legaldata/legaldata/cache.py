@@ -0,0 +1,859 @@
+import os
+import re
+import abc
+import sys
+import gzip
+import json
+import time
+import uuid
+import pickle
+import hashlib
+import threading
+import logging
+import argparse
+import dataclasses
+import http.client
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Response validator header -> conditional request header
+VALIDATOR_HEADERS = {"etag": "If-None-Match", "last-modified": "If-Modified-Since"}
+# Kinds of cached entries, each with its own TTL
+INDEX, DETAIL, FILE = "index", "detail", "file"
+CACHE_KINDS = (INDEX, DETAIL, FILE)
+STATS_FILENAME = "cache-stats.json"
+PRUNE_LOCK_FILENAME = "cache-prune.lock"
+# Save paths with files symlinked to blobs (Crawler(materialize="symlink")), whose blobs prune keeps
+LINKED_SAVE_PATHS_FILENAME = "linked-save-paths.json"
+# Kind of extracted values, which can be compressed like pages. File bodies are never compressed, they are copied
+# or linked into the save path as is, and are mostly pdf/docx which are compressed already.
+EXTRACT = "extract"
+COMPRESSIBLE_KINDS = (INDEX, DETAIL, EXTRACT)
+COMPRESSION_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+
+def conditional_headers(headers) -> Dict[str, str]:
+    # headers is a list of [name, value] pairs as stored in the cache
+    return {VALIDATOR_HEADERS[k.lower()]: v for k, v in headers if k.lower() in VALIDATOR_HEADERS}
+
+
+def write_atomic(filename, data: bytes) -> None:
+    tmp_filename = f"{filename}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+    os.replace(tmp_filename, filename)
+
+
+def _write_json(filename, obj) -> None:
+    write_atomic(filename, json.dumps(obj).encode("utf-8"))
+
+
+def default_compression() -> str:
+    return "gzip" if zstandard is None else "zstd"
+
+
+def compression_by_kind(compression) -> Dict[str, Optional[str]]:
+    """
+    Compression of each compressible entry kind from a Crawler's compression option: None/False for none, True for
+    zstd (gzip if zstandard isn't installed), a compression name, or a dict of kind -> compression name or None.
+    """
+    if not compression:
+        return {}
+    if not isinstance(compression, dict):
+        compression = dict.fromkeys(COMPRESSIBLE_KINDS, compression)
+    by_kind = {}
+    for kind, name in compression.items():
+        assert kind in COMPRESSIBLE_KINDS, f"compressed kinds must be in {COMPRESSIBLE_KINDS}"
+        if name is True:
+            name = default_compression()
+        assert not name or name in COMPRESSION_SUFFIXES, f"compression must be one of {list(COMPRESSION_SUFFIXES)}"
+        if name == "zstd" and zstandard is None:
+            logging.warning("zstandard not installed, compressing cache entries with gzip instead")
+            name = "gzip"
+        by_kind[kind] = name or None
+    return by_kind
+
+
+# zstandard (de)compressors are reused but can't be shared between threads
+_zstd = threading.local()
+
+
+def _zstd_compressor():
+    if not hasattr(_zstd, "compressor"):
+        _zstd.compressor = zstandard.ZstdCompressor(level=3)
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.compressor, _zstd.decompressor
+
+
+def compress(data: bytes, compression) -> bytes:
+    if compression == "zstd":
+        return _zstd_compressor()[0].compress(data)
+    if compression == "gzip":
+        # Low level, most of gzip's ratio for a fraction of the time of the default 9
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return data
+
+
+def decompress(data: bytes, compression) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstandard isn't installed, can't read zstd compressed cache entry")
+        return _zstd_compressor()[1].decompress(data)
+    if compression == "gzip":
+        return gzip.decompress(data)
+    return data
+
+
+def _touch(filename) -> None:
+    # Sidecar mtimes record when an entry was last used, for LRU eviction
+    try:
+        os.utime(filename)
+    except OSError:
+        pass
+
+
+@contextmanager
+def file_lock(lock_filename, remove=False):
+    """
+    Exclusive lock between processes (and machines, on filesystems with working flock) held for the with block.
+    With remove, the lock file is removed before the lock is released, so none is left next to the files it guards.
+    Where fcntl isn't available (Windows) this doesn't lock, so only single process use is safe there.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    while True:
+        f = open(lock_filename, "a")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # A holder may have removed the file while this waited for it, then the lock is on the replacing file
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(lock_filename)):
+                break
+        except FileNotFoundError:
+            pass
+        f.close()
+    try:
+        yield
+    finally:
+        if remove:
+            remove_if_exists(lock_filename)
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    sha256: str
+    size: int
+    headers: List[List[str]]
+    filename: str
+    # Time the body was downloaded or last revalidated, None in entries cached before it was recorded
+    fetched: Optional[float] = None
+
+    def open(self):
+        return open(self.filename, "rb")
+
+    def read_bytes(self) -> bytes:
+        with self.open() as f:
+            return f.read()
+
+    def http_headers(self) -> http.client.HTTPMessage:
+        message = http.client.HTTPMessage()
+        for key, value in self.headers:
+            message[key] = value
+        return message
+
+
+class FileCache:
+    """
+    Content addressed store for downloaded files. Each body is stored once under blobs/<sha256[:2]>/<sha256>, and a
+    small json sidecar per url (files/<key>.json) maps the url to its blob and response headers. Identical files
+    downloaded from different urls share one blob.
+
+    The legacy layout (<key>.urlretrieve body plus <key>.pkl pickle of body and headers) is migrated on lookup.
+    """
+
+    def __init__(self, cache_path, key_func: Callable[[str], str]):
+        self.cache_path = cache_path
+        self.key_func = key_func
+        self.blobs_path = os.path.join(cache_path, "blobs")
+        self.index_path = os.path.join(cache_path, "files")
+        os.makedirs(self.blobs_path, exist_ok=True)
+        os.makedirs(self.index_path, exist_ok=True)
+
+    @staticmethod
+    def hash_file(filename, chunk_size=1024 * 1024) -> str:
+        sha256 = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def blob_filename(self, sha256) -> str:
+        return os.path.join(self.blobs_path, sha256[:2], sha256)
+
+    def temp_filename(self) -> str:
+        # Temp files live next to the blobs so they can be renamed into place atomically
+        return os.path.join(self.blobs_path, f"tmp-{uuid.uuid4().hex}")
+
+    def _index_filename(self, key) -> str:
+        return os.path.join(self.index_path, f"{key}.json")
+
+    def get(self, url) -> Optional[CacheEntry]:
+        """
+        Metadata only lookup, the body is only read if the caller opens the returned entry.
+        """
+        key = self.key_func(url)
+        index_filename = self._index_filename(key)
+        if not Path(index_filename).is_file():
+            return self._migrate_legacy(key, url)
+
+        with open(index_filename) as f:
+            entry = CacheEntry(**json.load(f))
+        entry.filename = self.blob_filename(entry.sha256)
+        if not Path(entry.filename).is_file():
+            logging.warning(f"Cache blob missing for {url}, ignoring cache entry")
+            return None
+        if entry.fetched is None:
+            entry.fetched = os.path.getmtime(entry.filename)
+        _touch(index_filename)
+        return entry
+
+    def refresh(self, url, entry: CacheEntry) -> None:
+        # Revalidated, the body is current as of now
+        entry.fetched = time.time()
+        _write_json(self._index_filename(self.key_func(url)), dataclasses.asdict(entry))
+
+    def put(self, url, filename, headers, sha256=None) -> CacheEntry:
+        """
+        Move filename into the blob store and index it under url. filename is consumed. sha256 is the file's hash if
+        already known, e.g. hashed while downloading.
+        """
+        return self._put(self.key_func(url), url, filename, headers, sha256)
+
+    def _put(self, key, url, filename, headers, sha256=None) -> CacheEntry:
+        if sha256 is None:
+            sha256 = self.hash_file(filename)
+        size = os.path.getsize(filename)
+        blob_filename = self.blob_filename(sha256)
+        if Path(blob_filename).is_file():
+            os.remove(filename)
+        else:
+            os.makedirs(os.path.dirname(blob_filename), exist_ok=True)
+            os.replace(filename, blob_filename)
+
+        entry = CacheEntry(url, sha256, size, [[k, v] for k, v in headers.items()], blob_filename, time.time())
+        _write_json(self._index_filename(key), dataclasses.asdict(entry))
+        return entry
+
+    def _migrate_legacy(self, key, url) -> Optional[CacheEntry]:
+        legacy_filename = os.path.join(self.cache_path, f"{key}.urlretrieve")
+        pkl_filename = os.path.join(self.cache_path, f"{key}.pkl")
+        if not Path(legacy_filename).is_file() or not Path(pkl_filename).is_file():
+            return None
+
+        logging.info(f"Migrating legacy cache entry: {pkl_filename}")
+        with open(pkl_filename, "rb") as f:
+            _, _, headers = pickle.load(f)
+        entry = self._put(key, url, legacy_filename, headers)
+        os.remove(pkl_filename)
+        return entry
+
+    def migrate_legacy(self) -> int:
+        """
+        Migrate every legacy .urlretrieve/.pkl pair in cache_path. Urls aren't recorded in the legacy layout so
+        migrated entries are indexed by their key.
+        """
+        count = 0
+        for pkl_filename in Path(self.cache_path).glob("*.pkl"):
+            key = pkl_filename.stem
+            if not Path(self._index_filename(key)).is_file() and self._migrate_legacy(key, "") is not None:
+                count += 1
+        return count
+
+
+@dataclass
+class CachedPage:
+    url: str
+    sha256: str
+    encoding: Optional[str]
+    validators: List[List[str]]
+    filename: str
+    fetched: Optional[float] = None
+    kind: str = DETAIL
+    compression: Optional[str] = None
+
+    def read_bytes(self) -> bytes:
+        with open(self.filename, "rb") as f:
+            return decompress(f.read(), self.compression)
+
+
+class PageCache:
+    """
+    Cache of html pages. The raw response bytes are kept in <key>.html with a json sidecar (<key>.html.json) holding
+    the body sha256, the response encoding and the ETag/Last-Modified validators. The sha256 lets parsed results be
+    looked up in an ExtractCache without reading or parsing the page.
+
+    Pages of the kinds compressed by compression (see compression_by_kind) are kept in <key>.html.zst or .gz
+    instead, the sidecar records which so entries written with any setting can be read.
+
+    Legacy pages (re-serialised soup, no sidecar) are hashed and given a sidecar on first lookup.
+    """
+
+    def __init__(self, cache_path, key_func: Callable[[str], str], compression: Dict[str, Optional[str]] = None):
+        self.cache_path = cache_path
+        self.key_func = key_func
+        self.compression = compression or {}
+
+    def filename(self, url) -> str:
+        return os.path.join(self.cache_path, f"{self.key_func(url)}.html")
+
+    def get(self, url) -> Optional[CachedPage]:
+        filename = self.filename(url)
+        sidecar_filename = f"{filename}.json"
+        if Path(sidecar_filename).is_file():
+            with open(sidecar_filename) as f:
+                page = CachedPage(**json.load(f))
+            page.filename = filename + COMPRESSION_SUFFIXES.get(page.compression, "")
+            if not Path(page.filename).is_file():
+                return None
+            if page.compression == "zstd" and zstandard is None:
+                logging.warning(f"zstandard not installed, ignoring zstd compressed cached page {page.filename}")
+                return None
+            if page.fetched is None:
+                page.fetched = os.path.getmtime(page.filename)
+            _touch(sidecar_filename)
+            return page
+
+        if not Path(filename).is_file():
+            return None
+
+        logging.debug(f"Adding sidecar to legacy cached page: {filename}")
+        validators = []
+        validators_filename = f"{filename}.validators.json"
+        if Path(validators_filename).is_file():
+            with open(validators_filename) as f:
+                validators = json.load(f)
+            os.remove(validators_filename)
+        page = CachedPage(url, FileCache.hash_file(filename), None, validators, filename, os.path.getmtime(filename))
+        _write_json(sidecar_filename, dataclasses.asdict(page))
+        return page
+
+    def put(self, url, body: bytes, headers, kind=DETAIL) -> CachedPage:
+        filename = self.filename(url)
+        compression = self.compression.get(kind)
+        encoding = headers.get_content_charset() if hasattr(headers, "get_content_charset") else None
+        validators = [[k, v] for k, v in headers.items() if k.lower() in VALIDATOR_HEADERS]
+        body_filename = filename + COMPRESSION_SUFFIXES.get(compression, "")
+        sha256 = hashlib.sha256(body).hexdigest()
+        page = CachedPage(url, sha256, encoding, validators, body_filename, time.time(), kind, compression)
+        write_atomic(body_filename, compress(body, compression))
+        _write_json(f"{filename}.json", dataclasses.asdict(page))
+        # Drop the body stored under another compression setting
+        for other in [None] + list(COMPRESSION_SUFFIXES):
+            if other != compression:
+                remove_if_exists(filename + COMPRESSION_SUFFIXES.get(other, ""))
+        return page
+
+    def refresh(self, page: CachedPage) -> None:
+        page.fetched = time.time()
+        _write_json(f"{self.filename(page.url)}.json", dataclasses.asdict(page))
+
+
+class ExtractCache:
+    """
+    Json cache of values extracted from parsed pages (act fields, link lists), keyed by the page body sha256 so an
+    unchanged page is only ever parsed once. Values are kept in <key>.json, or <key>.json.zst/.gz if compressed.
+    """
+
+    def __init__(self, cache_path, compression: Optional[str] = None):
+        self.extract_path = os.path.join(cache_path, "extract")
+        self.compression = compression
+        os.makedirs(self.extract_path, exist_ok=True)
+        # Values never change for a key, so whichever compression a value was stored with can be read
+        self._read_order = [compression] + [c for c in [None] + list(COMPRESSION_SUFFIXES) if c != compression]
+
+    def _filename(self, key, compression=None) -> str:
+        return os.path.join(self.extract_path, f"{key}.json{COMPRESSION_SUFFIXES.get(compression, '')}")
+
+    def get(self, key):
+        for compression in self._read_order:
+            filename = self._filename(key, compression)
+            if Path(filename).is_file():
+                with open(filename, "rb") as f:
+                    return json.loads(decompress(f.read(), compression))
+        return None
+
+    def put(self, key, value) -> None:
+        write_atomic(
+            self._filename(key, self.compression), compress(json.dumps(value).encode("utf-8"), self.compression)
+        )
+
+
+def remove_if_exists(filename) -> None:
+    # Entries can be removed by a concurrent prune or rewritten by a crawl
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def url_site(url) -> str:
+    return urlparse(url).netloc.lower() or "-"
+
+
+@dataclass
+class CachePolicy:
+    """
+    Cache size budget and per kind time to live in seconds (None for no limit). Entries older than their kind's TTL
+    are revalidated (conditional request) when crawled and removed by prune, and prune evicts the least recently
+    used entries until the cache fits in max_bytes.
+    """
+
+    max_bytes: Optional[int] = None
+    index_ttl: Optional[float] = None
+    detail_ttl: Optional[float] = None
+    file_ttl: Optional[float] = None
+
+    def ttl(self, kind) -> Optional[float]:
+        return getattr(self, f"{kind}_ttl")
+
+    def is_expired(self, kind, fetched, now=None) -> bool:
+        ttl = self.ttl(kind)
+        if ttl is None or fetched is None:
+            return False
+        return (now or time.time()) - fetched > ttl
+
+
+class CacheStats:
+    """
+    Per site hit and miss counts of a cache path, added to cache-stats.json by save so counts accumulate across
+    crawls and processes.
+    """
+
+    def __init__(self, cache_path):
+        self.filename = os.path.join(cache_path, STATS_FILENAME)
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, url, hit) -> None:
+        counts = self._counts.setdefault(url_site(url), {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+    def load(self) -> Dict[str, Dict[str, int]]:
+        if not Path(self.filename).is_file():
+            return {}
+        with open(self.filename) as f:
+            return json.load(f)
+
+    def save(self) -> None:
+        if len(self._counts) == 0:
+            return
+        counts, self._counts = self._counts, {}
+        with file_lock(f"{self.filename}.lock"):
+            saved = self.load()
+            for site, site_counts in counts.items():
+                saved_counts = saved.setdefault(site, {"hits": 0, "misses": 0})
+                for name, count in site_counts.items():
+                    saved_counts[name] = saved_counts.get(name, 0) + count
+            _write_json(self.filename, saved)
+
+
+@dataclass
+class CacheItem:
+    kind: str
+    site: str
+    # Bytes of the entry's own files, file bodies are shared blobs counted separately
+    size: int
+    fetched: float
+    used: float
+    filenames: List[str]
+    # Body sha256, for file entries the blob they use
+    sha256: Optional[str] = None
+    url: str = ""
+
+
+def scan(cache_path) -> List[CacheItem]:
+    """
+    Every page and file entry in cache_path with its size and times. The last used time is the mtime of the entry's
+    sidecar, which lookups touch.
+    """
+    items = []
+    for sidecar in Path(cache_path).glob("*.html.json"):
+        try:
+            with open(sidecar) as f:
+                page = json.load(f)
+            html_filename = str(sidecar)[: -len(".json")] + COMPRESSION_SUFFIXES.get(page.get("compression"), "")
+            size = os.path.getsize(sidecar) + os.path.getsize(html_filename)
+            used = os.path.getmtime(sidecar)
+            fetched = page.get("fetched") or os.path.getmtime(html_filename)
+        except (OSError, ValueError):
+            continue
+        filenames = [html_filename, str(sidecar)]
+        items.append(
+            CacheItem(
+                page.get("kind", DETAIL),
+                url_site(page["url"]),
+                size,
+                fetched,
+                used,
+                filenames,
+                page["sha256"],
+                page["url"],
+            )
+        )
+
+    # Legacy pages get a sidecar on their next lookup
+    for html_filename in Path(cache_path).glob("*.html"):
+        if not Path(f"{html_filename}.json").is_file():
+            mtime = os.path.getmtime(html_filename)
+            items.append(CacheItem(DETAIL, "-", os.path.getsize(html_filename), mtime, mtime, [str(html_filename)]))
+
+    for index_filename in Path(cache_path, "files").glob("*.json"):
+        try:
+            with open(index_filename) as f:
+                entry = json.load(f)
+            used = os.path.getmtime(index_filename)
+            size = os.path.getsize(index_filename)
+        except (OSError, ValueError):
+            continue
+        fetched = entry.get("fetched") or used
+        filenames = [str(index_filename)]
+        items.append(
+            CacheItem(FILE, url_site(entry["url"]), size, fetched, used, filenames, entry["sha256"], entry["url"])
+        )
+
+    # Legacy file entries not migrated yet
+    for pkl_filename in Path(cache_path).glob("*.pkl"):
+        body_filename = pkl_filename.with_suffix(".urlretrieve")
+        filenames = [str(f) for f in (pkl_filename, body_filename) if f.is_file()]
+        size = sum(os.path.getsize(f) for f in filenames)
+        mtime = os.path.getmtime(pkl_filename)
+        items.append(CacheItem(FILE, "-", size, mtime, mtime, filenames))
+    return items
+
+
+def _blob_sizes(cache_path) -> Dict[str, int]:
+    sizes = {}
+    for blob in Path(cache_path, "blobs").glob("*/*"):
+        sizes[blob.name] = blob.stat().st_size
+    return sizes
+
+
+def _extract_sizes(cache_path) -> Dict[str, int]:
+    filenames = Path(cache_path, "extract").glob("*.json*")
+    return {str(f): f.stat().st_size for f in filenames if not f.name.endswith(".tmp")}
+
+
+def extract_sha256(filename) -> str:
+    # Extract cache keys end with the sha256 of the page (or file) they were extracted from
+    match = re.search(r"([0-9a-f]{64})\.json", os.path.basename(filename))
+    return "" if match is None else match.group(1)
+
+
+@dataclass
+class SiteStats:
+    entries: int = 0
+    bytes: int = 0
+    hits: int = 0
+    misses: int = 0
+    hit_ratio: Optional[float] = None
+    kinds: Dict[str, int] = field(default_factory=dict)
+
+
+def site_stats(items: List[CacheItem], blob_sizes, extract_bytes, counts) -> Dict[str, SiteStats]:
+    stats: Dict[str, SiteStats] = {}
+    site_blobs = {}
+    for item in items:
+        site = stats.setdefault(item.site, SiteStats())
+        site.entries += 1
+        site.bytes += item.size
+        site.kinds[item.kind] = site.kinds.get(item.kind, 0) + 1
+        if item.kind == FILE and item.sha256 is not None:
+            site_blobs.setdefault(item.site, set()).add(item.sha256)
+    for name, shas in site_blobs.items():
+        stats[name].bytes += sum(blob_sizes.get(sha, 0) for sha in shas)
+    if extract_bytes > 0:
+        stats.setdefault("-", SiteStats()).bytes += extract_bytes
+
+    for name, site_counts in counts.items():
+        site = stats.setdefault(name, SiteStats())
+        site.hits = site_counts.get("hits", 0)
+        site.misses = site_counts.get("misses", 0)
+        if site.hits + site.misses > 0:
+            site.hit_ratio = site.hits / (site.hits + site.misses)
+    return stats
+
+
+def cache_stats(cache_path) -> Dict[str, SiteStats]:
+    """
+    Entries, bytes (including file bodies) and hit ratio per source site. Extracted values and other cache
+    bookkeeping are reported under "-".
+    """
+    extract_bytes = sum(_extract_sizes(cache_path).values())
+    counts = CacheStats(cache_path).load()
+    return site_stats(scan(cache_path), _blob_sizes(cache_path), extract_bytes, counts)
+
+
+@dataclass
+class PruneSummary:
+    expired: int = 0
+    evicted: int = 0
+    removed_bytes: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class EvictionPlan:
+    removed: List[CacheItem]
+    kept: List[CacheItem]
+    # sha256 -> number of kept file entries using the blob
+    refs: Dict[str, int]
+    total: int
+    expired: int = 0
+    evicted: int = 0
+
+
+def plan_eviction(items: List[CacheItem], blob_sizes, extract_bytes, policy: CachePolicy, now) -> EvictionPlan:
+    # Entries older than their kind's TTL, then the least recently used until the rest fits in max_bytes. A blob's
+    # bytes are only freed when the last entry using it goes.
+    removed = [item for item in items if policy.is_expired(item.kind, item.fetched, now)]
+    kept = [item for item in items if not policy.is_expired(item.kind, item.fetched, now)]
+    refs: Dict[str, int] = {}
+    for item in kept:
+        if item.kind == FILE and item.sha256 is not None:
+            refs[item.sha256] = refs.get(item.sha256, 0) + 1
+
+    total = sum(item.size for item in kept) + sum(blob_sizes.get(sha, 0) for sha in refs) + extract_bytes
+    plan = EvictionPlan(removed, kept, refs, total, expired=len(removed))
+    if policy.max_bytes is not None and plan.total > policy.max_bytes:
+        kept.sort(key=lambda item: item.used)
+        while len(kept) > 0 and plan.total > policy.max_bytes:
+            item = kept.pop(0)
+            removed.append(item)
+            plan.evicted += 1
+            plan.total -= item.size
+            if item.kind == FILE and item.sha256 is not None:
+                refs[item.sha256] -= 1
+                if refs[item.sha256] == 0:
+                    del refs[item.sha256]
+                    plan.total -= blob_sizes.get(item.sha256, 0)
+    return plan
+
+
+def log_prune(cache_path, summary: PruneSummary) -> None:
+    logging.info(
+        f"Pruned {cache_path}: {summary.expired} expired and {summary.evicted} least recently used entries removed "
+        f"({summary.removed_bytes} bytes), {summary.entries} entries left"
+    )
+
+
+def add_linked_save_path(cache_path, save_path) -> None:
+    """
+    Record that files in save_path are symlinks to blobs of cache_path, so prune doesn't remove blobs they use.
+    """
+    filename = os.path.join(cache_path, LINKED_SAVE_PATHS_FILENAME)
+    save_path = os.path.abspath(save_path)
+    with file_lock(os.path.join(cache_path, PRUNE_LOCK_FILENAME)):
+        save_paths = _linked_save_paths(cache_path)
+        if save_path not in save_paths:
+            _write_json(filename, save_paths + [save_path])
+
+
+def _linked_save_paths(cache_path) -> List[str]:
+    filename = os.path.join(cache_path, LINKED_SAVE_PATHS_FILENAME)
+    if not Path(filename).is_file():
+        return []
+    with open(filename) as f:
+        return json.load(f)
+
+
+def linked_blobs(cache_path) -> Set[str]:
+    """
+    sha256 of the blobs of cache_path symlinked from files in save paths recorded by add_linked_save_path.
+    """
+    blobs_path = os.path.realpath(os.path.join(cache_path, "blobs"))
+    shas = set()
+    for save_path in _linked_save_paths(cache_path):
+        if not os.path.isdir(save_path):
+            continue
+        with os.scandir(save_path) as entries:
+            for entry in entries:
+                if not entry.is_symlink():
+                    continue
+                target = os.path.realpath(entry.path)
+                if os.path.dirname(os.path.dirname(target)) == blobs_path:
+                    shas.add(os.path.basename(target))
+    return shas
+
+
+def log_linked(cache_path, kept_shas) -> None:
+    if len(kept_shas) > 0:
+        logging.warning(
+            f"Kept {len(kept_shas)} file bodies in {cache_path} whose entries were pruned, files saved with "
+            f"materialize='symlink' still link to them"
+        )
+
+
+def prune(cache_path, policy: CachePolicy, dry_run=False, orphan_grace_sec=60 * 60) -> PruneSummary:
+    """
+    Remove entries older than their kind's TTL, then the least recently used entries until the cache fits in
+    policy.max_bytes. File bodies are removed once no entry uses them, along with values extracted from removed
+    pages. Unreferenced bodies and temp files newer than orphan_grace_sec are kept, they may belong to a crawl in
+    progress, and so are bodies that saved files link to (see add_linked_save_path).
+    """
+    with file_lock(os.path.join(cache_path, PRUNE_LOCK_FILENAME)):
+        now = time.time()
+        blob_sizes = _blob_sizes(cache_path)
+        linked = linked_blobs(cache_path)
+        extract_sizes = _extract_sizes(cache_path)
+        plan = plan_eviction(scan(cache_path), blob_sizes, sum(extract_sizes.values()), policy, now)
+
+        # Bodies used only by removed entries go now, never referenced ones once they're old enough
+        removed_shas = set(item.sha256 for item in plan.removed if item.kind == FILE)
+        filenames = [filename for item in plan.removed for filename in item.filenames]
+        blobs_path = os.path.join(cache_path, "blobs")
+        for sha256 in blob_sizes:
+            blob_filename = os.path.join(blobs_path, sha256[:2], sha256)
+            if sha256 in plan.refs or sha256 in linked:
+                continue
+            if sha256 in removed_shas or now - os.path.getmtime(blob_filename) > orphan_grace_sec:
+                filenames.append(blob_filename)
+
+        live_shas = set(item.sha256 for item in plan.kept)
+        for filename in extract_sizes:
+            if extract_sha256(filename) not in live_shas and now - os.path.getmtime(filename) > orphan_grace_sec:
+                filenames.append(filename)
+
+        tmp_filenames = list(Path(cache_path).rglob("*.tmp")) + list(Path(blobs_path).glob("tmp-*"))
+        for tmp in tmp_filenames:
+            if tmp.is_file() and now - tmp.stat().st_mtime > orphan_grace_sec:
+                filenames.append(str(tmp))
+
+        summary = PruneSummary(plan.expired, plan.evicted, 0, len(plan.kept), plan.total)
+        for filename in filenames:
+            try:
+                summary.removed_bytes += os.path.getsize(filename)
+            except OSError:
+                continue
+            if not dry_run:
+                remove_if_exists(filename)
+
+    log_prune(cache_path, summary)
+    log_linked(cache_path, (removed_shas - set(plan.refs)) & linked)
+    return summary
+
+
+class CacheBackend(abc.ABC):
+    """
+    Storage of a crawler's cache in cache_path: pages (see PageCache), files (see FileCache) and values extracted
+    from pages (see ExtractCache). Backends are selected with Crawler(cache_backend=...).
+    """
+
+    def __init__(self, cache_path, page_key_func=None, file_key_func=None, compression=None):
+        self.cache_path = cache_path
+        self.compression = compression or {}
+        self.pages = None
+        self.files = None
+        self.extracts = None
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, SiteStats]:
+        pass
+
+    @abc.abstractmethod
+    def prune(self, policy: CachePolicy, dry_run=False) -> PruneSummary:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class DirectoryCache(CacheBackend):
+    """
+    The original layout: a few files per page or file in cache_path (see PageCache, FileCache and ExtractCache).
+    """
+
+    def __init__(self, cache_path, page_key_func=None, file_key_func=None, compression=None):
+        super(DirectoryCache, self).__init__(cache_path, page_key_func, file_key_func, compression)
+        self.pages = PageCache(cache_path, page_key_func, self.compression)
+        self.files = FileCache(cache_path, file_key_func)
+        self.extracts = ExtractCache(cache_path, self.compression.get(EXTRACT))
+
+    def stats(self) -> Dict[str, SiteStats]:
+        return cache_stats(self.cache_path)
+
+    def prune(self, policy: CachePolicy, dry_run=False) -> PruneSummary:
+        return prune(self.cache_path, policy, dry_run)
+
+
+def open_cache(cache_path) -> CacheBackend:
+    # The backend a cache was written with, for tools that don't crawl (stats, prune)
+    from legaldata.sqlite_cache import DB_FILENAME, SqliteCache
+
+    if Path(cache_path, DB_FILENAME).is_file():
+        return SqliteCache(cache_path)
+    return DirectoryCache(cache_path)
+
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+DURATION_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+
+
+def parse_size(value) -> int:
+    # e.g. 500M, 20G, 1048576
+    value = value.strip().upper().rstrip("B")
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ""
+    return int(float(value[: len(value) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def parse_duration(value) -> float:
+    # e.g. 12h, 30d, 3600
+    value = value.strip().lower()
+    unit = value[-1:] if value[-1:] in DURATION_UNITS else "s"
+    return float(value.rstrip("smhdw")) * DURATION_UNITS[unit]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Report on or prune a legaldata cache")
+    parser.add_argument("command", choices=["stats", "prune"])
+    parser.add_argument("cache_path", nargs="?", default=".legaldata-cache/")
+    parser.add_argument("--max-size", type=parse_size, default=None, help="e.g. 20G")
+    for kind in CACHE_KINDS:
+        parser.add_argument(f"--{kind}-ttl", type=parse_duration, default=None, help=f"e.g. 30d, for {kind} entries")
+    parser.add_argument("--dry-run", action="store_true", help="report what prune would remove")
+    parser.add_argument("--json", action="store_true", help="print stats as json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s\t[%(levelname)s] %(name)s:\t%(message)s", level=logging.INFO)
+    cache = open_cache(args.cache_path)
+    if args.command == "prune":
+        policy = CachePolicy(args.max_size, args.index_ttl, args.detail_ttl, args.file_ttl)
+        summary = cache.prune(policy, dry_run=args.dry_run)
+        print(json.dumps(dataclasses.asdict(summary), indent=4))
+        return 0
+
+    stats = cache.stats()
+    if args.json:
+        print(json.dumps({site: dataclasses.asdict(s) for site, s in stats.items()}, indent=4))
+        return 0
+    print(f"{'site':40} {'entries':>8} {'MB':>10} {'hits':>8} {'misses':>8} {'hit ratio':>9}")
+    for site, s in sorted(stats.items()):
+        hit_ratio = "" if s.hit_ratio is None else f"{s.hit_ratio:.1%}"
+        print(f"{site:40} {s.entries:8} {s.bytes / 1024**2:10.1f} {s.hits:8} {s.misses:8} {hit_ratio:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import zipfile
+import tempfile
+import threading
+import http.client
+from typing import Dict, List, Tuple
+from legaldata.transport import DOWNLOAD_CHUNK_SIZE, Response, Transport
+
+INDEX_NAME = "cassette.jsonl"
+# Requests for the same url are told apart by these, e.g. a revalidating crawl's conditional requests
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+# Bodies of these content types are deflated in the archive, others (pdf, docx, zip...) are mostly compressed already
+DEFLATE_TYPES = ("text/", "application/rtf", "application/json", "application/xml", "application/xhtml+xml")
+# Bodies being recorded are kept in memory up to this size, larger ones are spooled to a temporary file
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+class CassetteMissError(LookupError):
+    """
+    The replayed cassette has no response for a request.
+    """
+
+
+def _conditions(headers) -> Tuple:
+    headers = headers or {}
+    return tuple(headers.get(name) for name in CONDITIONAL_HEADERS)
+
+
+def _http_message(header_pairs) -> http.client.HTTPMessage:
+    headers = http.client.HTTPMessage()
+    for name, value in header_pairs:
+        headers[name] = value
+    return headers
+
+
+class _RecordedBody:
+    """
+    Response body reader keeping a hashed copy of what the caller reads, for RecordingTransport.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.copy = tempfile.SpooledTemporaryFile(SPOOL_MAX_BYTES)
+        self.sha256 = hashlib.sha256()
+        self.length = 0
+
+    def read(self, size=None) -> bytes:
+        data = self.raw.read() if size is None else self.raw.read(size)
+        self.copy.write(data)
+        self.sha256.update(data)
+        self.length += len(data)
+        return data
+
+
+class RecordingTransport(Transport):
+    """
+    Transport recording every request sent and response received (status, headers and body, including redirects
+    and error responses) to a zip archive, for ReplayTransport. Identical bodies are stored once. The archive is
+    written to filename.tmp and only moved to filename by close(), so an interrupted recording leaves no cassette.
+
+    Bodies are recorded as the caller reads them and stored when the response is closed, so recording doesn't change
+    how much of a body is read: a download abandoned over its max_bytes (see Transport.download) is recorded up to
+    where it was abandoned, and replays the same way.
+    """
+
+    def __init__(self, filename, user_agent, **kwargs):
+        super(RecordingTransport, self).__init__(user_agent, **kwargs)
+        self.filename = filename
+        self._archive_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self._archive = zipfile.ZipFile(f"{filename}.tmp", "w")
+        self._bodies = set()
+        self._index: List[bytes] = []
+
+    def _record(self, url, headers, response: Response, body: _RecordedBody) -> None:
+        sha256 = body.sha256.hexdigest()
+        content_type = response.headers.get("Content-Type", "")
+        info = zipfile.ZipInfo(f"bodies/{sha256}")
+        info.compress_type = zipfile.ZIP_DEFLATED if content_type.startswith(DEFLATE_TYPES) else zipfile.ZIP_STORED
+        interaction = {
+            "url": url,
+            "request_headers": dict({"User-Agent": self.user_agent}, **(headers or {})),
+            "status": response.status,
+            "headers": list(response.headers.items()),
+            "sha256": sha256,
+        }
+        with self._archive_lock:
+            if sha256 not in self._bodies:
+                body.copy.seek(0)
+                with self._archive.open(info, "w", force_zip64=body.length >= zipfile.ZIP64_LIMIT) as f:
+                    shutil.copyfileobj(body.copy, f, DOWNLOAD_CHUNK_SIZE)
+                self._bodies.add(sha256)
+            self._index.append(json.dumps(interaction, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def _close_recorded(self, url, headers, response: Response, body: _RecordedBody) -> None:
+        # Releases the connection before waiting for the archive
+        response.close()
+        try:
+            self._record(url, headers, response, body)
+        finally:
+            body.copy.close()
+
+    def _send(self, url, headers) -> Response:
+        response = super(RecordingTransport, self)._send(url, headers)
+        body = _RecordedBody(response._raw)
+        return Response(
+            url, response.status, response.headers, body, lambda b: self._close_recorded(url, headers, response, b)
+        )
+
+    def close(self) -> None:
+        super(RecordingTransport, self).close()
+        with self._archive_lock:
+            if self._archive is None:
+                return
+            archive, self._archive = self._archive, None
+            archive.writestr(INDEX_NAME, b"".join(self._index), zipfile.ZIP_DEFLATED)
+            archive.close()
+        os.replace(f"{self.filename}.tmp", self.filename)
+        logging.info(f"Recorded {len(self._index)} responses ({len(self._bodies)} bodies) to {self.filename}")
+
+
+class ReplayTransport(Transport):
+    """
+    Transport answering requests from a RecordingTransport cassette, without any network access.
+    A url's recorded responses are replayed in the order they were recorded (e.g. a 503 then the retried 200) and
+    the last one is repeated after that. Requests with conditional headers get the responses recorded for the same
+    conditions if there are any, otherwise the url's non 304 responses. Urls that weren't recorded raise
+    CassetteMissError.
+    """
+
+    offline = True
+
+    def __init__(self, filename, user_agent, **kwargs):
+        super(ReplayTransport, self).__init__(user_agent, **kwargs)
+        self.filename = filename
+        self._archive = zipfile.ZipFile(filename, "r")
+        self._interactions: Dict[str, List[dict]] = {}
+        for line in self._archive.read(INDEX_NAME).splitlines():
+            interaction = json.loads(line)
+            self._interactions.setdefault(interaction["url"], []).append(interaction)
+        self._replay_lock = threading.Lock()
+        self._replayed: Dict[Tuple, int] = {}
+
+    def _lookup(self, url, headers) -> dict:
+        recorded = self._interactions.get(url)
+        if recorded is None:
+            raise CassetteMissError(f"No response recorded for {url} in {self.filename}")
+        conditions = _conditions(headers)
+        candidates = [i for i in recorded if _conditions(i["request_headers"]) == conditions]
+        if len(candidates) == 0:
+            candidates = [i for i in recorded if i["status"] != 304] or recorded
+        with self._replay_lock:
+            n = self._replayed.get((url, conditions), 0)
+            self._replayed[(url, conditions)] = n + 1
+        return candidates[min(n, len(candidates) - 1)]
+
+    def _send(self, url, headers) -> Response:
+        interaction = self._lookup(url, headers)
+        raw = self._archive.open(f"bodies/{interaction['sha256']}")
+        return Response(url, interaction["status"], _http_message(interaction["headers"]), raw, lambda r: r.close())
+
+    def close(self) -> None:
+        super(ReplayTransport, self).close()
+        self._archive.close()
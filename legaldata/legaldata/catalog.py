@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+import dataclasses
+from pathlib import Path
+from typing import Dict, List
+from legaldata.cache import file_lock, write_atomic
+
+CATALOG_FILENAME = "legaldata-catalog.jsonl"
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def catalog_filename(save_path) -> str:
+    return os.path.join(save_path, CATALOG_FILENAME)
+
+
+class ActCatalog:
+    """
+    Metadata of every crawled act in one json lines file, one act per line. Acts are buffered and appended
+    batch_size at a time, each batch with a single write so concurrent crawls (threads or processes sharing a
+    save_path) never interleave lines and a crash can at worst leave a torn last line, which load_catalog ignores.
+    Re-crawled acts are appended again, load_catalog keeps the latest line per act page url and compact_catalog
+    rewrites the file without the older ones.
+    """
+
+    def __init__(self, filename, batch_size=100):
+        assert batch_size > 0
+        self.filename = filename
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: List[bytes] = []
+
+    def add(self, act) -> None:
+        line = json.dumps(dataclasses.asdict(act), ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            self._pending.append(line)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if len(self._pending) == 0:
+            return
+        batch, self._pending = b"".join(self._pending), []
+        # Shared with compact_catalog, which replaces the file
+        with file_lock(f"{self.filename}.lock", remove=True):
+            fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, batch)
+            finally:
+                os.close(fd)
+
+    def close(self) -> None:
+        self.flush()
+
+
+def _read_lines(filename) -> Dict[str, dict]:
+    acts: Dict[str, dict] = {}
+    with open(filename, "rb") as f:
+        for line in f:
+            try:
+                act = json.loads(line)
+            except ValueError:
+                logging.warning(f"Ignoring incomplete catalog line in {filename}")
+                continue
+            # Re-added acts move to the end, so acts stay in the order they were last crawled
+            acts.pop(act["page_url"], None)
+            acts[act["page_url"]] = act
+    return acts
+
+
+def load_catalog(filename, act_class=None) -> List:
+    """
+    Every act in the catalog (latest crawl of each), as dicts or, with act_class, as act_class objects. Acts of
+    another schema (another crawler sharing the save_path) are left out when act_class is given.
+    """
+    if not Path(filename).is_file():
+        return []
+    acts = list(_read_lines(filename).values())
+    if act_class is None:
+        return acts
+    names = set(f.name for f in dataclasses.fields(act_class))
+    return [act_class(**act) for act in acts if act.keys() == names]
+
+
+def compact_catalog(filename) -> int:
+    """
+    Rewrite the catalog with only the latest line of each act. Returns the number of acts.
+    """
+    with file_lock(f"{filename}.lock", remove=True):
+        acts = _read_lines(filename)
+        lines = [json.dumps(act, ensure_ascii=False).encode("utf-8") + b"\n" for act in acts.values()]
+        write_atomic(filename, b"".join(lines))
+    return len(acts)
+
+
+def export_parquet(filename, parquet_filename) -> int:
+    """
+    Write the catalog to a Parquet file (pip install legaldata[parquet]). List fields become list columns and dict
+    fields (meta_tags) map columns. Returns the number of acts.
+    """
+    if pyarrow is None:
+        raise ImportError("Parquet export needs pyarrow, pip install legaldata[parquet]")
+    acts = load_catalog(filename)
+    columns = {}
+    # Fields of every schema in the catalog, missing ones are null
+    for name in dict.fromkeys(name for act in acts for name in act):
+        values = [act.get(name) for act in acts]
+        if all(value is None or isinstance(value, dict) for value in values):
+            values = [None if value is None else list(value.items()) for value in values]
+            columns[name] = pyarrow.array(values, pyarrow.map_(pyarrow.string(), pyarrow.string()))
+        else:
+            columns[name] = pyarrow.array(values)
+    table = pyarrow.table(columns)
+    tmp_filename = f"{parquet_filename}.tmp"
+    pyarrow.parquet.write_table(table, tmp_filename)
+    os.replace(tmp_filename, parquet_filename)
+    return len(acts)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Act catalog of a crawl save path")
+    parser.add_argument("command", choices=["compact", "parquet"])
+    parser.add_argument("save_path")
+    parser.add_argument(
+        "--output", default=None, help="parquet filename (default: <save_path>/legaldata-catalog.parquet)"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s\t[%(levelname)s] %(name)s:\t%(message)s", level=logging.INFO)
+    filename = catalog_filename(args.save_path)
+    if args.command == "compact":
+        count = compact_catalog(filename)
+    else:
+        output = args.output or os.path.join(args.save_path, "legaldata-catalog.parquet")
+        count = export_parquet(filename, output)
+    logging.info(f"{args.command}: {count} acts in {filename}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import os
+import sys
+import bisect
+import heapq
+import hashlib
+import threading
+from array import array
+from itertools import islice
+from typing import Iterable, List
+from urllib.parse import urlsplit, urlunsplit
+from legaldata.cache import file_lock
+
+FRONTIER_FILENAME = "legaldata-frontier.seen"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Hashes added since the last merge are kept in a set until there are this many (or 1/16 of the merged ones)
+MERGE_SIZE = 65536
+# Hashes are sorted this many at a time when loading, so loading millions doesn't build a list of them all
+SORT_CHUNK_SIZE = 1 << 20
+
+
+def normalize_url(url) -> str:
+    """
+    Url with the scheme and host lower cased, the default port, fragment and dot segments removed, e.g.
+    HTTPS://WWW.Legislation.gov.au:443/Details/./C2004A00001/Download#top becomes
+    https://www.legislation.gov.au/Details/C2004A00001/Download. Paths and queries are case sensitive so kept as is.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    netloc = f"[{host}]" if ":" in host else host
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    if parts.username is not None:
+        netloc = f"{parts.netloc.rpartition('@')[0]}@{netloc}"
+    segments = []
+    for segment in parts.path.split("/"):
+        if segment == "..":
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    if parts.path.endswith(("/.", "/..")):
+        segments.append("")
+    path = "/".join(segments) or "/"
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
+
+
+def url_hash(url) -> int:
+    # 8 bytes, collisions are unlikely below billions of urls (about 1 in 370,000 for 10 million)
+    digest = hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def unique_urls(urls: Iterable[str]) -> List[str]:
+    """
+    urls without the ones that normalize to an earlier url, in their original order and spelling.
+    """
+    seen = set()
+    unique = []
+    for url in urls:
+        key = normalize_url(url)
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+
+def _sorted_array(values: array) -> array:
+    starts = range(0, len(values), SORT_CHUNK_SIZE)
+    chunks = [array("Q", sorted(islice(values, start, start + SORT_CHUNK_SIZE))) for start in starts]
+    if len(chunks) == 1:
+        return chunks[0]
+    return array("Q", heapq.merge(*chunks))
+
+
+class SeenSet:
+    """
+    Thread safe set of 8 byte url hashes (see url_hash), kept as a sorted array plus a set of recent additions so
+    millions of urls take little more than 8 bytes each. With a filename, hashes are appended to it as they are
+    added, and hashes other processes append are picked up, e.g. sharded crawl workers sharing a file (see
+    file_lock). A record torn by a crash is dropped when the file is next opened.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._sorted = array("Q")
+        self._recent = set()
+        self._fd = None
+        self._offset = 0
+        if filename is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+            self._fd = os.open(filename, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            with file_lock(f"{filename}.lock"):
+                size = os.fstat(self._fd).st_size
+                if size % 8 != 0:
+                    os.ftruncate(self._fd, size - size % 8)
+                loaded = self._read_new()
+            self._sorted = _sorted_array(loaded)
+
+    def _read_new(self) -> array:
+        # Whole records appended to the file since it was last read
+        size = os.fstat(self._fd).st_size
+        new = array("Q", os.pread(self._fd, (size - self._offset) // 8 * 8, self._offset))
+        self._offset += len(new) * 8
+        if sys.byteorder == "big":
+            new.byteswap()
+        return new
+
+    def _catch_up(self) -> None:
+        for value in self._read_new():
+            self._insert(value)
+
+    def _in_memory(self, value) -> bool:
+        if value in self._recent:
+            return True
+        i = bisect.bisect_left(self._sorted, value)
+        return i < len(self._sorted) and self._sorted[i] == value
+
+    def _insert(self, value) -> None:
+        if self._in_memory(value):
+            return
+        self._recent.add(value)
+        if len(self._recent) >= max(MERGE_SIZE, len(self._sorted) // 16):
+            recent, self._recent = array("Q", sorted(self._recent)), set()
+            self._sorted = array("Q", heapq.merge(self._sorted, recent))
+
+    def __contains__(self, value) -> bool:
+        with self._lock:
+            if self._in_memory(value):
+                return True
+            if self._fd is None:
+                return False
+            self._catch_up()
+            return self._in_memory(value)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sorted) + len(self._recent)
+
+    def add(self, value) -> bool:
+        """
+        Add value, returns False if it was already in the set.
+        """
+        with self._lock:
+            if self._in_memory(value):
+                return False
+            if self._fd is not None:
+                with file_lock(f"{self.filename}.lock"):
+                    self._catch_up()
+                    if self._in_memory(value):
+                        return False
+                    record = array("Q", [value])
+                    if sys.byteorder == "big":
+                        record.byteswap()
+                    os.write(self._fd, record.tobytes())
+                    self._offset += 8
+            self._insert(value)
+            return True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class UrlFrontier:
+    """
+    Detail page urls of a crawl run spanning several index pages. Each (normalized) url is handed out once, so acts
+    listed on more than one index page are only fetched, parsed and saved the first time. Urls are marked done once
+    their act is saved, in a SeenSet persisted to filename if given, so they are also skipped when the run is resumed
+    or carried on by other processes sharing the file. A url whose crawl fails is released and can be claimed again.
+
+        crawler.frontier = UrlFrontier(os.path.join(save_path, FRONTIER_FILENAME))
+    """
+
+    def __init__(self, filename=None):
+        self.seen = SeenSet(filename)
+        self._lock = threading.Lock()
+        self._claimed = set()
+
+    def claim(self, url) -> bool:
+        """
+        True if url hasn't been claimed or done before, it's then claimed until done or released.
+        """
+        value = url_hash(url)
+        with self._lock:
+            if value in self._claimed or value in self.seen:
+                return False
+            self._claimed.add(value)
+            return True
+
+    def done(self, url) -> None:
+        value = url_hash(url)
+        self.seen.add(value)
+        with self._lock:
+            self._claimed.discard(value)
+
+    def release(self, url) -> None:
+        with self._lock:
+            self._claimed.discard(url_hash(url))
+
+    def close(self) -> None:
+        self.seen.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
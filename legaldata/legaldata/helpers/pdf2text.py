@@ -1,21 +1,244 @@
+import io
 import os
+import sys
+import json
+import time
+import uuid
+import signal
+import logging
+import argparse
+import dataclasses
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+from pdfminer.converter import TextConverter
 from pdfminer.high_level import extract_text
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from legaldata.cache import FileCache, write_atomic
 
+OUTPUT_SUFFIX = ".pdfminer.txt"
+PAGE_INDEX_SUFFIX = ".pages.json"
+SUMMARY_FILENAME = "pdf2text-summary.json"
 
-def convert_pdfminer(input_file):
-    # print(dir(pdfminer))
 
+def output_filename(input_file) -> str:
+    return f"{input_file}{OUTPUT_SUFFIX}"
+
+
+def page_index_filename(output_file) -> str:
+    return f"{output_file}{PAGE_INDEX_SUFFIX}"
+
+
+def convert_pdfminer_streaming(input_file, output_file, page_index=False) -> int:
+    """
+    Same text as extract_text, but pages are laid out and written to output_file one at a time so memory use doesn't
+    grow with the document length. With page_index, the byte offset of the start of each page in output_file (plus
+    the file length) is written to <output_file>.pages.json, see read_page. Returns the number of pages.
+    """
+    offsets = [0]
+    tmp_filename = f"{output_file}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(input_file, "rb") as fp, open(tmp_filename, "wb") as f:
+            resource_manager = PDFResourceManager()
+            page_text = io.StringIO()
+            device = TextConverter(resource_manager, page_text, laparams=LAParams())
+            interpreter = PDFPageInterpreter(resource_manager, device)
+            # caching=False stops the parsed objects of every page so far being kept for the whole document
+            for page in PDFPage.get_pages(fp, caching=False):
+                interpreter.process_page(page)
+                f.write(page_text.getvalue().encode("utf-8"))
+                offsets.append(f.tell())
+                page_text.seek(0)
+                page_text.truncate()
+            device.close()
+        os.replace(tmp_filename, output_file)
+    finally:
+        if Path(tmp_filename).is_file():
+            os.remove(tmp_filename)
+
+    if page_index:
+        write_atomic(page_index_filename(output_file), json.dumps(offsets).encode("utf-8"))
+    return len(offsets) - 1
+
+
+def read_page(output_file, page_number) -> str:
+    """
+    Text of page page_number (0 based) of a converted pdf, read using its page index without reading the whole file.
+    """
+    with open(page_index_filename(output_file)) as f:
+        offsets = json.load(f)
+    assert 0 <= page_number < len(offsets) - 1, f"page_number must be less than {len(offsets) - 1}"
+    with open(output_file, "rb") as f:
+        f.seek(offsets[page_number])
+        return f.read(offsets[page_number + 1] - offsets[page_number]).decode("utf-8")
+
+
+def convert_pdfminer(input_file, output_file=None, streaming=True, page_index=False):
     # https://stackoverflow.com/questions/26494211/extracting-text-from-a-pdf-file-using-pdfminer-in-python
     # https://pdfminersix.readthedocs.io/en/latest/topic/converting_pdf_to_text.html
     # https://pdfminersix.readthedocs.io/en/latest/reference/highlevel.html#api-extract-text
     # https://pdfminersix.readthedocs.io/en/latest/tutorial/composable.html
-    print("input_file = " + input_file)
-    text = extract_text(input_file)
-
-    output_file = os.path.join(input_file, ".pdfminer.txt")
+    logging.debug(f"input_file = {input_file}")
+    if output_file is None:
+        output_file = output_filename(input_file)
+    logging.debug(f"output_file = {output_file}")
 
-    with open(output_file, "w") as f:
-        print("output_file = " + output_file)
-        f.write(text)
+    # Written atomically so an interrupted conversion never leaves a partial file that looks up to date
+    if streaming or page_index:
+        convert_pdfminer_streaming(input_file, output_file, page_index)
+    else:
+        write_atomic(output_file, extract_text(input_file).encode("utf-8"))
 
     return output_file
+
+
+@dataclass
+class ConvertSummary:
+    converted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    input_bytes: int = 0
+    seconds: float = 0.0
+    files_per_sec: float = 0.0
+    bytes_per_sec: float = 0.0
+    failures: Dict[str, str] = field(default_factory=dict)
+    # pdf filename (relative to save_path) -> sha256 of the pdf its text output was made from
+    hashes: Dict[str, str] = field(default_factory=dict)
+
+
+def _is_up_to_date(input_file, previous_sha256, page_index) -> Optional[str]:
+    # Returns the pdf sha256 if its text output is up to date: newer than the pdf, or made from a pdf with the same
+    # content (e.g. the pdf was re-saved from the crawl cache with a new mtime). Pdfs are only hashed when needed.
+    output_file = output_filename(input_file)
+    if not Path(output_file).is_file():
+        return None
+    if page_index and not Path(page_index_filename(output_file)).is_file():
+        return None
+    if os.path.getmtime(output_file) >= os.path.getmtime(input_file):
+        return previous_sha256 or FileCache.hash_file(input_file)
+    if previous_sha256 is not None and FileCache.hash_file(input_file) == previous_sha256:
+        Path(output_file).touch()
+        return previous_sha256
+    return None
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("pdf conversion timed out")
+
+
+def _convert_with_timeout(input_file, timeout, streaming, page_index):
+    # Runs in a pool worker process. Pathological pdfs can keep pdfminer busy for hours, SIGALRM interrupts it
+    # (on platforms without SIGALRM conversions aren't timed out). An interval timer, as alarm() only takes whole
+    # seconds and alarm(0) would cancel a timeout under a second.
+    start = time.time()
+    use_alarm = timeout is not None and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        convert_pdfminer(input_file, streaming=streaming, page_index=page_index)
+        return "converted", None, time.time() - start
+    except TimeoutError:
+        return "timed_out", f"timed out after {timeout} sec", time.time() - start
+    except Exception as ex:
+        return "failed", f"{type(ex).__name__}: {ex}", time.time() - start
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _load_summary(save_path) -> Optional[ConvertSummary]:
+    summary_filename = os.path.join(save_path, SUMMARY_FILENAME)
+    if not Path(summary_filename).is_file():
+        return None
+    with open(summary_filename) as f:
+        return ConvertSummary(**json.load(f))
+
+
+def convert_all(
+    save_path, max_workers=None, timeout=300, force=False, streaming=True, page_index=False
+) -> ConvertSummary:
+    """
+    Convert every pdf under save_path to text (<name>.pdf.pdfminer.txt) across a process pool. Pdfs whose text is
+    already up to date are skipped, conversions taking longer than timeout seconds are abandoned, and a summary of
+    throughput and failures is written to save_path/pdf2text-summary.json. See convert_pdfminer_streaming for
+    streaming and page_index.
+    """
+    assert save_path is not None
+    assert timeout is None or timeout > 0
+
+    start = time.time()
+    previous = _load_summary(save_path)
+    # Hashes of the pdfs each text output was made from are kept in the summary
+    previous_hashes = {} if previous is None else previous.hashes
+    summary = ConvertSummary()
+
+    input_files: List[str] = []
+    for input_file in sorted(Path(save_path).rglob("*")):
+        if input_file.suffix.lower() != ".pdf" or not input_file.is_file():
+            continue
+        name = os.path.relpath(input_file, save_path)
+        sha256 = None if force else _is_up_to_date(str(input_file), previous_hashes.get(name), page_index)
+        if sha256 is not None:
+            summary.skipped += 1
+        else:
+            sha256 = FileCache.hash_file(input_file)
+            input_files.append(str(input_file))
+        summary.hashes[name] = sha256
+
+    logging.info(f"Converting {len(input_files)} pdfs in {save_path} ({summary.skipped} already up to date)")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_convert_with_timeout, f, timeout, streaming, page_index): f for f in input_files}
+        for i, future in enumerate(as_completed(futures)):
+            input_file = futures[future]
+            name = os.path.relpath(input_file, save_path)
+            status, error, seconds = future.result()
+            if status == "converted":
+                summary.converted += 1
+                summary.input_bytes += os.path.getsize(input_file)
+                logging.debug(f"Converted {name} in {seconds:.1f} sec ({i + 1} of {len(input_files)})")
+            else:
+                setattr(summary, status, getattr(summary, status) + 1)
+                summary.failures[name] = error
+                del summary.hashes[name]
+                logging.warning(f"Failed to convert {name}: {error}")
+
+    summary.seconds = time.time() - start
+    if summary.seconds > 0:
+        summary.files_per_sec = summary.converted / summary.seconds
+        summary.bytes_per_sec = summary.input_bytes / summary.seconds
+    write_atomic(
+        os.path.join(save_path, SUMMARY_FILENAME), json.dumps(dataclasses.asdict(summary), indent=4).encode("utf-8")
+    )
+    logging.info(
+        f"Converted {summary.converted}, skipped {summary.skipped}, failed {summary.failed}, "
+        f"timed out {summary.timed_out} in {summary.seconds:.1f} sec ({summary.files_per_sec:.2f} files/sec)"
+    )
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Convert the pdfs under save_path to text with pdfminer")
+    parser.add_argument("save_path")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: cpu count)")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed per pdf")
+    parser.add_argument("--force", action="store_true", help="convert pdfs even if their text is up to date")
+    parser.add_argument(
+        "--no-streaming", action="store_true", help="extract each pdf's text in memory rather than page by page"
+    )
+    parser.add_argument("--page-index", action="store_true", help="write a page offset index next to each text file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s\t[%(levelname)s] %(name)s:\t%(message)s", level=logging.INFO)
+    summary = convert_all(
+        args.save_path, args.workers, args.timeout, args.force, not args.no_streaming, args.page_index
+    )
+    return 1 if summary.failed + summary.timed_out > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+JOURNAL_DIRNAME = "legaldata-journal"
+
+
+def journal_filename(save_path, index_url) -> str:
+    key = hashlib.sha1(index_url.encode("utf-8")).hexdigest()
+    return os.path.join(save_path, JOURNAL_DIRNAME, f"{key}.jsonl")
+
+
+@dataclass
+class IndexState:
+    download_page_urls: Optional[List[str]] = None
+    acts: Dict[str, dict] = field(default_factory=dict)
+    files: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    done: Dict[str, List[str]] = field(default_factory=dict)
+
+
+class CrawlJournal:
+    """
+    Append-only json lines record of completed crawl steps: index page links fetched ("index"), act detail page
+    extracted ("act"), act file saved ("file") and act metadata written ("done", with the act's saved filenames).
+    Each line is appended with a single write so a crash (or several processes sharing the file) can at worst leave a
+    torn last line, which is ignored on load. Crawlers keep one per index url being crawled (see journal_filename)
+    and remove it once the crawl is finished, so it only ever holds the steps of one crawl.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, IndexState] = {}
+        if Path(filename).is_file():
+            self._load()
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self._fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _load(self) -> None:
+        count = 0
+        with open(self.filename, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Ignoring incomplete journal line in {self.filename}")
+                    continue
+                self._apply(record)
+                count += 1
+        logging.info(f"Loaded {count} steps from crawl journal {self.filename}")
+
+    def _apply(self, record) -> None:
+        step = record["step"]
+        state = self._indexes.setdefault(record["index_url"], IndexState())
+        if step == "index":
+            state.download_page_urls = record["download_page_urls"]
+        elif step == "act":
+            state.acts[record["act"]["page_url"]] = record["act"]
+        elif step == "file":
+            state.files[(record["page_url"], record["download_link"])] = record["filename"]
+        elif step == "done":
+            state.done[record["page_url"]] = record["saved_filenames"]
+
+    def append(self, record) -> None:
+        line = json.dumps(record).encode("utf-8") + b"\n"
+        with self._lock:
+            self._apply(record)
+            os.write(self._fd, line)
+
+    def open_index(self, index_url) -> "IndexJournal":
+        with self._lock:
+            state = self._indexes.setdefault(index_url, IndexState())
+        return IndexJournal(self, index_url, state)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            os.close(fd)
+
+    def remove(self) -> None:
+        self.close()
+        os.remove(self.filename)
+
+
+class IndexJournal:
+    """
+    Journal steps of one index url.
+    """
+
+    def __init__(self, journal: CrawlJournal, index_url, state: IndexState):
+        self.journal = journal
+        self.index_url = index_url
+        self.state = state
+
+    def download_page_urls(self) -> Optional[List[str]]:
+        return self.state.download_page_urls
+
+    def record_download_page_urls(self, download_page_urls) -> None:
+        self.journal.append({"step": "index", "index_url": self.index_url, "download_page_urls": download_page_urls})
+
+    def act(self, page_url) -> Optional[dict]:
+        return self.state.acts.get(page_url)
+
+    def record_act(self, act: dict) -> None:
+        self.journal.append({"step": "act", "index_url": self.index_url, "act": act})
+
+    def saved_file(self, page_url, download_link) -> Optional[str]:
+        return self.state.files.get((page_url, download_link))
+
+    def record_file(self, page_url, download_link, filename) -> None:
+        self.journal.append(
+            {
+                "step": "file",
+                "index_url": self.index_url,
+                "page_url": page_url,
+                "download_link": download_link,
+                "filename": filename,
+            }
+        )
+
+    def done_act(self, page_url) -> Optional[dict]:
+        # The act as extracted, with the filenames it was saved as
+        saved_filenames = self.state.done.get(page_url)
+        act = self.state.acts.get(page_url)
+        if saved_filenames is None or act is None:
+            return None
+        return dict(act, saved_filenames=saved_filenames)
+
+    def record_done(self, page_url, saved_filenames) -> None:
+        self.journal.append(
+            {"step": "done", "index_url": self.index_url, "page_url": page_url, "saved_filenames": saved_filenames}
+        )
@@ -1,18 +1,26 @@
 import os
 import re
-import time
-import json
-import dataclasses
 import logging
-import urllib
-import urllib.request
 from datetime import datetime
-from pathlib import Path
-from typing import List, Tuple
-from urllib.request import urlopen
-from bs4 import BeautifulSoup
+from typing import Dict, List
 from legaldata import base
+from legaldata.cache import INDEX
+from legaldata.frontier import unique_urls
 from legaldata.legislation.act import Act
+from legaldata.links import find_links
+
+# Match: /Details/C2018C00418/Download or /Details/<act_code>/Download
+DOWNLOAD_PAGE_PATTERN = re.compile(rb"../Details/([^/]*)/Download")
+# Match: /Details/C2014C00072/18b59cb0-976c-4721-ac2b-c5a57016703b or /Details/<act_code>/<code_guid>
+FILE_LINK_PATTERN = re.compile(
+    rb"../Details/([^/]*/[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12})"
+)
+ACT_DETAIL_IDS = (
+    "MainContent_ucLegItemPane_trNumberYearClassification",
+    "MainContent_ucLegItemPane_lblBD",
+    "MainContent_ucLegItemPane_lblAdminDepts",
+    "MainContent_leftDetailMeta",
+)
 
 
 class ActCrawler(base.Crawler):
@@ -24,41 +32,28 @@ class ActCrawler(base.Crawler):
     https://www.legislation.gov.au/Content/Linking
     """
 
-    def __init__(self, user_agent="Mozilla/5.0 pypi.org/project/legaldata/"):
-        super(ActCrawler, self).__init__()
-        self.user_agent = user_agent
-        opener = urllib.request.build_opener()
-        opener.addheaders = [("User-Agent", self.user_agent)]
-        urllib.request.install_opener(opener)
-
-    def _scrape_page(self, url, cache_path, use_cache) -> Tuple[BeautifulSoup, bool]:
-        cache_filename = f"{cache_path}legal-{self.valid_filename(url)}.html"
-        cache_filename_exists = Path(cache_filename).is_file()
-        loaded_from_cache = False
+    act_class = Act
 
-        logging.debug(f"use_cache = {use_cache}")
-        logging.debug(f"cache_filename = {cache_filename}")
+    def __init__(self, user_agent="Mozilla/5.0 pypi.org/project/legaldata/", **kwargs):
+        super(ActCrawler, self).__init__(user_agent, **kwargs)
+        self.page_cache_prefix = "legal-"
 
-        if not use_cache or not cache_filename_exists:
-            logging.info(f"Scraping: {url}")
-            response = urlopen(url)
-            soup = BeautifulSoup(response, "html.parser")
-            if cache_filename is not None:
-                logging.debug(f"Saving to cache: {cache_filename}")
-                self.save(soup, cache_filename)
-        else:
-            logging.info(f"Loading from cache: {cache_filename}")
-            soup = self.load(cache_filename)
-            loaded_from_cache = True
+    @staticmethod
+    def _get_act_download_page_urls(body, encoding=None) -> List[str]:
+        download_pages = find_links(
+            body, DOWNLOAD_PAGE_PATTERN, "https://www.legislation.gov.au/Details/{}/Download", encoding
+        )
+        return sorted(download_pages)
 
-        return soup, loaded_from_cache
+    @staticmethod
+    def _get_act_file_links(body, encoding=None) -> List[str]:
+        return find_links(body, FILE_LINK_PATTERN, "https://www.legislation.gov.au/Details/{}", encoding)
 
     @staticmethod
-    def _get_act_download_page_urls(soup) -> List[str]:
+    def _get_act_code(act) -> str:
         # Match: /Details/C2018C00418/Download or /Details/<act_code>/Download
-        act_codes = re.findall(r"../Details/([^/]*)/Download", str(soup))
-        download_pages = [f"https://www.legislation.gov.au/Details/{code}/Download" for code in act_codes]
-        return sorted(download_pages)
+        match = re.search(r"/Details/([^/]+)/", act.page_url)
+        return act.page_url if match is None else match.group(1)
 
     @staticmethod
     def clean_details_text(s) -> List[str]:
@@ -77,70 +72,77 @@ class ActCrawler(base.Crawler):
         use_cache=True,
         act_limit=None,
         delay_sec=5,
+        incremental=False,
+        resume=False,
     ) -> List[Act]:
-        assert index_url is not None
-        assert save_path is not None
-        assert save_file_prefix is not None
-
-        if cache_path is None:
-            cache_path = self.default_cache_path
-
-        os.makedirs(cache_path, exist_ok=True)
-        os.makedirs(save_path, exist_ok=True)
+        return list(
+            self.iter_acts_from_index(
+                index_url, save_path, save_file_prefix, cache_path, use_cache, act_limit, delay_sec, incremental, resume
+            )
+        )
 
-        logging.info(f"Crawling index_url: {index_url}")
+    def _get_download_page_urls(self, index_url, cache_path, use_cache) -> List[str]:
         logging.warning("TODO: Handle multiple pages in index page!")
         # TODO: WARN: Handle multiple pages in index page!
         #       Currently we hope all acts are on the first page, which is often the case
-        (seed_soup, loaded_from_cache) = self._scrape_page(index_url, cache_path, use_cache)
-        download_page_urls = self._get_act_download_page_urls(seed_soup)
-        logging.info(f"Number of download page URLs: {len(download_page_urls)}")
-
-        # Get act information
-        acts = []
-        for i, download_page_url in enumerate(download_page_urls):
-            if act_limit is not None and i >= act_limit:
-                break
-
-            logging.debug(f"Crawling download page: {download_page_url}")
-            act = self._get_act(download_page_url, cache_path, use_cache)
-            acts.append(act)
+        (page, loaded_from_cache) = self._fetch_page(index_url, cache_path, use_cache, INDEX)
+        return self._extract(
+            cache_path, "index", page.sha256, lambda: self._get_act_download_page_urls(page.read_bytes(), page.encoding)
+        )
 
-        # Download act files (pdf, docx, etc)
-        for act in acts:
-            act.saved_filenames = []
-            for i, download_link in enumerate(act.download_links):
+    def _save_act_files(self, act, save_path, save_file_prefix, cache_path, use_cache) -> None:
+        act.saved_filenames = []
+        for i, download_link in enumerate(act.download_links):
+            save_filename = self._journaled_file(act, download_link, save_path)
+            if save_filename is None:
                 # Save file (docx, rtf, txt, etc)
-                save_filename, file_ext, loaded_from_cache, success = self._scrape_file(
+                save_filename, _, _, success = self._scrape_file(
                     act, download_link, save_path, save_file_prefix, cache_path, use_cache
                 )
                 if not success:
                     continue
+                self._journal_file(act, download_link, save_filename)
+                self.metrics.inc("files")
 
-                act.saved_filenames.append(os.path.basename(save_filename))
-                # Save metadata
-                if i == (len(act.download_links) - 1):
-                    metadata_filename = os.path.splitext(save_filename)[0] + ".meta.json"
-                    with open(metadata_filename, "w") as f:
-                        metadata = json.dumps(dataclasses.asdict(act), indent=4)
-                        f.write(metadata)
-                # Throttle
-                if not loaded_from_cache:
-                    time.sleep(delay_sec)
-
-        return acts
+            act.saved_filenames.append(os.path.basename(save_filename))
+            # Save metadata
+            if i == (len(act.download_links) - 1):
+                self._save_metadata(save_filename, act)
 
     def _get_act(self, download_page_url, cache_path, use_cache) -> Act:
-        (soup, loaded_from_cache) = self._scrape_page(download_page_url, cache_path, use_cache)
+        (page, loaded_from_cache) = self._fetch_page(download_page_url, cache_path, use_cache)
+        fields = self._extract(cache_path, "act", page.sha256, lambda: self._extract_act_fields(page))
 
-        # Get file links by matching:
-        # /Details/C2014C00072/18b59cb0-976c-4721-ac2b-c5a57016703b or /Details/<act_code>/<code_guid>
-        code_guids = re.findall(
-            r"../Details/([^/]*/[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12})", str(soup)
+        crawl_date = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+        saved_filenames = []
+        return Act(
+            fields["title"],
+            fields["desc"],
+            fields["desc_full"],
+            fields["classification"],
+            fields["admins"],
+            fields["page_details"],
+            fields["meta_tags"],
+            download_page_url,
+            fields["download_links"],
+            loaded_from_cache,
+            crawl_date,
+            saved_filenames,
         )
-        download_links = [f"https://www.legislation.gov.au/Details/{code_guid}" for code_guid in code_guids]
-        download_links = list(set(download_links))
 
+    def _extract_act_fields(self, page) -> Dict:
+        # File links are matched in the raw page bytes, everything else comes from a partial parse
+        fields = self._get_act_fields(self._parse_page(page, self._is_act_tag))
+        fields["download_links"] = unique_urls(self._get_act_file_links(page.read_bytes(), page.encoding))
+        return fields
+
+    @staticmethod
+    def _is_act_tag(name, attrs) -> bool:
+        # Detail page tags used by _get_act_fields: meta tags and the details elements
+        return name == "meta" or attrs.get("id") in ACT_DETAIL_IDS
+
+    @staticmethod
+    def _get_act_fields(soup) -> Dict:
         # Get html <meta> tag info
         meta_tags_tuples = [(x.attrs.get("name", None), x.attrs.get("content", None)) for x in soup.find_all("meta")]
         meta_tags = dict([(x[0].strip().lower(), x[1].strip()) for x in meta_tags_tuples if x[0] is not None])
@@ -168,22 +170,15 @@ class ActCrawler(base.Crawler):
             page_details = "html id not found, try updating legaldata to latest version."
         page_details = ActCrawler.clean_details_text(page_details)
 
-        crawl_date = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-        saved_filenames = []
-        return Act(
-            title,
-            desc,
-            desc_full,
-            classification,
-            admins,
-            page_details,
-            meta_tags,
-            download_page_url,
-            download_links,
-            loaded_from_cache,
-            crawl_date,
-            saved_filenames,
-        )
+        return {
+            "title": title,
+            "desc": desc,
+            "desc_full": desc_full,
+            "classification": classification,
+            "admins": admins,
+            "page_details": page_details,
+            "meta_tags": meta_tags,
+        }
 
     @staticmethod
     def get_index_pages() -> List[str]:
@@ -199,7 +194,6 @@ class ActCrawler(base.Crawler):
             "https://www.legislation.gov.au/Browse/Results/ByTitle/Acts/InForce/Ad/0/0/principal",
             "https://www.legislation.gov.au/Browse/Results/ByTitle/Acts/InForce/Ae/0/0/principal",
             "https://www.legislation.gov.au/Browse/Results/ByTitle/Acts/InForce/Ag/0/0/principal",
-            "https://www.legislation.gov.au/Browse/Results/ByTitle/Acts/InForce/Ag/0/0/principal",
             "https://www.legislation.gov.au/Browse/Results/ByTitle/Acts/InForce/Ai/0/0/principal",
             "https://www.legislation.gov.au/Browse/Results/ByTitle/Acts/InForce/Al/0/0/principal",
             "https://www.legislation.gov.au/Browse/Results/ByTitle/Acts/InForce/An/0/0/principal",
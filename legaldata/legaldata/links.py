@@ -0,0 +1,30 @@
+import re
+import codecs
+from typing import List, Optional
+
+
+def _is_ascii_compatible(encoding) -> bool:
+    try:
+        return codecs.lookup(encoding).encode("<a href=/>")[0] == b"<a href=/>"
+    except LookupError:
+        return False
+
+
+def find_links(body: bytes, pattern: re.Pattern, template="{}", encoding: Optional[str] = None) -> List[str]:
+    """
+    Run a compiled bytes pattern once over a raw response body and return the matched links formatted into template,
+    deduplicated and in document order. The pattern's first group is used if it has one, else the whole match.
+
+    Link patterns are ascii so they match the raw bytes of any ascii compatible encoding (utf-8, latin-1, cp1252...),
+    other encodings (e.g. utf-16) are transcoded to utf-8 first.
+    """
+    if encoding is None or not _is_ascii_compatible(encoding):
+        if encoding is not None:
+            body = body.decode(encoding, "replace").encode("utf-8")
+        encoding = "utf-8"
+
+    group = 1 if pattern.groups > 0 else 0
+    links = dict.fromkeys(
+        template.format(match.group(group).decode(encoding, "replace")) for match in pattern.finditer(memoryview(body))
+    )
+    return list(links)
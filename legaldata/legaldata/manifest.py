@@ -0,0 +1,102 @@
+import os
+import json
+import logging
+import threading
+import dataclasses
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from legaldata.cache import file_lock, write_atomic
+
+MANIFEST_FILENAME = "legaldata-manifest.json"
+
+
+@dataclass
+class ManifestEntry:
+    code: str
+    index_url: str
+    page_url: str
+    download_links: List[str]
+    file_hashes: Dict[str, str]
+    saved_filenames: List[str]
+    crawl_date: str
+
+
+@dataclass
+class ManifestChanges:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    def __str__(self):
+        return (
+            f"added: {len(self.added)}, changed: {len(self.changed)}, "
+            f"removed: {len(self.removed)}, unchanged: {len(self.unchanged)}"
+        )
+
+
+class ActManifest:
+    """
+    Persistent record of crawled acts keyed by act code, used by incremental crawls to skip acts whose detail page
+    and download links haven't changed since the last crawl.
+
+    Several processes can share a manifest (e.g. a sharded crawl), save merges this instance's updates and removals
+    into the file as it is on disk at the time.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._updated = set()
+        self._removed = set()
+        self.entries: Dict[str, ManifestEntry] = self._load()
+        if len(self.entries) > 0:
+            logging.info(f"Loaded {len(self.entries)} acts from manifest {filename}")
+
+    def _load(self) -> Dict[str, ManifestEntry]:
+        if not Path(self.filename).is_file():
+            return {}
+        with open(self.filename) as f:
+            return {code: ManifestEntry(**entry) for code, entry in json.load(f).items()}
+
+    def get(self, code) -> Optional[ManifestEntry]:
+        with self._lock:
+            return self.entries.get(code)
+
+    def is_unchanged(self, code, page_url, download_links, save_path) -> bool:
+        entry = self.get(code)
+        if entry is None or entry.page_url != page_url:
+            return False
+        if sorted(entry.download_links) != sorted(download_links):
+            return False
+        return all(Path(os.path.join(save_path, filename)).is_file() for filename in entry.saved_filenames)
+
+    def update(self, entry: ManifestEntry) -> None:
+        with self._lock:
+            self.entries[entry.code] = entry
+            self._updated.add(entry.code)
+            self._removed.discard(entry.code)
+
+    def remove_missing(self, index_url, seen_codes) -> List[str]:
+        with self._lock:
+            removed = [
+                code for code, entry in self.entries.items() if entry.index_url == index_url and code not in seen_codes
+            ]
+            for code in removed:
+                del self.entries[code]
+                self._updated.discard(code)
+                self._removed.add(code)
+        return sorted(removed)
+
+    def save(self) -> None:
+        with file_lock(f"{self.filename}.lock", remove=True), self._lock:
+            entries = self._load()
+            entries.update({code: self.entries[code] for code in self._updated})
+            for code in self._removed:
+                entries.pop(code, None)
+            self.entries = entries
+            self._updated.clear()
+            self._removed.clear()
+            data = {code: dataclasses.asdict(entry) for code, entry in entries.items()}
+            write_atomic(self.filename, json.dumps(data).encode("utf-8"))
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import dataclasses
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from legaldata.cache import write_atomic
+
+REPORTS_DIRNAME = "legaldata-run-reports"
+# Upper bounds in seconds, shared by every phase so histograms can be compared and merged
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+COUNTERS = ("requests", "request_errors", "retries", "bytes", "cache_hits", "cache_misses", "acts", "files")
+# fetch: network requests, parse: page parsing and extraction, save: writing files into save_path, sleep: waiting
+# for the throttle (request spacing) and backing off between retries
+PHASES = ("fetch", "parse", "save", "sleep")
+
+
+@dataclass
+class Histogram:
+    # counts[i] is the number of observations <= LATENCY_BUCKETS[i], the last count is the overflow
+    counts: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    count: int = 0
+    sum: float = 0.0
+
+    def observe(self, seconds) -> None:
+        i = 0
+        while i < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q) -> Optional[float]:
+        # Upper bound of the bucket holding the q quantile, None if it's beyond the last bucket
+        if self.count == 0:
+            return None
+        total = 0
+        for i, count in enumerate(self.counts[:-1]):
+            total += count
+            if total >= q * self.count:
+                return LATENCY_BUCKETS[i]
+        return None
+
+    def minus(self, other: "Histogram") -> "Histogram":
+        counts = [a - b for a, b in zip(self.counts, other.counts)]
+        return Histogram(counts, self.count - other.count, self.sum - other.sum)
+
+
+class CrawlMetrics:
+    """
+    Thread safe counters (see COUNTERS) and per phase latency histograms (see PHASES) of a crawler. Values only
+    grow over the crawler's life, a run's metrics are the difference between snapshots taken before and after it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.histograms: Dict[str, Histogram] = {phase: Histogram() for phase in PHASES}
+
+    def inc(self, name, value=1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, phase, seconds) -> None:
+        with self._lock:
+            self.histograms[phase].observe(seconds)
+
+    @contextmanager
+    def timer(self, phase):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.monotonic() - start)
+
+    def snapshot(self) -> "CrawlMetrics":
+        copy = CrawlMetrics()
+        with self._lock:
+            copy.counters = dict(self.counters)
+            copy.histograms = {phase: Histogram(list(h.counts), h.count, h.sum) for phase, h in self.histograms.items()}
+        return copy
+
+    def minus(self, earlier: "CrawlMetrics") -> "CrawlMetrics":
+        diff = CrawlMetrics()
+        diff.counters = {name: value - earlier.counters[name] for name, value in self.counters.items()}
+        diff.histograms = {phase: h.minus(earlier.histograms[phase]) for phase, h in self.histograms.items()}
+        return diff
+
+    def to_dict(self) -> dict:
+        lookups = self.counters["cache_hits"] + self.counters["cache_misses"]
+        phases = {}
+        for phase, h in self.histograms.items():
+            phases[phase] = dict(
+                dataclasses.asdict(h),
+                mean=h.sum / h.count if h.count > 0 else 0.0,
+                p50=h.quantile(0.5),
+                p95=h.quantile(0.95),
+                p99=h.quantile(0.99),
+            )
+        return {
+            "counters": dict(self.counters),
+            "cache_hit_ratio": self.counters["cache_hits"] / lookups if lookups > 0 else None,
+            "buckets": list(LATENCY_BUCKETS),
+            "phases": phases,
+        }
+
+    def prometheus(self, labels=None) -> str:
+        """
+        Metrics in the Prometheus text format, e.g. for the node exporter textfile collector.
+        """
+        label_str = ",".join(f'{k}="{v}"' for k, v in sorted((labels or {}).items()))
+        lines = []
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE legaldata_{name}_total counter")
+            lines.append(
+                f"legaldata_{name}_total{{{label_str}}} {value}" if label_str else f"legaldata_{name}_total {value}"
+            )
+        prefix = f"{label_str}," if label_str else ""
+        lines.append("# TYPE legaldata_phase_seconds histogram")
+        for phase, h in self.histograms.items():
+            total = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], h.counts):
+                total += count
+                lines.append(f'legaldata_phase_seconds_bucket{{{prefix}phase="{phase}",le="{bound}"}} {total}')
+            lines.append(f'legaldata_phase_seconds_sum{{{prefix}phase="{phase}"}} {h.sum}')
+            lines.append(f'legaldata_phase_seconds_count{{{prefix}phase="{phase}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filename, labels=None) -> None:
+        # Written atomically, textfile collectors may read it at any time
+        write_atomic(filename, self.prometheus(labels).encode("utf-8"))
+
+
+def report_filename(save_path, index_url) -> str:
+    # One report per index page, so runs over other index pages of the same save_path don't replace it
+    key = hashlib.sha1(index_url.encode("utf-8")).hexdigest()
+    return os.path.join(save_path, REPORTS_DIRNAME, f"{key}.json")
+
+
+def write_report(filename, metrics: CrawlMetrics, **run_info) -> dict:
+    """
+    Json run report: run_info (index url, times...) followed by the run's metrics.
+    """
+    report = dict(run_info, **metrics.to_dict())
+    write_atomic(filename, json.dumps(report, indent=4).encode("utf-8"))
+    return report
@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import logging
+import argparse
+import importlib
+import dataclasses
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from legaldata.cache import remove_if_exists, write_atomic
+from legaldata.frontier import FRONTIER_FILENAME, UrlFrontier
+from legaldata.throttle import SharedHostThrottle
+
+CRAWLERS = {"legislation": "legaldata.legislation.crawler", "austlii": "legaldata.austlii.crawler"}
+SUMMARY_FILENAME = "summary.json"
+
+
+@dataclass
+class ShardResult:
+    index_url: str
+    worker: str
+    acts: int = 0
+    files: int = 0
+    error: Optional[str] = None
+    started: float = 0.0
+    finished: float = 0.0
+
+
+@dataclass
+class RunSummary:
+    index_urls: int = 0
+    completed: int = 0
+    failed: int = 0
+    acts: int = 0
+    files: int = 0
+    seconds: float = 0.0
+    acts_per_sec: float = 0.0
+    pending: List[str] = field(default_factory=list)
+    failures: Dict[str, str] = field(default_factory=dict)
+    results: List[ShardResult] = field(default_factory=list)
+
+
+class ShardedRun:
+    """
+    Shared state of a crawl whose index urls are split between worker processes, on one machine or several that
+    share shared_path. Workers claim an index url by creating claims/<hash>.claim exclusively, record the outcome in
+    results/<hash>.json, and space their requests through a SharedHostThrottle kept in throttle/. Acts listed on
+    several index pages are crawled once, through a UrlFrontier shared in legaldata-frontier.seen. A claim older than
+    claim_timeout seconds without a result is assumed abandoned (e.g. a killed worker) and can be taken over.
+    """
+
+    def __init__(self, shared_path, claim_timeout=6 * 60 * 60):
+        self.shared_path = shared_path
+        self.claim_timeout = claim_timeout
+        self.claims_path = os.path.join(shared_path, "claims")
+        self.results_path = os.path.join(shared_path, "results")
+        self.throttle_path = os.path.join(shared_path, "throttle")
+        self.frontier_filename = os.path.join(shared_path, FRONTIER_FILENAME)
+        os.makedirs(self.claims_path, exist_ok=True)
+        os.makedirs(self.results_path, exist_ok=True)
+
+    @staticmethod
+    def _key(index_url) -> str:
+        return hashlib.sha1(index_url.encode("utf-8")).hexdigest()
+
+    def _claim_filename(self, index_url) -> str:
+        return os.path.join(self.claims_path, f"{self._key(index_url)}.claim")
+
+    def _result_filename(self, index_url) -> str:
+        return os.path.join(self.results_path, f"{self._key(index_url)}.json")
+
+    def get_result(self, index_url) -> Optional[ShardResult]:
+        filename = self._result_filename(index_url)
+        if not Path(filename).is_file():
+            return None
+        with open(filename) as f:
+            return ShardResult(**json.load(f))
+
+    def claim(self, index_url, worker, retry_failed_before=None) -> bool:
+        # Failed urls are only retried if they failed before retry_failed_before, i.e. in an earlier run
+        result = self.get_result(index_url)
+        if result is not None and result.error is None:
+            return False
+        if result is not None and retry_failed_before is not None and result.finished >= retry_failed_before:
+            return False
+
+        claim_filename = self._claim_filename(index_url)
+        try:
+            fd = os.open(claim_filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, "w") as f:
+                f.write(worker)
+            return True
+        except FileExistsError:
+            pass
+
+        # The url is being crawled unless the claim is abandoned or belongs to the attempt that failed
+        try:
+            stat = os.stat(claim_filename)
+        except FileNotFoundError:
+            return self.claim(index_url, worker, retry_failed_before)
+        in_progress = result is None or stat.st_mtime > result.finished
+        if in_progress and time.time() - stat.st_mtime < self.claim_timeout:
+            return False
+        # Of the workers finding this claim abandoned, only the one creating its takeover file exclusively replaces
+        # it. The name is that of this claim file, so the replacement gets another one if it's abandoned in turn.
+        takeover_filename = f"{claim_filename}.{stat.st_ino}-{stat.st_mtime_ns}.takeover"
+        try:
+            os.close(os.open(takeover_filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        try:
+            # Takeover files are removed once the claim is replaced, so another worker may have got here first
+            current = os.stat(claim_filename)
+            abandoned = (current.st_ino, current.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns)
+            if abandoned:
+                write_atomic(claim_filename, worker.encode("utf-8"))
+        finally:
+            remove_if_exists(takeover_filename)
+        return abandoned
+
+    def record(self, result: ShardResult) -> None:
+        write_atomic(self._result_filename(result.index_url), json.dumps(dataclasses.asdict(result)).encode("utf-8"))
+
+    def summary(self, index_urls) -> RunSummary:
+        summary = RunSummary(index_urls=len(index_urls))
+        for index_url in index_urls:
+            result = self.get_result(index_url)
+            if result is None:
+                summary.pending.append(index_url)
+                continue
+            summary.results.append(result)
+            if result.error is None:
+                summary.completed += 1
+                summary.acts += result.acts
+                summary.files += result.files
+            else:
+                summary.failed += 1
+                summary.failures[index_url] = result.error
+
+        if len(summary.results) > 0:
+            summary.seconds = max(r.finished for r in summary.results) - min(r.started for r in summary.results)
+        if summary.seconds > 0:
+            summary.acts_per_sec = summary.acts / summary.seconds
+        write_atomic(
+            os.path.join(self.shared_path, SUMMARY_FILENAME),
+            json.dumps(dataclasses.asdict(summary), indent=4).encode("utf-8"),
+        )
+        return summary
+
+
+def _create_crawler(crawler_name, crawler_kwargs):
+    module = importlib.import_module(CRAWLERS[crawler_name])
+    return module.ActCrawler(**crawler_kwargs)
+
+
+def _run_worker(
+    crawler_name, crawler_kwargs, index_urls, save_path, shared_path, requests_per_sec, claim_timeout, crawl_kwargs
+) -> int:
+    run = ShardedRun(shared_path, claim_timeout)
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    started = time.time()
+    crawled = 0
+    with _create_crawler(crawler_name, crawler_kwargs) as crawler, UrlFrontier(run.frontier_filename) as frontier:
+        # Politeness is enforced by the shared throttle, so no extra per act delay
+        crawler.throttle = SharedHostThrottle(
+            run.throttle_path,
+            requests_per_sec=requests_per_sec,
+            max_speedup=crawler.max_speedup,
+            max_interval=crawler.backoff_cap,
+        )
+        crawl_kwargs = dict({"delay_sec": 0}, **crawl_kwargs)
+        crawler.frontier = frontier
+        for index_url in index_urls:
+            if not run.claim(index_url, worker, retry_failed_before=started):
+                continue
+            logging.info(f"Worker {worker} crawling {index_url}")
+            result = ShardResult(index_url, worker, started=time.time())
+            try:
+                for act in crawler.iter_acts_from_index(index_url, save_path, **crawl_kwargs):
+                    result.acts += 1
+                    result.files += len(act.saved_filenames)
+            except Exception as ex:
+                logging.exception(f"Worker {worker} failed crawling {index_url}")
+                result.error = f"{type(ex).__name__}: {ex}"
+            result.finished = time.time()
+            run.record(result)
+            crawled += 1
+    return crawled
+
+
+def run_sharded(
+    crawler_name,
+    save_path,
+    shared_path,
+    index_urls=None,
+    workers=4,
+    requests_per_sec=1.0,
+    claim_timeout=6 * 60 * 60,
+    crawler_kwargs=None,
+    **crawl_kwargs,
+) -> RunSummary:
+    """
+    Crawl index_urls (default: every index page of the crawler) with workers processes sharing one request rate
+    budget of requests_per_sec per host. Run the same command on other machines with the same shared_path (and a
+    shared save_path/cache_path) to spread the crawl further, each index url is only crawled once. Returns the
+    summary merged from every worker's results, which is also written to shared_path/summary.json. crawl_kwargs
+    (cache_path, use_cache, act_limit, incremental, ...) are passed to iter_acts_from_index.
+    """
+    assert crawler_name in CRAWLERS, f"crawler_name must be one of {list(CRAWLERS)}"
+    assert workers > 0
+    crawler_kwargs = crawler_kwargs or {}
+    if index_urls is None:
+        index_urls = _create_crawler(crawler_name, crawler_kwargs).get_index_pages()
+    index_urls = list(dict.fromkeys(index_urls))
+
+    run = ShardedRun(shared_path, claim_timeout)
+    os.makedirs(save_path, exist_ok=True)
+    logging.info(f"Sharded crawl of {len(index_urls)} index urls with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Every worker walks all the urls in its own order and skips ones already claimed
+        futures = [
+            executor.submit(
+                _run_worker,
+                crawler_name,
+                crawler_kwargs,
+                index_urls[i:] + index_urls[:i],
+                save_path,
+                shared_path,
+                requests_per_sec,
+                claim_timeout,
+                crawl_kwargs,
+            )
+            for i in range(0, len(index_urls), max(1, len(index_urls) // workers))[:workers]
+        ]
+        for future in futures:
+            future.result()
+
+    summary = run.summary(index_urls)
+    logging.info(
+        f"Sharded crawl: {summary.completed} of {summary.index_urls} index urls completed, {summary.failed} failed, "
+        f"{len(summary.pending)} pending, {summary.acts} acts, {summary.files} files in {summary.seconds:.0f} sec"
+    )
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Crawl every index page of a site across worker processes")
+    parser.add_argument("crawler", choices=sorted(CRAWLERS))
+    parser.add_argument("save_path")
+    parser.add_argument("--shared-path", required=True, help="claims, results and rate state shared by workers")
+    parser.add_argument("--cache-path", default=None)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests-per-sec", type=float, default=1.0, help="per host, across all workers")
+    parser.add_argument("--act-limit", type=int, default=None)
+    parser.add_argument("--incremental", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s\t[%(levelname)s] %(name)s:\t%(message)s", level=logging.INFO)
+    summary = run_sharded(
+        args.crawler,
+        args.save_path,
+        args.shared_path,
+        workers=args.workers,
+        requests_per_sec=args.requests_per_sec,
+        cache_path=args.cache_path,
+        act_limit=args.act_limit,
+        incremental=args.incremental,
+    )
+    return 1 if summary.failed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
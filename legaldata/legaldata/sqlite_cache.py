@@ -0,0 +1,523 @@
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import shutil
+import argparse
+import threading
+import dataclasses
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from legaldata.cache import (
+    COMPRESSION_SUFFIXES,
+    DETAIL,
+    EXTRACT,
+    FILE,
+    PRUNE_LOCK_FILENAME,
+    CacheBackend,
+    CacheEntry,
+    CacheItem,
+    CachedPage,
+    CachePolicy,
+    CacheStats,
+    FileCache,
+    PruneSummary,
+    SiteStats,
+    VALIDATOR_HEADERS,
+    compress,
+    decompress,
+    extract_sha256,
+    file_lock,
+    linked_blobs,
+    log_linked,
+    log_prune,
+    parse_size,
+    plan_eviction,
+    remove_if_exists,
+    scan,
+    site_stats,
+    url_site,
+    zstandard,
+)
+
+DB_FILENAME = "cache.sqlite3"
+# File bodies up to this size are kept in the database, larger ones under blobs/ as in the directory layout
+DEFAULT_INLINE_MAX_BYTES = 1024 * 1024
+# Last used times are only rewritten when older than this, so warm lookups rarely write
+USED_RESOLUTION_SEC = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    encoding TEXT,
+    validators TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    used REAL NOT NULL,
+    kind TEXT NOT NULL,
+    compression TEXT,
+    body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+-- body is NULL for bodies kept as external blob files
+CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, body BLOB);
+CREATE TABLE IF NOT EXISTS extracts (key TEXT PRIMARY KEY, compression TEXT, value BLOB NOT NULL);
+"""
+
+
+class SqliteDatabase:
+    """
+    WAL mode sqlite database shared by the threads of a crawler (one connection each) and by other processes on the
+    same machine. Readers never block the writer and writers wait for each other up to timeout seconds.
+    """
+
+    def __init__(self, filename, timeout=60.0):
+        self.filename = filename
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        conn = self.connection()
+        # Must be set before the first table is created, lets prune give freed pages back to the filesystem
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit, writes that go together use transaction()
+            conn = sqlite3.connect(self.filename, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def execute(self, sql, params=()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def _touch_used(db: SqliteDatabase, table, url, used) -> None:
+    now = time.time()
+    if now - used > USED_RESOLUTION_SEC:
+        db.execute(f"UPDATE {table} SET used = ? WHERE url = ?", (now, url))
+
+
+@dataclass
+class SqliteCachedPage(CachedPage):
+    db: Optional[SqliteDatabase] = field(default=None, repr=False, compare=False)
+
+    def read_bytes(self) -> bytes:
+        row = self.db.execute("SELECT body FROM pages WHERE url = ?", (self.url,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Page removed from cache: {self.url}")
+        return decompress(row[0], self.compression)
+
+
+class SqlitePageCache:
+    """
+    PageCache holding page bodies and their sidecar metadata in the pages table.
+    """
+
+    def __init__(self, db: SqliteDatabase, compression: Dict[str, Optional[str]] = None):
+        self.db = db
+        self.compression = compression or {}
+
+    def filename(self, url) -> str:
+        # For log messages, pages have no file of their own
+        return f"{self.db.filename}#{url}"
+
+    def _page(self, url, sha256, encoding, validators, fetched, kind, compression) -> SqliteCachedPage:
+        return SqliteCachedPage(
+            url, sha256, encoding, validators, self.filename(url), fetched, kind, compression, db=self.db
+        )
+
+    def get(self, url) -> Optional[CachedPage]:
+        row = self.db.execute(
+            "SELECT sha256, encoding, validators, fetched, used, kind, compression FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        sha256, encoding, validators, fetched, used, kind, compression = row
+        if compression == "zstd" and zstandard is None:
+            logging.warning(f"zstandard not installed, ignoring zstd compressed cached page {url}")
+            return None
+        _touch_used(self.db, "pages", url, used)
+        return self._page(url, sha256, encoding, json.loads(validators), fetched, kind, compression)
+
+    def put(self, url, body: bytes, headers, kind=DETAIL) -> CachedPage:
+        compression = self.compression.get(kind)
+        encoding = headers.get_content_charset() if hasattr(headers, "get_content_charset") else None
+        validators = [[k, v] for k, v in headers.items() if k.lower() in VALIDATOR_HEADERS]
+        page = self._page(url, hashlib.sha256(body).hexdigest(), encoding, validators, time.time(), kind, compression)
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                url,
+                page.sha256,
+                encoding,
+                json.dumps(validators),
+                page.fetched,
+                page.fetched,
+                kind,
+                compression,
+                compress(body, compression),
+            ),
+        )
+        return page
+
+    def refresh(self, page: CachedPage) -> None:
+        page.fetched = time.time()
+        self.db.execute("UPDATE pages SET fetched = ?, used = ? WHERE url = ?", (page.fetched, page.fetched, page.url))
+
+
+@dataclass
+class SqliteCacheEntry(CacheEntry):
+    # Entry whose body is in the blobs table, filename is ""
+    db: Optional[SqliteDatabase] = field(default=None, repr=False, compare=False)
+
+    def open(self):
+        row = self.db.execute("SELECT body FROM blobs WHERE sha256 = ?", (self.sha256,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"File removed from cache: {self.url}")
+        return io.BytesIO(row[0])
+
+
+class SqliteFileCache:
+    """
+    FileCache indexing urls in the files table. Bodies up to inline_max_bytes are kept in the blobs table, larger
+    ones as blob files under blobs/<sha256[:2]>/<sha256> so they can still be linked into save_path (see
+    Crawler(materialize=...)).
+    """
+
+    def __init__(self, db: SqliteDatabase, cache_path, inline_max_bytes=DEFAULT_INLINE_MAX_BYTES):
+        self.db = db
+        self.inline_max_bytes = inline_max_bytes
+        self.blobs_path = os.path.join(cache_path, "blobs")
+        os.makedirs(self.blobs_path, exist_ok=True)
+
+    hash_file = staticmethod(FileCache.hash_file)
+    blob_filename = FileCache.blob_filename
+    temp_filename = FileCache.temp_filename
+
+    def _entry(self, url, sha256, size, headers, inline, fetched) -> CacheEntry:
+        if not inline:
+            return CacheEntry(url, sha256, size, headers, self.blob_filename(sha256), fetched)
+        return SqliteCacheEntry(url, sha256, size, headers, "", fetched, db=self.db)
+
+    def get(self, url) -> Optional[CacheEntry]:
+        row = self.db.execute(
+            "SELECT f.sha256, f.headers, f.fetched, f.used, b.size, b.body IS NOT NULL "
+            "FROM files f JOIN blobs b ON b.sha256 = f.sha256 WHERE f.url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        sha256, headers, fetched, used, size, inline = row
+        entry = self._entry(url, sha256, size, json.loads(headers), inline, fetched)
+        if not inline and not Path(entry.filename).is_file():
+            logging.warning(f"Cache blob missing for {url}, ignoring cache entry")
+            return None
+        _touch_used(self.db, "files", url, used)
+        return entry
+
+    def refresh(self, url, entry: CacheEntry) -> None:
+        entry.fetched = time.time()
+        self.db.execute("UPDATE files SET fetched = ?, used = ? WHERE url = ?", (entry.fetched, entry.fetched, url))
+
+    def put(self, url, filename, headers, sha256=None) -> CacheEntry:
+        """
+        Move filename into the blob store and index it under url. filename is consumed. sha256 is the file's hash if
+        already known.
+        """
+        headers = [[k, v] for k, v in headers.items()] if hasattr(headers, "items") else headers
+        return self._put(url, filename, headers, time.time(), time.time(), sha256=sha256)
+
+    def _put(self, url, filename, headers, fetched, used, remove=True, sha256=None) -> CacheEntry:
+        if sha256 is None:
+            sha256 = self.hash_file(filename)
+        size = os.path.getsize(filename)
+        inline = size <= self.inline_max_bytes
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT body IS NOT NULL FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is not None:
+                inline = row[0]
+            elif inline:
+                with open(filename, "rb") as f:
+                    conn.execute("INSERT INTO blobs VALUES (?, ?, ?)", (sha256, size, f.read()))
+            else:
+                conn.execute("INSERT INTO blobs VALUES (?, ?, NULL)", (sha256, size))
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (url, sha256, json.dumps(headers), fetched, used)
+            )
+            # Renamed into place inside the transaction, so prune never sees the row without its blob file
+            blob_filename = self.blob_filename(sha256)
+            if not inline and not Path(blob_filename).is_file():
+                os.makedirs(os.path.dirname(blob_filename), exist_ok=True)
+                if remove:
+                    os.replace(filename, blob_filename)
+                else:
+                    shutil.copy2(filename, blob_filename)
+        if remove:
+            remove_if_exists(filename)
+        return self._entry(url, sha256, size, headers, inline, fetched)
+
+
+class SqliteExtractCache:
+    """
+    ExtractCache holding values in the extracts table.
+    """
+
+    def __init__(self, db: SqliteDatabase, compression: Optional[str] = None):
+        self.db = db
+        self.compression = compression
+
+    def get(self, key):
+        row = self.db.execute("SELECT compression, value FROM extracts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(decompress(row[1], row[0]))
+
+    def put(self, key, value) -> None:
+        value = compress(json.dumps(value).encode("utf-8"), self.compression)
+        self.db.execute("INSERT OR REPLACE INTO extracts VALUES (?, ?, ?)", (key, self.compression, value))
+
+
+class SqliteCache(CacheBackend):
+    """
+    Single file cache: pages, file index entries, small file bodies and extracted values in cache_path/cache.sqlite3
+    (WAL mode), larger file bodies in cache_path/blobs. Avoids the directory layout's few files per entry, which
+    slow down file systems and backups at millions of entries. Safe for several threads and processes on one
+    machine, but like any sqlite database not on network file systems (NFS, SMB).
+    """
+
+    def __init__(
+        self,
+        cache_path,
+        page_key_func=None,
+        file_key_func=None,
+        compression=None,
+        inline_max_bytes=DEFAULT_INLINE_MAX_BYTES,
+    ):
+        super(SqliteCache, self).__init__(cache_path, page_key_func, file_key_func, compression)
+        os.makedirs(cache_path, exist_ok=True)
+        self.db = SqliteDatabase(os.path.join(cache_path, DB_FILENAME))
+        self.pages = SqlitePageCache(self.db, self.compression)
+        self.files = SqliteFileCache(self.db, cache_path, inline_max_bytes)
+        self.extracts = SqliteExtractCache(self.db, self.compression.get(EXTRACT))
+
+    def _items(self) -> List[CacheItem]:
+        items = []
+        rows = self.db.execute(
+            "SELECT url, kind, length(body) + length(validators), fetched, used, sha256 FROM pages"
+        ).fetchall()
+        for url, kind, size, fetched, used, sha256 in rows:
+            items.append(CacheItem(kind, url_site(url), size, fetched, used, [], sha256, url))
+        rows = self.db.execute("SELECT url, length(headers), fetched, used, sha256 FROM files").fetchall()
+        for url, size, fetched, used, sha256 in rows:
+            items.append(CacheItem(FILE, url_site(url), size, fetched, used, [], sha256, url))
+        return items
+
+    def _blob_sizes(self) -> Dict[str, int]:
+        return dict(self.db.execute("SELECT sha256, size FROM blobs").fetchall())
+
+    def _extract_bytes(self) -> int:
+        return self.db.execute("SELECT coalesce(sum(length(value)), 0) FROM extracts").fetchone()[0]
+
+    def stats(self) -> Dict[str, SiteStats]:
+        counts = CacheStats(self.cache_path).load()
+        return site_stats(self._items(), self._blob_sizes(), self._extract_bytes(), counts)
+
+    def prune(self, policy: CachePolicy, dry_run=False, orphan_grace_sec=60 * 60) -> PruneSummary:
+        """
+        Same policy as cache.prune. Blob files not in the database are removed once older than orphan_grace_sec.
+        Bodies that saved files link to are kept (see add_linked_save_path).
+        """
+        with file_lock(os.path.join(self.cache_path, PRUNE_LOCK_FILENAME)):
+            now = time.time()
+            blob_sizes = self._blob_sizes()
+            linked = linked_blobs(self.cache_path)
+            plan = plan_eviction(self._items(), blob_sizes, self._extract_bytes(), policy, now)
+            summary = PruneSummary(plan.expired, plan.evicted, 0, len(plan.kept), plan.total)
+            summary.removed_bytes = sum(item.size for item in plan.removed)
+
+            removed_shas = set(item.sha256 for item in plan.removed if item.kind == FILE) - set(plan.refs)
+            kept_linked, removed_shas = removed_shas & linked, removed_shas - linked
+            summary.removed_bytes += sum(blob_sizes.get(sha256, 0) for sha256 in removed_shas)
+            live_shas = set(item.sha256 for item in plan.kept)
+            keys = [key for (key,) in self.db.execute("SELECT key FROM extracts").fetchall()]
+            removed_keys = [key for key in keys if extract_sha256(f"{key}.json") not in live_shas]
+
+            blob_filenames = [self.files.blob_filename(sha256) for sha256 in removed_shas]
+            for blob in Path(self.files.blobs_path).glob("*/*"):
+                orphan = blob.name not in blob_sizes and blob.name not in linked
+                if orphan and now - blob.stat().st_mtime > orphan_grace_sec:
+                    blob_filenames.append(str(blob))
+                    summary.removed_bytes += blob.stat().st_size
+
+            if not dry_run:
+                with self.db.transaction() as conn:
+                    for item in plan.removed:
+                        conn.execute(
+                            f"DELETE FROM {'files' if item.kind == FILE else 'pages'} WHERE url = ?", (item.url,)
+                        )
+                    for sha256 in removed_shas:
+                        conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                    for key in removed_keys:
+                        conn.execute("DELETE FROM extracts WHERE key = ?", (key,))
+                for filename in blob_filenames:
+                    remove_if_exists(filename)
+                self.db.execute("PRAGMA incremental_vacuum")
+
+        log_prune(self.cache_path, summary)
+        log_linked(self.cache_path, kept_linked)
+        return summary
+
+    def close(self) -> None:
+        self.db.close()
+
+
+@dataclass
+class MigrateSummary:
+    pages: int = 0
+    files: int = 0
+    extracts: int = 0
+    # Legacy entries (no sidecar, or file entries without a url) are left in place
+    skipped: int = 0
+    seconds: float = 0.0
+
+
+def migrate(cache_path, inline_max_bytes=DEFAULT_INLINE_MAX_BYTES, remove=False) -> MigrateSummary:
+    """
+    Copy a directory layout cache in cache_path into cache_path/cache.sqlite3, keeping each entry's fetched time and
+    compression. Blobs stay where they are unless moved into the database. With remove, migrated entries are removed
+    from the directory layout, as are the blob files of bodies moved into the database that no saved file links to.
+    Safe to run again, e.g. after an interrupted migration.
+    """
+    start = time.time()
+    summary = MigrateSummary()
+    cache = SqliteCache(cache_path, inline_max_bytes=inline_max_bytes)
+    db = cache.db
+    migrated: List[str] = []
+
+    for item in scan(cache_path):
+        if item.url == "":
+            summary.skipped += 1
+        elif item.kind == FILE:
+            with open(item.filenames[0]) as f:
+                entry = json.load(f)
+            blob_filename = cache.files.blob_filename(entry["sha256"])
+            if not Path(blob_filename).is_file():
+                summary.skipped += 1
+                continue
+            # Both layouts keep blobs at the same path, so the blob is left where it is (and read into the database
+            # when small enough) and the directory layout stays usable until it's removed
+            cache.files._put(entry["url"], blob_filename, entry["headers"], item.fetched, item.used, remove=False)
+            migrated += item.filenames
+            summary.files += 1
+        else:
+            with open(item.filenames[1]) as f:
+                page = json.load(f)
+            with open(item.filenames[0], "rb") as f:
+                body = f.read()
+            db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    page["url"],
+                    page["sha256"],
+                    page["encoding"],
+                    json.dumps(page["validators"]),
+                    item.fetched,
+                    item.used,
+                    item.kind,
+                    page.get("compression"),
+                    body,
+                ),
+            )
+            migrated += item.filenames
+            summary.pages += 1
+
+    suffixes = {suffix: compression for compression, suffix in COMPRESSION_SUFFIXES.items()}
+    for filename in Path(cache_path, "extract").glob("*.json*"):
+        stem, _, suffix = filename.name.partition(".json")
+        if suffix != "" and suffix not in suffixes:
+            continue
+        compression = suffixes.get(suffix)
+        db.execute("INSERT OR REPLACE INTO extracts VALUES (?, ?, ?)", (stem, compression, filename.read_bytes()))
+        migrated.append(str(filename))
+        summary.extracts += 1
+
+    if remove:
+        for filename in migrated:
+            remove_if_exists(filename)
+        # Bodies now held in the database, unless an entry that wasn't migrated or a file saved with
+        # materialize="symlink" still uses the blob file
+        with file_lock(os.path.join(cache_path, PRUNE_LOCK_FILENAME)):
+            referenced = {item.sha256 for item in scan(cache_path) if item.kind == FILE} | linked_blobs(cache_path)
+            for (sha256,) in db.execute("SELECT sha256 FROM blobs WHERE body IS NOT NULL").fetchall():
+                if sha256 not in referenced:
+                    remove_if_exists(cache.files.blob_filename(sha256))
+    cache.close()
+
+    summary.seconds = time.time() - start
+    logging.info(
+        f"Migrated {summary.pages} pages, {summary.files} files and {summary.extracts} extracted values to "
+        f"{os.path.join(cache_path, DB_FILENAME)} in {summary.seconds:.1f} sec ({summary.skipped} legacy entries "
+        f"skipped)"
+    )
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Migrate a directory layout crawl cache to a single sqlite file")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("cache_path", nargs="?", default=".legaldata-cache/")
+    parser.add_argument(
+        "--inline-max-size",
+        type=parse_size,
+        default=DEFAULT_INLINE_MAX_BYTES,
+        help="largest file body kept in the database, e.g. 1M (larger bodies stay in blobs/)",
+    )
+    parser.add_argument("--remove", action="store_true", help="remove migrated entries from the directory layout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s\t[%(levelname)s] %(name)s:\t%(message)s", level=logging.INFO)
+    summary = migrate(args.cache_path, args.inline_max_size, args.remove)
+    print(json.dumps(dataclasses.asdict(summary), indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
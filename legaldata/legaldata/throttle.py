@@ -0,0 +1,215 @@
+import os
+import time
+import random
+import threading
+import http.client
+import email.utils
+import urllib.error
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+from legaldata.cache import file_lock
+
+# Statuses worth retrying, and the ones that mean the host wants fewer requests
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+BACKOFF_STATUSES = (429, 503)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0) -> float:
+    """
+    Capped exponential backoff with full jitter: a random delay of up to base * 2^(attempt - 1), at most cap seconds.
+    Jitter keeps workers that failed together from retrying in lockstep.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    # Retry-After is either a number of seconds or an HTTP date
+    value = None if headers is None else headers.get("Retry-After")
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable(ex) -> bool:
+    # Throttling, server errors and network errors (timeouts, resets, truncated bodies) are retried, other client
+    # errors such as 404 and bugs aren't
+    if isinstance(ex, urllib.error.HTTPError):
+        return ex.code in RETRY_STATUSES
+    return isinstance(ex, (OSError, http.client.HTTPException))
+
+
+class HostThrottle:
+    """
+    Thread safe politeness limiter used by the async crawl engine. Caps the number of in-flight requests per host
+    and spaces request starts per host so that no more than requests_per_sec are issued.
+    """
+
+    def __init__(self, max_per_host=4, requests_per_sec=1.0):
+        assert max_per_host > 0
+        self.max_per_host = max_per_host
+        self.requests_per_sec = requests_per_sec
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    @staticmethod
+    def host(url) -> str:
+        return urlparse(url).netloc.lower()
+
+    def _get_semaphore(self, host) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+    def _interval(self, host) -> float:
+        return 0.0 if not self.requests_per_sec else 1.0 / self.requests_per_sec
+
+    def _wait_for_slot(self, host) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self._interval(host)
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _defer(self, host, seconds) -> None:
+        # No request to host starts for at least seconds
+        with self._lock:
+            now = time.monotonic()
+            self._next_slot[host] = max(self._next_slot.get(host, now), now + seconds)
+
+    def feedback(self, url, seconds, status=None, retry_after=None) -> None:
+        """
+        Report how a request to url went: how long it took, its status (None if it failed without one) and the
+        response's Retry-After in seconds, which holds back every request to the host.
+        """
+        if retry_after is not None:
+            self._defer(self.host(url), retry_after)
+
+    @contextmanager
+    def request(self, url):
+        host = self.host(url)
+        with self._get_semaphore(host):
+            self._wait_for_slot(host)
+            yield
+
+
+class AdaptiveThrottle(HostThrottle):
+    """
+    HostThrottle whose per host request spacing follows how the host responds. It starts at requests_per_sec,
+    speeds up by 10% after each quick response up to max_speedup times requests_per_sec, and doubles the spacing
+    (up to max_interval seconds) after a 429/503 or a response slower than slow_response_sec.
+    """
+
+    def __init__(
+        self, max_per_host=4, requests_per_sec=1.0, max_speedup=2.0, slow_response_sec=30.0, max_interval=60.0
+    ):
+        super(AdaptiveThrottle, self).__init__(max_per_host, requests_per_sec)
+        assert max_speedup >= 1.0
+        self.base_interval = super(AdaptiveThrottle, self)._interval(None)
+        self.min_interval = self.base_interval / max_speedup
+        self.slow_response_sec = slow_response_sec
+        self.max_interval = max(max_interval, self.base_interval)
+        self._intervals = {}
+
+    def _interval(self, host) -> float:
+        # Called with self._lock held
+        return self._intervals.get(host, self.base_interval)
+
+    def _adapt(self, interval, seconds, status) -> float:
+        if status in BACKOFF_STATUSES or seconds >= self.slow_response_sec:
+            # Back off from at least half a second, so hosts crawled without any spacing are slowed down too
+            return min(self.max_interval, max(interval * 2, 0.5))
+        if status is not None and status < 400:
+            return max(self.min_interval, interval * 0.9)
+        return interval
+
+    def feedback(self, url, seconds, status=None, retry_after=None) -> None:
+        host = self.host(url)
+        with self._lock:
+            self._intervals[host] = self._adapt(self._interval(host), seconds, status)
+        super(AdaptiveThrottle, self).feedback(url, seconds, status, retry_after)
+
+
+class SharedHostThrottle(AdaptiveThrottle):
+    """
+    AdaptiveThrottle whose per host request spacing is shared by every process using the same state_path, e.g. the
+    workers of a sharded crawl, including ones on other machines when state_path is on a shared filesystem (see
+    file_lock). A host's next request slot and current spacing are kept in state_path/<host>.slot, so a 429 or 503
+    seen by one process slows every process down. max_per_host still only applies within a process.
+    """
+
+    def __init__(
+        self,
+        state_path,
+        max_per_host=4,
+        requests_per_sec=1.0,
+        max_speedup=2.0,
+        slow_response_sec=30.0,
+        max_interval=60.0,
+    ):
+        super(SharedHostThrottle, self).__init__(
+            max_per_host, requests_per_sec, max_speedup, slow_response_sec, max_interval
+        )
+        self.state_path = state_path
+        os.makedirs(state_path, exist_ok=True)
+
+    def _slot_filename(self, host) -> str:
+        return os.path.join(self.state_path, f"{host.replace(':', '_')}.slot")
+
+    def _read_state(self, slot_filename, now) -> Tuple[float, float]:
+        # "<next slot> <interval>", the slot in wall clock time as monotonic clocks aren't comparable across processes
+        # or machines
+        slot, interval = now, self.base_interval
+        if Path(slot_filename).is_file():
+            with open(slot_filename) as f:
+                fields = f.read().split()
+            try:
+                slot = max(now, float(fields[0]))
+                interval = float(fields[1])
+            except (IndexError, ValueError):
+                pass
+        return slot, interval
+
+    @staticmethod
+    def _write_state(slot_filename, slot, interval) -> None:
+        with open(slot_filename, "w") as f:
+            f.write(f"{slot} {interval}")
+
+    def _wait_for_slot(self, host) -> None:
+        slot_filename = self._slot_filename(host)
+        with file_lock(f"{slot_filename}.lock"):
+            now = time.time()
+            slot, interval = self._read_state(slot_filename, now)
+            self._write_state(slot_filename, slot + interval, interval)
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _defer(self, host, seconds) -> None:
+        slot_filename = self._slot_filename(host)
+        with file_lock(f"{slot_filename}.lock"):
+            now = time.time()
+            slot, interval = self._read_state(slot_filename, now)
+            self._write_state(slot_filename, max(slot, now + seconds), interval)
+
+    def feedback(self, url, seconds, status=None, retry_after=None) -> None:
+        host = self.host(url)
+        slot_filename = self._slot_filename(host)
+        with file_lock(f"{slot_filename}.lock"):
+            slot, interval = self._read_state(slot_filename, time.time())
+            self._write_state(slot_filename, slot, self._adapt(interval, seconds, status))
+        if retry_after is not None:
+            self._defer(host, retry_after)
@@ -0,0 +1,221 @@
+import io
+import ssl
+import queue
+import logging
+import threading
+import http.client
+import urllib.error
+import urllib.request
+from typing import Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+RECONNECT_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class ContentTooLargeError(ValueError):
+    """
+    A download is larger than its max_bytes. Not retried, as retries would be just as large.
+    """
+
+
+class Response:
+    def __init__(self, url, status, headers, raw, release):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self._raw = raw
+        self._release = release
+
+    def read(self) -> bytes:
+        try:
+            return self._raw.read()
+        finally:
+            self.close()
+
+    def iter_chunks(self, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        try:
+            while True:
+                chunk = self._raw.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._release is not None:
+            release, self._release = self._release, None
+            release(self._raw)
+
+
+class Transport:
+    """
+    Pooled keep-alive HTTP(S) transport. Up to pool_size idle connections are kept open per host and reused across
+    requests, so crawls of many pages from the same site only pay the TCP/TLS handshake once per pooled connection.
+    Honours the same *_proxy environment variables as urllib.
+
+    connect_to maps origins to the origin actually connected to, e.g. {"https://www.legislation.gov.au":
+    "http://127.0.0.1:8080"} sends the site's requests to a local server (see benchmarks/bench_crawl.py). Urls and
+    the Host header stay those of the original site.
+    """
+
+    # True for transports that don't use the network (see cassette.ReplayTransport), so nothing is throttled
+    offline = False
+
+    def __init__(self, user_agent, pool_size=4, timeout=60, max_redirects=5, connect_to: Dict[str, str] = None):
+        assert pool_size > 0
+        self.user_agent = user_agent
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._pools: Dict[Tuple[str, str], queue.LifoQueue] = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+        self._proxies = urllib.request.getproxies()
+        self.connect_to = {origin.rstrip("/").lower(): urlsplit(to) for origin, to in (connect_to or {}).items()}
+
+    def _get_pool(self, key) -> queue.LifoQueue:
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = queue.LifoQueue(maxsize=self.pool_size)
+            return self._pools[key]
+
+    def _proxy_for(self, scheme, host) -> Optional[str]:
+        proxy = self._proxies.get(scheme)
+        if proxy is None or urllib.request.proxy_bypass(host):
+            return None
+        return proxy
+
+    def _new_connection(self, scheme, netloc) -> http.client.HTTPConnection:
+        proxy = self._proxy_for(scheme, netloc.split(":")[0])
+        if proxy is not None:
+            proxy_netloc = urlsplit(proxy).netloc or proxy
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(proxy_netloc, timeout=self.timeout, context=self._ssl_context)
+                conn.set_tunnel(netloc)
+                return conn
+            return http.client.HTTPConnection(proxy_netloc, timeout=self.timeout)
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _acquire(self, key) -> Tuple[http.client.HTTPConnection, bool]:
+        try:
+            return self._get_pool(key).get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(*key), False
+
+    def _release(self, key, conn, raw) -> None:
+        if raw.will_close or not raw.isclosed():
+            # Connection can't be reused if the server asked to close it or the body wasn't fully read
+            conn.close()
+            return
+        try:
+            self._get_pool(key).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _send(self, url, headers) -> Response:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        assert scheme in ("http", "https"), f"Unsupported url scheme: {url}"
+        key = (scheme, parts.netloc.lower())
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        request_headers = {"User-Agent": self.user_agent, "Connection": "keep-alive"}
+        connect_to = self.connect_to.get(f"{key[0]}://{key[1]}")
+        if connect_to is not None:
+            key = (connect_to.scheme.lower(), connect_to.netloc.lower())
+            request_headers["Host"] = parts.netloc
+        elif scheme == "http" and self._proxy_for(scheme, parts.hostname or "") is not None:
+            path = url
+
+        request_headers.update(headers or {})
+
+        while True:
+            conn, reused = self._acquire(key)
+            try:
+                conn.request("GET", path, headers=request_headers)
+                raw = conn.getresponse()
+            except RECONNECT_ERRORS:
+                conn.close()
+                if reused:
+                    # Pooled connection was closed by the server while idle, retry on a fresh connection
+                    logging.debug(f"Stale pooled connection for {key}, reconnecting")
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            return Response(url, raw.status, raw.msg, raw, lambda r, c=conn: self._release(key, c, r))
+
+    def request(self, url, headers=None) -> Response:
+        """
+        GET url following redirects. Raises urllib.error.HTTPError for error statuses, as urlopen does.
+        """
+        for _ in range(self.max_redirects + 1):
+            response = self._send(url, headers)
+            if response.status in REDIRECT_CODES and response.headers.get("Location"):
+                response.read()
+                url = urljoin(url, response.headers.get("Location"))
+                logging.debug(f"Redirected to {url}")
+                continue
+            if response.status >= 400:
+                body = response.read()
+                raise urllib.error.HTTPError(
+                    url,
+                    response.status,
+                    http.client.responses.get(response.status, ""),
+                    response.headers,
+                    io.BytesIO(body),
+                )
+            return response
+        raise urllib.error.HTTPError(url, 310, "Too many redirects", None, None)
+
+    def get(self, url, headers=None) -> bytes:
+        return self.request(url, headers).read()
+
+    def download(self, url, filename, headers=None, max_bytes=None, sha256=None) -> Tuple[int, http.client.HTTPMessage]:
+        """
+        Stream url to filename in DOWNLOAD_CHUNK_SIZE chunks, returning the response status and headers. Nothing is
+        written on 304 Not Modified. Bodies over max_bytes raise ContentTooLargeError, without reading the body if
+        its Content-Length is over. sha256 (a hashlib object) is updated with the body as it is written, so it doesn't
+        need reading again to be hashed. Memory use is the same whatever the body size.
+        """
+        response = self.request(url, headers)
+        if response.status == 304:
+            response.read()
+            return response.status, response.headers
+        expected_length = response.headers.get("Content-Length")
+        if max_bytes is not None and expected_length is not None and expected_length.isdigit():
+            if int(expected_length) > max_bytes:
+                response.close()
+                raise ContentTooLargeError(f"{url} is {expected_length} bytes, over the {max_bytes} bytes limit")
+        length = 0
+        with open(filename, "wb") as f:
+            for chunk in response.iter_chunks():
+                length += len(chunk)
+                if max_bytes is not None and length > max_bytes:
+                    response.close()
+                    raise ContentTooLargeError(f"{url} is over the {max_bytes} bytes limit")
+                f.write(chunk)
+                if sha256 is not None:
+                    sha256.update(chunk)
+        if expected_length is not None and expected_length.isdigit() and length < int(expected_length):
+            raise urllib.error.ContentTooShortError(
+                f"retrieval incomplete: got only {length} out of {expected_length} bytes", (filename, response.headers)
+            )
+        return response.status, response.headers
+
+    def close(self) -> None:
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
@@ -32,4 +32,5 @@ setup(
     packages=find_packages(where="legaldata"),
     python_requires=">=3.6, <4",
     install_requires=install_requires,
+    extras_require={"lxml": ["lxml"], "zstd": ["zstandard"], "parquet": ["pyarrow"]},
 )
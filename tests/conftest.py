@@ -0,0 +1,59 @@
+import threading
+import http.server
+import pytest
+from legaldata.legislation.act import Act
+from support import AUSTLII, AUSTLII_DOWNLOAD, LEGISLATION, SyntheticSite, make_handler
+
+
+class LocalSite(SyntheticSite):
+    """
+    The stand-in for both sites (see support.py), keeping the urls requested. Crawlers connect to it with
+    Crawler(connect_to=site.connect_to).
+    """
+
+    def __init__(self, acts, file_kb=1):
+        super(LocalSite, self).__init__(acts, file_kb)
+        self.connect_to = None
+        self.requests = []
+
+    def response(self, url):
+        self.requests.append(url)
+        return super(LocalSite, self).response(url)
+
+
+@pytest.fixture()
+def local_site():
+    site = LocalSite(acts=4)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), make_handler(site, 0, 0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    local = f"http://127.0.0.1:{server.server_port}"
+    site.connect_to = {LEGISLATION: local, AUSTLII: local, AUSTLII_DOWNLOAD: local}
+    yield site
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def make_act():
+    """
+    Builds a legislation Act with one file, keyed by its code.
+    """
+
+    def make(code, title=None):
+        return Act(
+            title or f"Act {code}",
+            "",
+            "",
+            "",
+            "",
+            ["detail"],
+            {"DC.title": f"Act {code}"},
+            f"http://page/{code}",
+            [f"http://file/{code}.pdf"],
+            False,
+            "01-01-2021 00:00:00",
+            [f"{code}.pdf"],
+        )
+
+    return make
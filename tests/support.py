@@ -0,0 +1,190 @@
+"""
+Local stand-in for legislation.gov.au and austlii.edu.au, shared by the tests and the crawl benchmark
+(benchmarks/bench_crawl.py).
+
+SyntheticSite generates index pages, detail pages and files shaped like the real sites' (the same links, element
+ids, meta tags, Content-Disposition and AustLII's .txt redirect pages) from each url, so any number of acts can be
+served without keeping them in memory. make_handler serves a site over http.server. Crawlers connect to it with
+Crawler(connect_to=...), urls and cache keys stay those of the real sites.
+"""
+
+import time
+import random
+import threading
+import zlib
+import http.server
+from urllib.parse import urlsplit
+
+LEGISLATION = "https://www.legislation.gov.au"
+AUSTLII = "http://www.austlii.edu.au"
+AUSTLII_DOWNLOAD = "http://www8.austlii.edu.au"
+LEGISLATION_INDEX = LEGISLATION + "/Browse/Results/ByTitle/Acts/InForce/Ab/0/0/principal"
+AUSTLII_INDEX = AUSTLII + "/cgi-bin/viewtoc/au/legis/cth/consol_act/toc-A.html"
+WORDS = "act commonwealth section schedule amendment regulation minister department notice tribunal".split()
+
+
+def legislation_code(i):
+    return f"C{2000 + i % 20}C{i:05d}"
+
+
+def legislation_guid(i, n):
+    return f"{i:08x}-0000-4000-8000-{n:012x}"
+
+
+def austlii_code(i):
+    return f"act{i:05d}{1900 + i % 120}"
+
+
+def words(rng, count):
+    return " ".join(rng.choices(WORDS, k=count))
+
+
+class SyntheticSite:
+    """
+    Pages and files of both sites for acts 0..acts-1. Responses depend only on the url, so repeated requests get
+    identical bodies (and ETags).
+    """
+
+    def __init__(self, acts, file_kb=64):
+        self.acts = acts
+        self.file_kb = file_kb
+
+    def _file_body(self, header: bytes, i) -> bytes:
+        line = f"{words(random.Random(i), 16)}\n".encode("ascii")
+        return header + line * (self.file_kb * 1024 // len(line) + 1)
+
+    def _page(self, body: str):
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, body.encode("utf-8")
+
+    def legislation_index(self):
+        rows = "".join(
+            f'<tr><td><a href="../Details/{legislation_code(i)}/Download">{words(random.Random(i), 6)} Act</a></td>'
+            f"<td>{2000 + i % 20}</td></tr>"
+            for i in range(self.acts)
+        )
+        return self._page(f"<html><head><title>Acts In Force</title></head><body><table>{rows}</table></body></html>")
+
+    def legislation_detail(self, i):
+        rng = random.Random(i)
+        title = f"{words(rng, 6).title()} Act {2000 + i % 20}"
+        details = "\n\n".join(f"{words(rng, 8)}\n{words(rng, 4)}" for _ in range(12))
+        links = "".join(
+            f'<a href="../Details/{legislation_code(i)}/{legislation_guid(i, n)}">{ext}</a>'
+            for n, ext in enumerate(("pdf", "docx"))
+        )
+        filler = "".join(f"<p>{words(rng, 40)}</p>" for _ in range(40))
+        return self._page(
+            f'<html><head><title>{title}</title><meta name="title" content="{title}">'
+            f'<meta name="description" content="{words(rng, 20)}"><script>var x = 1;</script></head><body>'
+            f'<table><tr id="MainContent_ucLegItemPane_trNumberYearClassification"><td>Act No. {i}</td></tr></table>'
+            f'<span id="MainContent_ucLegItemPane_lblBD">{words(rng, 30)}</span>'
+            f'<span id="MainContent_ucLegItemPane_lblAdminDepts">{words(rng, 5)}</span>'
+            f'<div id="MainContent_leftDetailMeta">{details}</div>{links}{filler}</body></html>'
+        )
+
+    def legislation_file(self, i, n):
+        ext, content_type = [
+            ("pdf", "application/pdf"),
+            ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+        ][n]
+        headers = {
+            "Content-Type": content_type,
+            "Content-Disposition": f"attachment; filename={legislation_code(i)}.{ext}",
+        }
+        return 200, headers, self._file_body(b"%PDF-1.4\n" if ext == "pdf" else b"PK\x03\x04", i * 2 + n)
+
+    def austlii_index(self):
+        links = "".join(
+            f'<li><a href="/cgi-bin/viewdoc/au/legis/cth/consol_act/{austlii_code(i)}/">'
+            f"{words(random.Random(i), 6).upper()} ACT</a></li>"
+            for i in range(self.acts)
+        )
+        return self._page(f"<html><head><title>Consolidated Acts</title></head><body><ul>{links}</ul></body></html>")
+
+    def austlii_detail(self, i):
+        rng = random.Random(i)
+        code = austlii_code(i)
+        title = f"{words(rng, 6).upper()} ACT {1900 + i % 120}"
+        filler = "".join(f"<p>{words(rng, 40)}</p>" for _ in range(40))
+        return self._page(
+            f'<html><head><title>{title}</title><meta name="description" content="{words(rng, 20)}">'
+            f'<meta name="keywords" content="{words(rng, 5)}"></head><body>'
+            f'<div class="side-download"><a href="/au/legis/cth/consol_act/{code}.rtf">RTF</a>'
+            f'<a href="/au/legis/cth/consol_act/{code}.txt">Text</a></div>{filler}</body></html>'
+        )
+
+    def austlii_file(self, i, ext):
+        code = austlii_code(i)
+        if ext == "rtf":
+            return 200, {"Content-Type": "application/rtf"}, self._file_body(b"{\\rtf1\\ansi\n", i)
+        # The .txt link is an html page linking to the file on www8
+        link = f"{AUSTLII_DOWNLOAD}/cgi-bin/download.cgi/download/au/legis/cth/consol_act/{code}.txt"
+        return self._page(f'<html><body><p>Download: <a href="{link}">{code}.txt</a></p></body></html>')
+
+    def response(self, url):
+        parts = urlsplit(url)
+        origin, path = f"{parts.scheme}://{parts.netloc}", parts.path.split("/")
+        try:
+            if url == LEGISLATION_INDEX:
+                return self.legislation_index()
+            if url == AUSTLII_INDEX:
+                return self.austlii_index()
+            if origin == LEGISLATION and path[1] == "Details":
+                i = int(path[2].rpartition("C")[2])
+                if path[3] == "Download":
+                    return self.legislation_detail(i)
+                return self.legislation_file(i, int(path[3].rpartition("-")[2], 16))
+            if origin == AUSTLII and path[1] == "cgi-bin":
+                return self.austlii_detail(int(path[7][3:8]))
+            if origin == AUSTLII:
+                name, ext = path[5].split(".")
+                return self.austlii_file(int(name[3:8]), ext)
+            if origin == AUSTLII_DOWNLOAD:
+                i = int(path[-1][3:8])
+                return 200, {"Content-Type": "text/plain"}, self._file_body(b"", i)
+        except (IndexError, ValueError):
+            pass
+        return 404, {}, b""
+
+
+def make_handler(site: SyntheticSite, latency, error_rate, error_status=503):
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, with Nagle each response would wait for a delayed ack
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, headers, body=b""):
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if latency > 0:
+                time.sleep(latency)
+            with rng_lock:
+                error = rng.random() < error_rate
+            if error:
+                self._send(error_status, {"Retry-After": "0"})
+                return
+            host = self.headers["Host"]
+            scheme = "https" if host == urlsplit(LEGISLATION).netloc else "http"
+            status, headers, body = site.response(f"{scheme}://{host}{self.path}")
+            if status != 200:
+                self._send(status, headers)
+                return
+            etag = f'"{zlib.crc32(body):08x}"'
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, {"ETag": etag})
+                return
+            self._send(200, dict(headers, ETag=etag), body)
+
+    return Handler
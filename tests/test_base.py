@@ -0,0 +1,180 @@
+import os
+import json
+import asyncio
+import dataclasses
+from unittest.mock import ANY
+import pytest
+from legaldata.austlii.crawler import ActCrawler as AustliiCrawler
+from legaldata.base import Crawler
+from legaldata.cache import CachedPage, CachePolicy, DirectoryCache, FileCache
+from legaldata.legislation.crawler import ActCrawler
+from legaldata.metrics import report_filename
+from legaldata.throttle import HostThrottle
+from support import AUSTLII_INDEX, LEGISLATION_INDEX
+
+
+@pytest.mark.parametrize("materialize", ["copy", "hardlink", "reflink", "symlink"])
+def test_materialize_modes(tmp_path, materialize):
+    cache_filename = tmp_path / "blob"
+    cache_filename.write_bytes(b"act body")
+    save_filepath = str(tmp_path / "act.pdf")
+
+    Crawler._materialize(str(cache_filename), save_filepath, materialize)
+    with open(save_filepath, "rb") as f:
+        assert f.read() == b"act body"
+    assert os.path.islink(save_filepath) == (materialize == "symlink")
+    if materialize == "hardlink":
+        assert os.path.samefile(cache_filename, save_filepath)
+
+
+def test_materialize_skips_identical_file(tmp_path, monkeypatch):
+    cache_filename = tmp_path / "blob"
+    cache_filename.write_bytes(b"act body")
+    save_filepath = tmp_path / "act.pdf"
+    save_filepath.write_bytes(b"act body")
+    os.utime(save_filepath, (0, 0))
+    inode = os.stat(save_filepath).st_ino
+
+    # Hashed as its mtime differs, then given the blob's mtime
+    sha256 = FileCache.hash_file(cache_filename)
+    Crawler._materialize(str(cache_filename), str(save_filepath), "copy", sha256)
+    assert os.stat(save_filepath).st_ino == inode
+    assert os.stat(save_filepath).st_mtime_ns == os.stat(cache_filename).st_mtime_ns
+
+    # Same size and mtime, not read at all
+    with monkeypatch.context() as m:
+        m.setattr(FileCache, "hash_file", lambda filename: pytest.fail(f"{filename} hashed"))
+        Crawler._materialize(str(cache_filename), str(save_filepath), "copy", sha256)
+
+    save_filepath.write_bytes(b"old body")
+    os.utime(save_filepath, (0, 0))
+    Crawler._materialize(str(cache_filename), str(save_filepath), "copy", sha256)
+    assert save_filepath.read_bytes() == b"act body"
+
+
+LEGISLATION_PAGE = b"""<html><head><meta name="title" content="Test Act 2020"><meta name="description" content="An Act">
+<script>var x = "<b>not markup</b>";</script></head><body><table>
+<tr id="MainContent_ucLegItemPane_trNumberYearClassification"><td>Act No. 1 of 2020</td></tr></table>
+<span id="MainContent_ucLegItemPane_lblBD">Full description</span><p>Unrelated <b>text</b></p>
+<span id="MainContent_ucLegItemPane_lblAdminDepts">Attorney-General's Department</span>
+<div id="MainContent_leftDetailMeta">Start date\n\n01 Jan 2020</div>
+<a href="../Details/C2020A00001/18b59cb0-976c-4721-ac2b-c5a57016703b">pdf</a></body></html>"""
+
+AUSTLII_PAGE = b"""<html><head><title> Test Act 2020 </title><meta name="description" content="An Act"></head><body>
+<div class="side-download other"><a href="/au/legis/cth/consol_act/ta2020.rtf">rtf</a></div>
+<div class="side-menu"><a href="/au/legis/cth/consol_act/ignored.rtf">rtf</a></div></body></html>"""
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_partial_parse_matches_full_parse(tmp_path, parser):
+    if parser == "lxml":
+        pytest.importorskip("lxml")
+    from legaldata.austlii.crawler import ActCrawler as AustliiCrawler
+    from legaldata.legislation.crawler import ActCrawler as LegislationCrawler
+
+    for crawler_class, body in [(LegislationCrawler, LEGISLATION_PAGE), (AustliiCrawler, AUSTLII_PAGE)]:
+        filename = tmp_path / "page.html"
+        filename.write_bytes(body)
+        page = CachedPage("http://a/page", "", "utf-8", [], str(filename))
+        full = crawler_class(parser=parser, partial_parse=False)
+        partial = crawler_class(parser=parser)
+        full_soup = full._parse_page(page, full._is_act_tag)
+        partial_soup = partial._parse_page(page, partial._is_act_tag)
+        assert len(partial_soup.find_all(True)) < len(full_soup.find_all(True))
+        assert crawler_class._get_act_fields(partial_soup) == crawler_class._get_act_fields(full_soup)
+
+
+def test_unknown_parser_falls_back():
+    assert Crawler(parser="no-such-parser").parser == "html.parser"
+
+
+class CountingThrottle(HostThrottle):
+    def __init__(self):
+        super(CountingThrottle, self).__init__(max_per_host=2, requests_per_sec=None)
+        self.requests = 0
+
+    def request(self, url):
+        self.requests += 1
+        return super(CountingThrottle, self).request(url)
+
+
+def test_async_crawl_matches_sync_crawl(local_site, tmp_path):
+    crawler = ActCrawler(connect_to=local_site.connect_to)
+    acts = crawler.get_acts_from_index(
+        LEGISLATION_INDEX, str(tmp_path / "sync"), cache_path=str(tmp_path / "sync-cache"), delay_sec=0
+    )
+    # A throttle set on the crawler (e.g. a sharded run's SharedHostThrottle) is used and kept
+    throttle = CountingThrottle()
+    crawler.throttle = throttle
+    async_acts = asyncio.run(
+        crawler.get_acts_from_index_async(
+            LEGISLATION_INDEX, str(tmp_path / "async"), cache_path=str(tmp_path / "async-cache"), max_per_host=2
+        )
+    )
+    crawler.close()
+    assert crawler.throttle is throttle
+    # Index page, 4 detail pages and 2 files per act
+    assert throttle.requests == 13 and len(local_site.requests) == 26
+
+    def comparable(act):
+        return act.title, act.page_url, act.download_links, [os.path.basename(f) for f in act.saved_filenames]
+
+    assert len(acts) == 4
+    assert [comparable(act) for act in async_acts] == [comparable(act) for act in acts]
+    assert sorted(os.listdir(tmp_path / "async")) == sorted(os.listdir(tmp_path / "sync"))
+
+
+@pytest.mark.parametrize("cache_backend", ["directory", "sqlite"])
+def test_warm_crawl_does_not_read_saved_files(local_site, tmp_path, monkeypatch, cache_backend):
+    def crawl():
+        with ActCrawler(connect_to=local_site.connect_to, cache_backend=cache_backend) as crawler:
+            return crawler.get_acts_from_index(
+                LEGISLATION_INDEX, str(tmp_path / "save"), cache_path=str(tmp_path / "cache"), delay_sec=0
+            )
+
+    acts = crawl()
+    monkeypatch.setattr(FileCache, "hash_file", lambda filename: pytest.fail(f"{filename} hashed"))
+    assert crawl() == [dataclasses.replace(act, loaded_from_cache=True, crawl_date=ANY) for act in acts]
+
+
+@pytest.mark.parametrize(
+    "crawler_class, index_url",
+    [(ActCrawler, LEGISLATION_INDEX), (AustliiCrawler, AUSTLII_INDEX)],
+    ids=["legislation", "austlii"],
+)
+def test_iter_acts_yields_each_act_once_saved(local_site, tmp_path, crawler_class, index_url):
+    with crawler_class(connect_to=local_site.connect_to, catalog=True) as crawler:
+        acts = crawler.iter_acts_from_index(index_url, str(tmp_path), cache_path=str(tmp_path / "cache"), delay_sec=0)
+        act = next(acts)
+        assert len(act.saved_filenames) == 2 and all((tmp_path / f).is_file() for f in act.saved_filenames)
+        requested = len(local_site.requests)
+        assert len(next(acts).saved_filenames) == 2 and len(local_site.requests) > requested
+        # Stopping early still writes the run's report
+        acts.close()
+        assert crawler.last_report["counters"]["acts"] == 2 and not crawler.last_report["completed"]
+        with open(report_filename(str(tmp_path), index_url)) as f:
+            assert json.load(f) == crawler.last_report
+        assert len(crawler.load_catalog(str(tmp_path))) == 2
+        assert list(tmp_path.glob("*.lock")) == []
+
+
+def test_cache_pruned_when_it_may_be_over_budget(local_site, tmp_path, monkeypatch):
+    pruned = []
+    prune = DirectoryCache.prune
+    monkeypatch.setattr(DirectoryCache, "prune", lambda self, policy: pruned.append(policy) or prune(self, policy))
+
+    with ActCrawler(connect_to=local_site.connect_to, cache_policy=CachePolicy(max_bytes=1024**3)) as crawler:
+
+        def crawl(use_cache):
+            save_path = str(tmp_path / "save")
+            crawler.get_acts_from_index(
+                LEGISLATION_INDEX, save_path, cache_path=str(tmp_path), use_cache=use_cache, delay_sec=0
+            )
+
+        # Pruned after the first crawl, then not until the crawls could have downloaded enough to fill the budget
+        crawl(use_cache=True)
+        crawl(use_cache=False)
+        assert len(pruned) == 1
+        crawler.cache_policy.max_bytes = 1
+        crawl(use_cache=False)
+        assert len(pruned) == 2
@@ -0,0 +1,209 @@
+import os
+import time
+import dataclasses
+import pickle
+import http.client
+import hashlib
+import threading
+from legaldata.cache import (
+    DETAIL,
+    INDEX,
+    CachePolicy,
+    CacheStats,
+    ExtractCache,
+    FileCache,
+    PageCache,
+    _write_json,
+    add_linked_save_path,
+    cache_stats,
+    compression_by_kind,
+    file_lock,
+    prune,
+)
+
+
+def key_func(url):
+    return "legal-" + url.replace("/", "_").replace(":", "")
+
+
+def make_headers(content_type):
+    headers = http.client.HTTPMessage()
+    headers["Content-Type"] = content_type
+    return headers
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_identical_files_share_blob(tmp_path):
+    cache = FileCache(f"{tmp_path}/", key_func)
+    entry1 = cache.put("http://a/1", write_file(tmp_path / "1", b"same body"), make_headers("application/pdf"))
+    entry2 = cache.put("http://a/2", write_file(tmp_path / "2", b"same body"), make_headers("application/pdf"))
+    assert entry1.sha256 == entry2.sha256
+    assert entry1.filename == entry2.filename
+    assert len(os.listdir(os.path.dirname(entry1.filename))) == 1
+
+    entry = cache.get("http://a/2")
+    assert entry.size == len(b"same body")
+    assert entry.http_headers().get("Content-Type") == "application/pdf"
+    assert cache.get("http://a/3") is None
+
+
+def test_legacy_layout_migrated(tmp_path):
+    cache_path = f"{tmp_path}/"
+    key = key_func("http://a/legacy")
+    legacy_filename = write_file(tmp_path / f"{key}.urlretrieve", b"legacy body")
+    with open(tmp_path / f"{key}.pkl", "wb") as f:
+        pickle.dump((b"legacy body", legacy_filename, make_headers("text/plain")), f)
+
+    cache = FileCache(cache_path, key_func)
+    entry = cache.get("http://a/legacy")
+    assert entry is not None
+    assert entry.http_headers().get("Content-Type") == "text/plain"
+    with open(entry.filename, "rb") as f:
+        assert f.read() == b"legacy body"
+    assert not os.path.exists(legacy_filename)
+    assert not os.path.exists(tmp_path / f"{key}.pkl")
+
+
+def test_page_cache_keeps_raw_bytes(tmp_path):
+    cache = PageCache(f"{tmp_path}/", key_func)
+    headers = make_headers("text/html; charset=windows-1252")
+    headers["ETag"] = '"v1"'
+    body = "<html><body>caf\xe9</body></html>".encode("windows-1252")
+    cache.put("http://a/page", body, headers)
+
+    page = cache.get("http://a/page")
+    assert page.read_bytes() == body
+    assert page.encoding == "windows-1252"
+    assert page.sha256 == hashlib.sha256(body).hexdigest()
+    assert page.validators == [["ETag", '"v1"']]
+
+
+def test_page_cache_legacy_page(tmp_path):
+    cache = PageCache(f"{tmp_path}/", key_func)
+    write_file(cache.filename("http://a/old"), b"<html>old</html>")
+    page = cache.get("http://a/old")
+    assert page.sha256 == hashlib.sha256(b"<html>old</html>").hexdigest()
+    assert os.path.exists(f"{page.filename}.json")
+
+
+def test_extract_cache(tmp_path):
+    cache = ExtractCache(f"{tmp_path}/")
+    assert cache.get("act-abc") is None
+    cache.put("act-abc", {"title": "Act", "download_links": ["http://a/1"]})
+    assert cache.get("act-abc") == {"title": "Act", "download_links": ["http://a/1"]}
+
+
+def test_prune_ttl_and_lru(tmp_path):
+    cache_path = f"{tmp_path}/"
+    pages = PageCache(cache_path, key_func)
+    files = FileCache(cache_path, key_func)
+    old = time.time() - 3600
+    pages.put("http://a/index", b"<html>index</html>", make_headers("text/html"), INDEX)
+    pages.put("http://a/page1", b"<html>page 1</html>", make_headers("text/html"))
+    pages.put("http://a/page2", b"<html>page 2</html>", make_headers("text/html"))
+    entry1 = files.put("http://a/1.pdf", write_file(tmp_path / "1", b"x" * 1000), make_headers("application/pdf"))
+    files.put("http://a/2.pdf", write_file(tmp_path / "2", b"x" * 1000), make_headers("application/pdf"))
+    entry3 = files.put("http://a/3.pdf", write_file(tmp_path / "3", b"y" * 1000), make_headers("application/pdf"))
+    page = pages.get("http://a/index")
+    page.fetched = old
+    _write_json(f"{page.filename}.json", dataclasses.asdict(page))
+
+    # Expired index page removed, others kept
+    summary = prune(cache_path, CachePolicy(index_ttl=60, detail_ttl=7200))
+    assert summary.expired == 1
+    assert pages.get("http://a/index") is None
+    assert pages.get("http://a/page1") is not None
+
+    # Least recently used entries go first, a blob stays while another entry uses it
+    page1_filename = pages.filename("http://a/page1")
+    file1_filename = files._index_filename(key_func("http://a/1.pdf"))
+    for i, filename in enumerate(
+        [f"{page1_filename}.json", file1_filename, files._index_filename(key_func("http://a/3.pdf"))]
+    ):
+        os.utime(filename, (old + i, old + i))
+    freed = sum(os.path.getsize(f) for f in (page1_filename, f"{page1_filename}.json", file1_filename))
+    summary = prune(cache_path, CachePolicy(max_bytes=summary.bytes - freed - 1))
+    assert summary.evicted == 3
+    assert pages.get("http://a/page1") is None
+    assert files.get("http://a/1.pdf") is None and files.get("http://a/2.pdf") is not None
+    assert os.path.exists(entry1.filename)
+    assert not os.path.exists(entry3.filename)
+
+
+def test_prune_keeps_symlinked_blobs(tmp_path):
+    cache_path = str(tmp_path / "cache")
+    files = FileCache(cache_path, key_func)
+    linked = files.put("http://a/1.pdf", write_file(tmp_path / "1", b"x" * 1000), make_headers("application/pdf"))
+    unlinked = files.put("http://a/2.pdf", write_file(tmp_path / "2", b"y" * 1000), make_headers("application/pdf"))
+    save_path = tmp_path / "save"
+    save_path.mkdir()
+    os.symlink(os.path.abspath(linked.filename), save_path / "1.pdf")
+    add_linked_save_path(cache_path, str(save_path))
+    add_linked_save_path(cache_path, str(save_path))
+
+    summary = prune(cache_path, CachePolicy(max_bytes=0))
+    assert summary.evicted == 2 and files.get("http://a/1.pdf") is None
+    assert (save_path / "1.pdf").read_bytes() == b"x" * 1000
+    assert not os.path.exists(unlinked.filename)
+    # Once unlinked the body is an orphan, removed after the grace period
+    os.remove(save_path / "1.pdf")
+    prune(cache_path, CachePolicy(max_bytes=0), orphan_grace_sec=-1)
+    assert not os.path.exists(linked.filename)
+
+
+def test_cache_stats(tmp_path):
+    cache_path = f"{tmp_path}/"
+    PageCache(cache_path, key_func).put("http://a/page", b"<html>page</html>", make_headers("text/html"))
+    for hit in (True, True, False):
+        stats = CacheStats(cache_path)
+        stats.record("http://a/page", hit)
+        stats.save()
+
+    site = cache_stats(cache_path)["a"]
+    assert (site.entries, site.hits, site.misses) == (1, 2, 1)
+    assert site.kinds == {"detail": 1}
+    assert site.bytes > len(b"<html>page</html>")
+
+
+def test_compressed_pages_and_extracts(tmp_path):
+    cache_path = f"{tmp_path}/"
+    body = b"<html><body>" + b"<p>section</p>" * 1000 + b"</body></html>"
+    compression = compression_by_kind({DETAIL: "gzip"})
+    cache = PageCache(cache_path, key_func, compression)
+    cache.put("http://a/index", body, make_headers("text/html"), INDEX)
+    page = cache.put("http://a/page", body, make_headers("text/html"))
+    assert page.filename.endswith(".html.gz") and os.path.getsize(page.filename) < len(body) / 10
+
+    # Readable whatever the reader's compression setting
+    for reader in (cache, PageCache(cache_path, key_func)):
+        assert reader.get("http://a/page").read_bytes() == body
+        assert reader.get("http://a/index").compression is None
+
+    ExtractCache(cache_path, "gzip").put("act-abc", {"title": "Act"})
+    assert ExtractCache(cache_path).get("act-abc") == {"title": "Act"}
+    assert compression_by_kind(True)[DETAIL] in ("zstd", "gzip")
+
+
+def test_removed_lock_file_still_excludes(tmp_path):
+    lock_filename = str(tmp_path / "count.lock")
+    count_filename = tmp_path / "count"
+    count_filename.write_text("0")
+
+    def increment():
+        for _ in range(50):
+            with file_lock(lock_filename, remove=True):
+                count = int(count_filename.read_text())
+                count_filename.write_text(str(count + 1))
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert count_filename.read_text() == "200"
+    assert not os.path.exists(lock_filename)
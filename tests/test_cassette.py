@@ -0,0 +1,117 @@
+import zipfile
+import threading
+import urllib.error
+import http.server
+import pytest
+from legaldata.base import Crawler
+from legaldata.cassette import CassetteMissError, RecordingTransport, ReplayTransport
+from legaldata.transport import ContentTooLargeError
+
+requests = []
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, headers, body=b""):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        requests.append(self.path)
+        if self.path == "/redirect":
+            self._send(302, {"Location": "/page"})
+        elif self.path == "/flaky" and requests.count("/flaky") == 1:
+            self._send(503, {"Retry-After": "0"})
+        elif self.path == "/missing":
+            self._send(404, {})
+        elif self.headers.get("If-None-Match") == '"v1"':
+            self._send(304, {"ETag": '"v1"'})
+        elif self.path == "/large.pdf":
+            self._send(200, {"Content-Type": "application/pdf"}, b"%PDF" * 100000)
+        elif self.path == "/file.pdf":
+            self._send(200, {"Content-Type": "application/pdf", "ETag": '"v1"'}, b"%PDF" * 100)
+        else:
+            self._send(200, {"Content-Type": "text/html; charset=utf-8"}, f"<p>{self.path}</p>".encode())
+
+
+@pytest.fixture()
+def base_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    requests.clear()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_record_and_replay(base_url, tmp_path):
+    cassette = str(tmp_path / "cassette.zip")
+    transport = RecordingTransport(cassette, "test-agent")
+    assert transport.get(f"{base_url}/redirect") == b"<p>/page</p>"
+    assert transport.get(f"{base_url}/page") == b"<p>/page</p>"
+    status, headers = transport.download(f"{base_url}/file.pdf", tmp_path / "file.pdf")
+    assert transport.download(f"{base_url}/file.pdf", tmp_path / "file.pdf", {"If-None-Match": '"v1"'})[0] == 304
+    with pytest.raises(urllib.error.HTTPError):
+        transport.get(f"{base_url}/missing")
+    transport.close()
+    recorded = len(requests)
+
+    replay = ReplayTransport(cassette, "test-agent")
+    assert replay.get(f"{base_url}/redirect") == b"<p>/page</p>"
+    assert replay.request(f"{base_url}/page").headers.get_content_charset() == "utf-8"
+    replayed_status, replayed_headers = replay.download(f"{base_url}/file.pdf", tmp_path / "replayed.pdf")
+    assert (replayed_status, replayed_headers.items()) == (status, headers.items())
+    assert (tmp_path / "replayed.pdf").read_bytes() == b"%PDF" * 100
+    assert replay.download(f"{base_url}/file.pdf", tmp_path / "replayed.pdf", {"If-None-Match": '"v1"'})[0] == 304
+    with pytest.raises(urllib.error.HTTPError) as err:
+        replay.get(f"{base_url}/missing")
+    assert err.value.code == 404
+    with pytest.raises(CassetteMissError):
+        replay.get(f"{base_url}/other")
+    replay.close()
+    assert len(requests) == recorded
+
+
+def test_replay_retries_without_waiting(base_url, tmp_path):
+    cassette = str(tmp_path / "cassette.zip")
+    crawler = Crawler(record=cassette, retry_attempts=2, backoff_base=0.01)
+    assert crawler._with_retries(f"{base_url}/flaky", lambda: (200, crawler.transport.get(f"{base_url}/flaky"))) == (
+        b"<p>/flaky</p>"
+    )
+    crawler.close()
+
+    crawler = Crawler(replay=cassette, retry_attempts=2, backoff_base=1000.0)
+    assert crawler._new_throttle(1, 0.001) is None
+    assert crawler._with_retries(f"{base_url}/flaky", lambda: (200, crawler.transport.get(f"{base_url}/flaky"))) == (
+        b"<p>/flaky</p>"
+    )
+    assert crawler.metrics.counters["retries"] == 1
+    crawler.close()
+    assert requests == ["/flaky", "/flaky"]
+
+
+def test_recording_stops_at_max_bytes(base_url, tmp_path):
+    cassette = str(tmp_path / "cassette.zip")
+    transport = RecordingTransport(cassette, "test-agent")
+    with pytest.raises(ContentTooLargeError):
+        transport.download(f"{base_url}/large.pdf", tmp_path / "large.pdf", max_bytes=1000)
+    transport.download(f"{base_url}/file.pdf", tmp_path / "file.pdf")
+    transport.close()
+    # The abandoned body wasn't read, so only file.pdf's body was recorded in full
+    with zipfile.ZipFile(cassette) as archive:
+        assert sorted(i.file_size for i in archive.infolist() if i.filename.startswith("bodies/")) == [0, 400]
+
+    replay = ReplayTransport(cassette, "test-agent")
+    with pytest.raises(ContentTooLargeError):
+        replay.download(f"{base_url}/large.pdf", tmp_path / "replayed.pdf", max_bytes=1000)
+    assert replay.download(f"{base_url}/file.pdf", tmp_path / "replayed.pdf")[0] == 200
+    replay.close()
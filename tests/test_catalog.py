@@ -0,0 +1,47 @@
+import pytest
+from legaldata.austlii.act import Act as AustliiAct
+from legaldata.catalog import ActCatalog, compact_catalog, export_parquet, load_catalog, pyarrow
+from legaldata.legislation.act import Act
+
+
+def test_catalog_batches_and_latest_act(tmp_path, make_act):
+    filename = str(tmp_path / "catalog.jsonl")
+    catalog = ActCatalog(filename, batch_size=2)
+    catalog.add(make_act("C1"))
+    assert load_catalog(filename) == []
+    catalog.add(make_act("C2"))
+    assert len(load_catalog(filename)) == 2
+    catalog.add(make_act("C1", "Act C1 amended"))
+    catalog.close()
+    with open(filename, "ab") as f:
+        f.write(b'{"title": "torn')
+
+    acts = load_catalog(filename, Act)
+    assert [act.title for act in acts] == ["Act C2", "Act C1 amended"]
+    assert compact_catalog(filename) == 2
+    assert load_catalog(filename, Act) == acts
+    with open(filename) as f:
+        assert len(f.readlines()) == 2
+
+
+def test_catalog_austlii_schema(tmp_path):
+    filename = str(tmp_path / "catalog.jsonl")
+    act = AustliiAct("Act", "abc", "desc", {}, "http://page/abc", [], True, "01-01-2021 00:00:00", [])
+    catalog = ActCatalog(filename)
+    catalog.add(act)
+    catalog.close()
+    assert load_catalog(filename, AustliiAct) == [act]
+
+
+@pytest.mark.skipif(pyarrow is None, reason="pyarrow not installed")
+def test_export_parquet(tmp_path, make_act):
+    filename = str(tmp_path / "catalog.jsonl")
+    catalog = ActCatalog(filename)
+    catalog.add(make_act("C1"))
+    catalog.add(make_act("C2"))
+    catalog.close()
+
+    assert export_parquet(filename, str(tmp_path / "catalog.parquet")) == 2
+    table = pyarrow.parquet.read_table(str(tmp_path / "catalog.parquet"))
+    assert table.column("title").to_pylist() == ["Act C1", "Act C2"]
+    assert table.column("meta_tags").to_pylist()[0] == [("DC.title", "Act C1")]
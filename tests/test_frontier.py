@@ -0,0 +1,75 @@
+import pytest
+from legaldata import frontier
+from legaldata.base import Crawler
+from legaldata.frontier import SeenSet, UrlFrontier, normalize_url, unique_urls, url_hash
+
+
+def test_normalize_url():
+    url = normalize_url("HTTPS://WWW.Legislation.gov.au:443/Details/./C2004A00001/Download#top")
+    assert url == "https://www.legislation.gov.au/Details/C2004A00001/Download"
+    assert normalize_url("http://host:8080/a/b/../c?Q=1") == "http://host:8080/a/c?Q=1"
+    assert normalize_url("http://host") == "http://host/"
+    assert normalize_url("http://host/A") != normalize_url("http://host/a")
+    assert unique_urls(["http://host/a", "HTTP://host/a#x", "http://host/b", "http://host/a"]) == [
+        "http://host/a",
+        "http://host/b",
+    ]
+
+
+def test_seen_set_persists_and_merges(tmp_path, monkeypatch):
+    monkeypatch.setattr(frontier, "MERGE_SIZE", 4)
+    monkeypatch.setattr(frontier, "SORT_CHUNK_SIZE", 5)
+    filename = str(tmp_path / "seen")
+    seen = SeenSet(filename)
+    other = SeenSet(filename)
+    assert seen.add(1) and seen.add(2) and not seen.add(1)
+    # Hashes added by another instance (e.g. another process) are picked up
+    assert 2 in other and not other.add(2)
+    for value in range(10, 20):
+        assert seen.add(value)
+    assert len(seen) == 12 and 15 in seen and 3 not in seen
+    seen.close()
+    other.close()
+
+    with open(filename, "ab") as f:
+        f.write(b"torn")
+    seen = SeenSet(filename)
+    assert len(seen) == 12 and all(value in seen for value in range(10, 20))
+    assert seen.add(3)
+    seen.close()
+    assert len(SeenSet(filename)) == 13
+
+
+def test_frontier_claims(tmp_path):
+    filename = str(tmp_path / "frontier.seen")
+    with UrlFrontier(filename) as urls:
+        assert urls.claim("http://host/a")
+        assert not urls.claim("HTTP://host/a#top")
+        urls.release("http://host/a")
+        assert urls.claim("http://host/a")
+        urls.done("http://host/a")
+        assert not urls.claim("http://host/a")
+    with UrlFrontier(filename) as urls:
+        assert not urls.claim("http://host/a") and urls.claim("http://host/b")
+        assert url_hash("http://host/a") in urls.seen
+
+
+def test_crawler_skips_acts_crawled_in_run():
+    crawler = Crawler()
+    crawled = []
+
+    def crawl_act(url, *args):
+        if url == "http://host/fails":
+            raise ValueError(url)
+        crawled.append(url)
+        return url
+
+    crawler._crawl_act = crawl_act
+    crawler.frontier = UrlFrontier()
+    assert crawler._crawl_frontier_act("http://host/a") == "http://host/a"
+    assert crawler._crawl_frontier_act("http://host/a") is None
+    with pytest.raises(ValueError):
+        crawler._crawl_frontier_act("http://host/fails")
+    assert crawler.frontier.claim("http://host/fails")
+    assert crawled == ["http://host/a"]
+    crawler.close()
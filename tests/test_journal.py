@@ -0,0 +1,81 @@
+import os
+import dataclasses
+from legaldata.journal import JOURNAL_DIRNAME, CrawlJournal, journal_filename
+from legaldata.legislation.crawler import ActCrawler
+from support import LEGISLATION_INDEX
+
+
+def test_journal_reload_ignores_torn_line(tmp_path, make_act):
+    filename = str(tmp_path / "journal.jsonl")
+    journal = CrawlJournal(filename)
+    index = journal.open_index("http://index")
+    index.record_download_page_urls(["http://page/C1", "http://page/C2"])
+    index.record_act(dataclasses.asdict(make_act("C1")))
+    index.record_file("http://page/C1", "http://file/C1.pdf", "C1.pdf")
+    journal.close()
+    with open(filename, "ab") as f:
+        f.write(b'{"step": "done", "index_u')
+
+    index = CrawlJournal(filename).open_index("http://index")
+    assert index.download_page_urls() == ["http://page/C1", "http://page/C2"]
+    assert index.act("http://page/C1")["title"] == "Act C1"
+    assert index.saved_file("http://page/C1", "http://file/C1.pdf") == "C1.pdf"
+    assert index.done_act("http://page/C1") is None
+
+
+def test_journal_keeps_index_urls_apart(tmp_path):
+    filename = str(tmp_path / "journal.jsonl")
+    journal = CrawlJournal(filename)
+    journal.open_index("http://index").record_download_page_urls(["http://page/C1"])
+    journal.open_index("http://other").record_download_page_urls(["http://page/C2"])
+    journal.close()
+
+    journal = CrawlJournal(filename)
+    assert journal.open_index("http://index").download_page_urls() == ["http://page/C1"]
+    assert journal.open_index("http://other").download_page_urls() == ["http://page/C2"]
+    assert journal.open_index("http://third").download_page_urls() is None
+    journal.close()
+
+
+def test_crawl_act_skips_completed_act(tmp_path, make_act):
+    crawler = ActCrawler()
+    crawler.journal = crawler._open_journal(str(tmp_path), "http://index", resume=True)
+    crawler.journal.record_act(dataclasses.asdict(dataclasses.replace(make_act("C1"), saved_filenames=[])))
+    crawler.journal.record_done("http://page/C1", ["C1.pdf"])
+
+    def no_requests(*args):
+        raise AssertionError("completed act fetched")
+
+    crawler._get_act = no_requests
+    act = crawler._crawl_act("http://page/C1", "http://index", str(tmp_path), "", None, True, None, None)
+    assert act == make_act("C1")
+    crawler.close()
+
+
+def test_interrupted_crawl_resumes(local_site, tmp_path):
+    save_path = str(tmp_path / "save")
+
+    def crawl(resume):
+        cache_path = str(tmp_path / "cache")
+        return crawler.iter_acts_from_index(
+            LEGISLATION_INDEX, save_path, cache_path=cache_path, use_cache=False, delay_sec=0, resume=resume
+        )
+
+    with ActCrawler(connect_to=local_site.connect_to) as crawler:
+        # Crawls that can't be resumed aren't journaled
+        assert len(list(crawl(resume=False))) == 4
+        assert not os.path.exists(os.path.join(save_path, JOURNAL_DIRNAME))
+
+        acts = crawl(resume=True)
+        first = [next(acts), next(acts)]
+        acts.close()
+        with open(journal_filename(save_path, LEGISLATION_INDEX)) as f:
+            # The index page, then each act's details, 2 files and done
+            assert len(f.readlines()) == 1 + 2 * 4
+
+        local_site.requests.clear()
+        acts = list(crawl(resume=True))
+        assert acts[:2] == first and len(acts) == 4
+        # Only the acts not saved before the interruption are fetched
+        assert len(local_site.requests) == 2 * 3
+        assert not os.path.exists(journal_filename(save_path, LEGISLATION_INDEX))
@@ -1,5 +1,6 @@
 import os
 import shutil
+import asyncio
 from pathlib import Path
 from legaldata.legislation import crawler
 from legaldata.helpers import pdf2text
@@ -45,6 +46,36 @@ def test_get_acts_no_cache():
             assert Path(os.path.join(save_path, file)).is_file()
 
 
+def test_get_acts_async():
+    remove_dirs()
+    act_limit = 3
+    index_url = crawler.ActCrawler().get_index_pages()[0]
+    acts = asyncio.run(
+        crawler.ActCrawler().get_acts_from_index_async(
+            index_url, save_path, use_cache=False, act_limit=act_limit, max_per_host=2, requests_per_sec=1
+        )
+    )
+    assert len(acts) == act_limit
+    for act in acts:
+        assert act.title is not None and len(act.title) > 0
+        assert len(act.download_links) == len(act.saved_filenames)
+        for file in act.saved_filenames:
+            assert Path(os.path.join(save_path, file)).is_file()
+
+
+def test_iter_acts():
+    remove_dirs()
+    act_limit = 2
+    index_url = crawler.ActCrawler().get_index_pages()[0]
+    count = 0
+    for act in crawler.ActCrawler().iter_acts_from_index(index_url, save_path, act_limit=act_limit, delay_sec=1):
+        count += 1
+        assert len(act.download_links) == len(act.saved_filenames)
+        for file in act.saved_filenames:
+            assert Path(os.path.join(save_path, file)).is_file()
+    assert count == act_limit
+
+
 def xtest_pdf2text():
     for filename in os.listdir(save_path):
         if filename.endswith("pdf"):
@@ -0,0 +1,32 @@
+import re
+from legaldata.links import find_links
+from legaldata.austlii.crawler import ActCrawler as AustliiCrawler
+from legaldata.legislation.crawler import ActCrawler as LegislationCrawler
+
+INDEX_PAGE = """<html><body><a href="../Details/C2020A00002/Download">Caf\xe9 Act</a>
+<a href="../Details/C2020A00001/Download">A</a><a href="../Details/C2020A00002/Download">again</a></body></html>"""
+
+
+def test_find_links_dedups_in_document_order():
+    pattern = re.compile(rb'href="/([a-z])"')
+    body = b'<a href="/b"></a><a href="/a"></a><a href="/b"></a><a href="/c">'
+    assert find_links(body, pattern, "http://x/{}") == ["http://x/b", "http://x/a", "http://x/c"]
+    assert find_links(body, re.compile(rb"/[ab]")) == ["/b", "/a"]
+
+
+def test_find_links_non_ascii_encodings():
+    for encoding in ("utf-8", "windows-1252", "utf-16"):
+        links = LegislationCrawler._get_act_download_page_urls(INDEX_PAGE.encode(encoding), encoding)
+        assert links == [
+            "https://www.legislation.gov.au/Details/C2020A00001/Download",
+            "https://www.legislation.gov.au/Details/C2020A00002/Download",
+        ]
+
+
+def test_austlii_redirected_download_link():
+    body = (
+        b'<html><body><a href="http://www8.austlii.edu.au/cgi-bin/download.cgi/download/au/legis/cth/consol_act/'
+        b'abc1.txt">http://www8.austlii.edu.au/abc1.txt</a></body></html>'
+    )
+    link = AustliiCrawler._get_act_redirected_download_page_url(body, "http://www.austlii.edu.au/a/abc1.txt")
+    assert link == "http://www8.austlii.edu.au/cgi-bin/download.cgi/download/au/legis/cth/consol_act/abc1.txt"
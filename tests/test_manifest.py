@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from legaldata.legislation.crawler import ActCrawler
+from legaldata.manifest import ActManifest, ManifestEntry
+from support import LEGISLATION_INDEX, legislation_code, legislation_guid
+
+
+def make_entry(code, index_url="http://index", download_links=None, saved_filenames=None):
+    return ManifestEntry(
+        code,
+        index_url,
+        f"http://page/{code}",
+        download_links or [f"http://file/{code}.pdf"],
+        {},
+        saved_filenames or [],
+        "01-01-2021 00:00:00",
+    )
+
+
+def test_manifest_roundtrip_and_changes(tmp_path):
+    filename = str(tmp_path / "manifest.json")
+    manifest = ActManifest(filename)
+    manifest.update(make_entry("C1", saved_filenames=["c1.pdf"]))
+    manifest.update(make_entry("C2"))
+    manifest.update(make_entry("C3", index_url="http://other"))
+    manifest.save()
+
+    (tmp_path / "c1.pdf").write_bytes(b"pdf")
+    manifest = ActManifest(filename)
+    assert manifest.is_unchanged("C1", "http://page/C1", ["http://file/C1.pdf"], str(tmp_path))
+    assert not manifest.is_unchanged("C1", "http://page/C1", ["http://file/C1.docx"], str(tmp_path))
+    assert not manifest.is_unchanged("C4", "http://page/C4", [], str(tmp_path))
+
+    assert manifest.remove_missing("http://index", {"C1"}) == ["C2"]
+    assert manifest.get("C3") is not None
+
+
+def test_manifest_save_merges_concurrent_updates(tmp_path):
+    filename = str(tmp_path / "manifest.json")
+    first = ActManifest(filename)
+    second = ActManifest(filename)
+    first.update(make_entry("C1"))
+    second.update(make_entry("C2", index_url="http://other"))
+    first.save()
+    second.save()
+    assert sorted(ActManifest(filename).entries) == ["C1", "C2"]
+
+    first.remove_missing("http://index", set())
+    first.save()
+    assert sorted(ActManifest(filename).entries) == ["C2"]
+
+
+def test_incremental_crawl_skips_unchanged_acts(local_site, tmp_path):
+    def crawl():
+        with ActCrawler(connect_to=local_site.connect_to) as crawler:
+            acts = crawler.get_acts_from_index(
+                LEGISLATION_INDEX,
+                str(tmp_path / "save"),
+                cache_path=str(tmp_path / "cache"),
+                use_cache="revalidate",
+                delay_sec=0,
+                incremental=True,
+            )
+            return acts, crawler.last_changes
+
+    acts, changes = crawl()
+    codes = [legislation_code(i) for i in range(4)]
+    assert sorted(changes.added) == sorted(codes) and len(acts) == 4
+
+    # Act 3 is no longer listed and act 1's docx link is gone
+    local_site.acts = 3
+    legislation_detail = local_site.legislation_detail
+    docx_link = f'<a href="../Details/{codes[1]}/{legislation_guid(1, 1)}">docx</a>'.encode()
+
+    def changed_detail(i):
+        status, headers, body = legislation_detail(i)
+        return status, headers, body.replace(docx_link, b"") if i == 1 else body
+
+    local_site.legislation_detail = changed_detail
+    local_site.requests.clear()
+    acts, changes = crawl()
+    assert (changes.added, changes.changed, changes.removed) == ([], [codes[1]], [codes[3]])
+    assert sorted(changes.unchanged) == [codes[0], codes[2]]
+    assert [len(act.download_links) for act in acts] == [2, 1, 2]
+    # Unchanged acts' files aren't requested, not even revalidated
+    assert [url for url in local_site.requests if "Download" not in url and url != LEGISLATION_INDEX] == [
+        f"https://www.legislation.gov.au/Details/{codes[1]}/{legislation_guid(1, 0)}"
+    ]
+    assert sorted(ActManifest(str(tmp_path / "save" / "legaldata-manifest.json")).entries) == codes[:3]
+    assert list((tmp_path / "save").glob("*.lock")) == []
+
+
+def test_async_crawl_keeps_manifest_progress_when_an_act_fails(local_site, tmp_path):
+    crawler = ActCrawler(connect_to=local_site.connect_to)
+    crawl_act = crawler._crawl_frontier_act
+    failing = legislation_code(1)
+
+    def failing_crawl_act(download_page_url, *args):
+        if failing in download_page_url:
+            raise ValueError(f"act {failing} failed")
+        return crawl_act(download_page_url, *args)
+
+    crawler._crawl_frontier_act = failing_crawl_act
+    with pytest.raises(ValueError):
+        asyncio.run(
+            crawler.get_acts_from_index_async(
+                LEGISLATION_INDEX,
+                str(tmp_path / "save"),
+                cache_path=str(tmp_path / "cache"),
+                requests_per_sec=None,
+                incremental=True,
+            )
+        )
+    crawler.close()
+    entries = ActManifest(str(tmp_path / "save" / "legaldata-manifest.json")).entries
+    assert sorted(entries) == sorted(legislation_code(i) for i in range(4) if i != 1)
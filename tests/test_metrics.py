@@ -0,0 +1,53 @@
+import json
+from legaldata.base import Crawler
+from legaldata.metrics import CrawlMetrics, Histogram, write_report
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    for seconds in (0.002, 0.003, 0.2, 1000.0):
+        histogram.observe(seconds)
+    assert histogram.count == 4 and histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(0.75) == 0.25
+    assert histogram.quantile(0.99) is None
+
+
+def test_run_metrics_and_report(tmp_path):
+    metrics = CrawlMetrics()
+    metrics.inc("requests", 3)
+    metrics.observe("fetch", 0.5)
+    start = metrics.snapshot()
+    metrics.inc("requests")
+    metrics.inc("cache_hits")
+    with metrics.timer("parse"):
+        pass
+
+    run = metrics.snapshot().minus(start)
+    assert run.counters["requests"] == 1 and run.histograms["fetch"].count == 0
+    report = write_report(str(tmp_path / "report.json"), run, index_url="http://index")
+    with open(tmp_path / "report.json") as f:
+        assert json.load(f) == report
+    assert report["index_url"] == "http://index" and report["cache_hit_ratio"] == 1.0
+    assert report["phases"]["parse"]["count"] == 1
+
+    text = metrics.prometheus({"crawler": "test"})
+    assert 'legaldata_requests_total{crawler="test"} 4' in text
+    assert 'legaldata_phase_seconds_bucket{crawler="test",phase="fetch",le="+Inf"} 1' in text
+    assert "legaldata_requests_total 4" in metrics.prometheus()
+
+
+def test_with_retries_counts_requests_and_retries():
+    crawler = Crawler(retry_attempts=3, backoff_base=0.01)
+    errors = [ConnectionResetError()]
+
+    def flaky():
+        if len(errors) > 0:
+            raise errors.pop(0)
+        return 200, "body"
+
+    assert crawler._with_retries("http://host/page", flaky) == "body"
+    counters = crawler.metrics.counters
+    assert (counters["requests"], counters["request_errors"], counters["retries"]) == (2, 1, 1)
+    assert crawler.metrics.histograms["fetch"].count == 2
+    crawler.close()
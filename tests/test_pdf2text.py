@@ -0,0 +1,75 @@
+import os
+import time
+import signal
+import pytest
+from legaldata.helpers import pdf2text
+
+
+def make_pdf(*pages) -> bytes:
+    # Minimal pdf with one page per text, each page object followed by its content stream
+    count = len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(count))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode("ascii"),
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("ascii")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {3 + 2 * count} 0 R >> >> >>".encode("ascii")
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (i + 1, obj)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+def test_convert_all(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "act1.pdf").write_bytes(make_pdf("Test Act One"))
+    (tmp_path / "sub" / "act2.PDF").write_bytes(make_pdf("Test Act Two"))
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+
+    summary = pdf2text.convert_all(str(tmp_path), max_workers=2, timeout=60)
+    assert (summary.converted, summary.skipped, summary.failed) == (2, 0, 1)
+    assert list(summary.failures) == ["broken.pdf"]
+    assert "Test Act One" in (tmp_path / "act1.pdf.pdfminer.txt").read_text()
+    assert "Test Act Two" in (tmp_path / "sub" / "act2.PDF.pdfminer.txt").read_text()
+    assert (tmp_path / pdf2text.SUMMARY_FILENAME).is_file()
+
+    # Unchanged content with a newer pdf mtime is still up to date, changed content is converted again
+    os.utime(tmp_path / "act1.pdf", (2e9, 2e9))
+    (tmp_path / "sub" / "act2.PDF").write_bytes(make_pdf("Amended Act Two"))
+    os.utime(tmp_path / "sub" / "act2.PDF", (2e9, 2e9))
+    summary = pdf2text.convert_all(str(tmp_path), max_workers=2, timeout=60)
+    assert (summary.converted, summary.skipped, summary.failed) == (1, 1, 1)
+    assert "Amended Act Two" in (tmp_path / "sub" / "act2.PDF.pdfminer.txt").read_text()
+
+
+def test_streaming_page_index(tmp_path):
+    input_file = tmp_path / "act.pdf"
+    input_file.write_bytes(make_pdf("Page one", "Page two caf\\351", "Page three"))
+    output_file = pdf2text.convert_pdfminer(str(input_file), page_index=True)
+
+    with open(output_file, encoding="utf-8") as f:
+        assert f.read() == pdf2text.extract_text(str(input_file))
+    assert "Page two" in pdf2text.read_page(output_file, 1)
+    assert "Page three" in pdf2text.read_page(output_file, 2)
+    assert "Page one" not in pdf2text.read_page(output_file, 2)
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGALRM"), reason="conversions aren't timed out without SIGALRM")
+def test_timeout_under_a_second(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf2text, "convert_pdfminer", lambda *args, **kwargs: time.sleep(5))
+    status, error, seconds = pdf2text._convert_with_timeout(str(tmp_path / "slow.pdf"), 0.2, True, False)
+    assert status == "timed_out" and seconds < 2
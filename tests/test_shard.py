@@ -0,0 +1,84 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from legaldata.shard import ShardedRun, ShardResult, run_sharded
+from legaldata.throttle import SharedHostThrottle
+from support import LEGISLATION_INDEX
+
+
+def test_claims_and_summary(tmp_path):
+    run = ShardedRun(str(tmp_path), claim_timeout=60)
+    assert run.claim("http://index/a", "worker-1")
+    assert not run.claim("http://index/a", "worker-2")
+    assert run.claim("http://index/b", "worker-2")
+
+    started = time.time()
+    run.record(ShardResult("http://index/a", "worker-1", acts=2, files=3, started=started, finished=started + 2))
+    run.record(ShardResult("http://index/b", "worker-2", error="HTTPError", started=started, finished=started + 1))
+    assert not run.claim("http://index/a", "worker-3")
+    # Failures are retried by later runs, not by workers that started before the failure
+    assert not run.claim("http://index/b", "worker-3", retry_failed_before=started)
+    assert run.claim("http://index/b", "worker-3", retry_failed_before=time.time() + 10)
+
+    summary = run.summary(["http://index/a", "http://index/b", "http://index/c"])
+    assert (summary.completed, summary.failed, summary.acts, summary.files) == (1, 1, 2, 3)
+    assert summary.pending == ["http://index/c"]
+    assert summary.failures == {"http://index/b": "HTTPError"}
+    assert os.path.isfile(tmp_path / "summary.json")
+
+
+def test_abandoned_claim_taken_over(tmp_path):
+    run = ShardedRun(str(tmp_path), claim_timeout=60)
+    assert run.claim("http://index/a", "worker-1")
+    os.utime(run._claim_filename("http://index/a"), (0, 0))
+    assert run.claim("http://index/a", "worker-2")
+    assert not run.claim("http://index/a", "worker-3")
+
+    # Of several workers finding the claim abandoned at once, one takes it over
+    os.utime(run._claim_filename("http://index/a"), (0, 0))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        claimed = list(executor.map(lambda i: run.claim("http://index/a", f"worker-{i}"), range(4, 12)))
+    assert claimed.count(True) == 1
+    with open(run._claim_filename("http://index/a")) as f:
+        assert f.read() == f"worker-{claimed.index(True) + 4}"
+    assert os.listdir(run.claims_path) == [os.path.basename(run._claim_filename("http://index/a"))]
+
+
+def throttled_requests(state_path, count):
+    throttle = SharedHostThrottle(state_path, requests_per_sec=20)
+    times = []
+    for _ in range(count):
+        with throttle.request("http://host/page"):
+            times.append(time.time())
+    return times
+
+
+def test_shared_throttle_spaces_requests_across_processes(tmp_path):
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(throttled_requests, str(tmp_path), 4) for _ in range(2)]
+        times = sorted(t for future in futures for t in future.result())
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) > 0.04
+
+
+def test_shared_throttle_backs_off_every_worker(tmp_path):
+    # A 503 answered to one worker widens the spacing of the others' requests
+    SharedHostThrottle(str(tmp_path), requests_per_sec=20).feedback("http://host/page", 0.01, 503)
+    times = throttled_requests(str(tmp_path), 3)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) > 0.4
+
+
+def test_run_sharded(local_site, tmp_path):
+    summary = run_sharded(
+        "legislation",
+        str(tmp_path / "save"),
+        str(tmp_path / "shared"),
+        index_urls=[LEGISLATION_INDEX],
+        workers=2,
+        requests_per_sec=None,
+        crawler_kwargs={"connect_to": local_site.connect_to},
+        cache_path=str(tmp_path / "cache"),
+        delay_sec=1,
+    )
+    assert (summary.completed, summary.failed, summary.acts, summary.files) == (1, 0, 4, 8)
@@ -0,0 +1,136 @@
+import os
+import json
+import http.client
+from legaldata.cache import (
+    DETAIL,
+    CachePolicy,
+    ExtractCache,
+    FileCache,
+    PageCache,
+    add_linked_save_path,
+    compression_by_kind,
+)
+from legaldata.sqlite_cache import SqliteCache, migrate
+
+
+def key_func(url):
+    return "legal-" + url.replace("/", "_").replace(":", "")
+
+
+def make_headers(content_type, etag=None):
+    headers = http.client.HTTPMessage()
+    headers["Content-Type"] = content_type
+    if etag is not None:
+        headers["ETag"] = etag
+    return headers
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_sqlite_cache_roundtrip(tmp_path):
+    cache = SqliteCache(str(tmp_path), compression=compression_by_kind({DETAIL: "gzip"}), inline_max_bytes=8)
+    body = b"<html>" + b"<p>section</p>" * 100 + b"</html>"
+    cache.pages.put("http://a/page", body, make_headers("text/html; charset=utf-8", '"v1"'))
+    small = cache.files.put("http://a/small", write_file(tmp_path / "1", b"small"), make_headers("text/plain"))
+    large = cache.files.put("http://a/large", write_file(tmp_path / "2", b"large body"), make_headers("text/plain"))
+    cache.extracts.put("act-abc", {"title": "Act"})
+    cache.close()
+
+    cache = SqliteCache(str(tmp_path))
+    page = cache.pages.get("http://a/page")
+    assert page.read_bytes() == body and page.encoding == "utf-8" and page.validators == [["ETag", '"v1"']]
+    assert page.compression == "gzip"
+    # Small bodies live in the database, larger ones as blob files
+    assert small.filename == "" and cache.files.get("http://a/small").read_bytes() == b"small"
+    assert os.path.isfile(large.filename) and cache.files.get("http://a/large").read_bytes() == b"large body"
+    assert cache.files.get("http://a/small").http_headers()["Content-Type"] == "text/plain"
+    assert cache.extracts.get("act-abc") == {"title": "Act"}
+    assert cache.pages.get("http://a/missing") is None and cache.files.get("http://a/missing") is None
+    cache.close()
+
+
+def test_sqlite_cache_prune(tmp_path):
+    cache = SqliteCache(str(tmp_path), inline_max_bytes=0)
+    entry = cache.files.put("http://a/1", write_file(tmp_path / "1", b"x" * 1000), make_headers("application/pdf"))
+    cache.files.put("http://a/2", write_file(tmp_path / "2", b"y" * 1000), make_headers("application/pdf"))
+    cache.db.execute("UPDATE files SET used = 0 WHERE url = ?", ("http://a/1",))
+
+    summary = cache.prune(CachePolicy(max_bytes=1500))
+    assert summary.evicted == 1 and summary.entries == 1
+    assert cache.files.get("http://a/1") is None and not os.path.exists(entry.filename)
+    assert cache.files.get("http://a/2") is not None
+    assert cache.stats()["a"].entries == 1
+
+    # Bodies symlinked from a save path are kept
+    save_path = tmp_path / "save"
+    save_path.mkdir()
+    os.symlink(cache.files.get("http://a/2").filename, save_path / "2.pdf")
+    add_linked_save_path(str(tmp_path), str(save_path))
+    summary = cache.prune(CachePolicy(max_bytes=0), orphan_grace_sec=-1)
+    assert summary.evicted == 1 and cache.files.get("http://a/2") is None
+    assert (save_path / "2.pdf").read_bytes() == b"y" * 1000
+    cache.close()
+
+
+def test_migrate_directory_cache(tmp_path):
+    cache_path = f"{tmp_path}/"
+    PageCache(cache_path, key_func, compression_by_kind({DETAIL: "gzip"})).put(
+        "http://a/page", b"<html>page</html>", make_headers("text/html")
+    )
+    FileCache(cache_path, key_func).put(
+        "http://a/file", write_file(tmp_path / "1", b"file"), make_headers("text/plain")
+    )
+    ExtractCache(cache_path).put("act-abc", {"title": "Act"})
+
+    summary = migrate(cache_path, remove=True)
+    assert (summary.pages, summary.files, summary.extracts, summary.skipped) == (1, 1, 1, 0)
+    assert not os.path.exists(f"{cache_path}legal-http_a_page.html.gz")
+
+    cache = SqliteCache(cache_path)
+    assert cache.pages.get("http://a/page").read_bytes() == b"<html>page</html>"
+    assert cache.files.get("http://a/file").read_bytes() == b"file"
+    assert cache.extracts.get("act-abc") == {"title": "Act"}
+    cache.close()
+
+
+def test_migrate_keeps_blobs_of_skipped_entries(tmp_path):
+    cache_path = f"{tmp_path}/"
+    files = FileCache(cache_path, key_func)
+    files.put("http://a/file", write_file(tmp_path / "1", b"file"), make_headers("text/plain"))
+    files.put("http://a/copy", write_file(tmp_path / "2", b"file"), make_headers("text/plain"))
+    # An entry migrate can't place, still using the blob it shares with http://a/file
+    skipped_filename = files._index_filename(key_func("http://a/copy"))
+    with open(skipped_filename) as f:
+        entry = json.load(f)
+    with open(skipped_filename, "w") as f:
+        json.dump(dict(entry, url=""), f)
+
+    summary = migrate(cache_path, remove=True)
+    assert (summary.files, summary.skipped) == (1, 1)
+    assert os.path.isfile(skipped_filename)
+    assert os.path.isfile(files.blob_filename(entry["sha256"]))
+    cache = SqliteCache(cache_path)
+    assert cache.files.get("http://a/file").read_bytes() == b"file"
+    cache.close()
+
+
+def test_migrate_keeps_symlinked_blobs(tmp_path):
+    cache_path = f"{tmp_path}/cache/"
+    entry = FileCache(cache_path, key_func).put(
+        "http://a/file", write_file(tmp_path / "1", b"file"), make_headers("text/plain")
+    )
+    save_path = tmp_path / "save"
+    save_path.mkdir()
+    os.symlink(entry.filename, save_path / "file.txt")
+    add_linked_save_path(cache_path, str(save_path))
+
+    # The body is small enough to move into the database, the saved file still links to its blob file
+    migrate(cache_path, remove=True)
+    assert (save_path / "file.txt").read_bytes() == b"file"
+    cache = SqliteCache(cache_path)
+    assert cache.files.get("http://a/file").read_bytes() == b"file"
+    cache.close()
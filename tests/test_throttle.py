@@ -0,0 +1,68 @@
+import email.message
+import urllib.error
+import pytest
+from legaldata.base import Crawler
+from legaldata.throttle import AdaptiveThrottle, backoff_delay, retry_after_seconds
+
+
+def http_error(code, retry_after=None):
+    headers = email.message.Message()
+    if retry_after is not None:
+        headers["Retry-After"] = retry_after
+    return urllib.error.HTTPError("http://host/page", code, "error", headers, None)
+
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(1, base=1.0, cap=60.0) <= 1.0 for _ in range(100))
+    assert all(0 <= backoff_delay(20, base=1.0, cap=60.0) <= 60.0 for _ in range(100))
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds({"Retry-After": "120"}) == 120.0
+    assert retry_after_seconds({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert retry_after_seconds({"Retry-After": "soon"}) is None
+    assert retry_after_seconds({}) is None
+
+
+def test_adaptive_throttle_follows_responses():
+    throttle = AdaptiveThrottle(requests_per_sec=1.0, max_speedup=2.0, max_interval=8.0)
+    for _ in range(20):
+        throttle.feedback("http://host/page", 0.1, 200)
+    assert throttle._interval("host") == 0.5
+    throttle.feedback("http://host/page", 0.1, 429)
+    assert throttle._interval("host") == 1.0
+    throttle.feedback("http://host/page", 60.0, 200)
+    assert throttle._interval("host") == 2.0
+    assert throttle._interval("other") == 1.0
+
+
+def test_throttle_wait_not_counted_as_slow_response():
+    crawler = Crawler()
+    crawler.throttle = AdaptiveThrottle(requests_per_sec=5.0, slow_response_sec=0.15)
+    for _ in range(3):
+        assert crawler._with_retries("http://host/page", lambda: (200, "body")) == "body"
+    assert crawler.throttle._interval("host") < 0.2
+
+
+def test_with_retries_retries_only_transient_errors():
+    crawler = Crawler(retry_attempts=3, backoff_base=0.01)
+    crawler.throttle = crawler._new_throttle(1, None)
+    errors = [http_error(503, "0"), ConnectionResetError()]
+
+    def flaky():
+        if len(errors) > 0:
+            raise errors.pop(0)
+        return 200, "body"
+
+    assert crawler._with_retries("http://host/page", flaky) == "body"
+    assert crawler.throttle._interval("host") > 0
+
+    calls = []
+
+    def missing():
+        calls.append(1)
+        raise http_error(404)
+
+    with pytest.raises(urllib.error.HTTPError):
+        crawler._with_retries("http://host/missing", missing)
+    assert len(calls) == 1
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import urllib.error
+import http.server
+import pytest
+from legaldata.transport import ContentTooLargeError, Transport
+
+connections = []
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        connections.append(self.client_address)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/stream":
+            # No Content-Length, the body ends when the connection is closed
+            self.send_response(200)
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(b"x" * 200000)
+            self.close_connection = True
+            return
+        if self.path == "/missing":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = f"body of {self.path} for {self.headers['User-Agent']}".encode()
+        if self.path == "/host":
+            body = self.headers["Host"].encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture()
+def base_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    connections.clear()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_keep_alive_reuses_connection(base_url):
+    transport = Transport("test-agent", pool_size=2)
+    for i in range(5):
+        assert transport.get(f"{base_url}/page{i}") == f"body of /page{i} for test-agent".encode()
+    assert len(connections) == 1
+    transport.close()
+
+
+def test_redirect_and_download(base_url, tmp_path):
+    transport = Transport("test-agent")
+    assert transport.get(f"{base_url}/redirect") == b"body of /page for test-agent"
+    filename = tmp_path / "file.txt"
+    status, headers = transport.download(f"{base_url}/file", filename)
+    assert status == 200
+    assert headers.get("Content-Type") == "text/plain"
+    assert filename.read_bytes() == b"body of /file for test-agent"
+    transport.close()
+
+
+def test_download_not_modified(base_url, tmp_path):
+    transport = Transport("test-agent")
+    filename = tmp_path / "file.txt"
+    status, headers = transport.download(f"{base_url}/file", filename, {"If-None-Match": '"v1"'})
+    assert status == 304
+    assert headers.get("ETag") == '"v1"'
+    assert not filename.exists()
+    transport.close()
+
+
+def test_http_error(base_url):
+    transport = Transport("test-agent")
+    with pytest.raises(urllib.error.HTTPError) as err:
+        transport.get(f"{base_url}/missing")
+    assert err.value.code == 404
+    transport.close()
+
+
+def test_connect_to(base_url):
+    transport = Transport("test-agent", connect_to={"https://legal.example": base_url})
+    assert transport.get("https://legal.example/host") == b"legal.example"
+    assert transport.get("https://legal.example/page") == b"body of /page for test-agent"
+    assert len(connections) == 1
+    transport.close()
+
+
+def test_download_hash_and_max_bytes(base_url, tmp_path):
+    transport = Transport("test-agent")
+    filename = tmp_path / "file.txt"
+    sha256 = hashlib.sha256()
+    transport.download(f"{base_url}/stream", filename, sha256=sha256, max_bytes=200000)
+    assert sha256.hexdigest() == hashlib.sha256(b"x" * 200000).hexdigest()
+    with pytest.raises(ContentTooLargeError):
+        transport.download(f"{base_url}/stream", filename, max_bytes=100000)
+    # Over the limit by Content-Length, the body isn't read
+    with pytest.raises(ContentTooLargeError):
+        transport.download(f"{base_url}/file", filename, max_bytes=10)
+    assert transport.get(f"{base_url}/page") == b"body of /page for test-agent"
+    transport.close()